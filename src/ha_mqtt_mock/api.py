@@ -1,5 +1,6 @@
 """FastAPI 应用程序模块，提供设备管理API"""
 
+import inspect
 import json
 import logging
 from contextlib import asynccontextmanager
@@ -7,10 +8,18 @@ from typing import Any, Dict, List, Optional, Union
 
 from fastapi import FastAPI, HTTPException, Path, Body, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
 
 from .engine import DeviceConfig
 from .engine import MockDeviceManager
+from .engine import ShardedDeviceManager
+from .engine.broker import get_embedded_broker
+from .engine.mqtt_pool import ThroughputSampler, get_connection_stats
+from .engine.startup import merge_startup_stats
+from .utils.metrics import registry as metrics_registry
+from .utils.rate_limit import get_rate_limiter
+from .utils.tracing import get_tracer, summarize_latency
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +30,8 @@ class DeviceBase(BaseModel):
     object_id: str = Field(..., description="设备唯一标识")
     name: Optional[str] = Field(None, description="设备名称，如不提供则使用object_id")
     sensor_type: Optional[str] = Field(None, description="传感器类型，仅对sensor和binary_sensor有效")
+    mock_interval: Optional[float] = Field(None, gt=0, description="模拟更新周期（秒），不提供则使用全局间隔")
+    report_policy: Optional[Dict[str, float]] = Field(None, description="上报策略（死区、最小/最大上报间隔），仅对sensor有效")
 
 class DeviceCreate(DeviceBase):
     """设备创建数据模型"""
@@ -31,6 +42,8 @@ class DeviceUpdate(BaseModel):
     type: Optional[str] = Field(None, description="设备类型，如light、sensor、binary_sensor")
     name: Optional[str] = Field(None, description="设备名称")
     sensor_type: Optional[str] = Field(None, description="传感器类型，仅对sensor和binary_sensor有效")
+    mock_interval: Optional[float] = Field(None, gt=0, description="模拟更新周期（秒）")
+    report_policy: Optional[Dict[str, float]] = Field(None, description="上报策略，仅对sensor有效")
 
 class DeviceResponse(DeviceBase):
     """设备响应数据模型"""
@@ -40,6 +53,35 @@ class DeviceState(BaseModel):
     """设备状态数据模型"""
     state: Dict[str, Any] = Field(..., description="设备状态")
 
+async def _resolve(value: Any) -> Any:
+    """
+    兼容同步和异步的设备管理器方法（分片模式下的方法需要等待工作进程响应）
+    
+    Args:
+        value: 方法返回值或协程
+        
+    Returns:
+        Any: 最终结果
+    """
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+def _with_state(device_data: Dict[str, Any], state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    生成带当前状态的设备响应，不修改设备配置（配置会被保存到文件）
+    
+    Args:
+        device_data: 设备配置数据
+        state: 设备当前状态，可能是紧凑的状态对象
+        
+    Returns:
+        Dict[str, Any]: 设备配置的副本，state为普通字典
+    """
+    response_data = dict(device_data)
+    response_data["state"] = dict(state) if state else {}
+    return response_data
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -57,13 +99,14 @@ async def lifespan(app: FastAPI):
         logger.info("API服务器正在关闭...")
 
 # 创建 FastAPI 应用
-def create_app(device_config: DeviceConfig, device_manager: MockDeviceManager) -> FastAPI:
+def create_app(device_config: DeviceConfig, device_manager: MockDeviceManager, mqtt_client: Any = None) -> FastAPI:
     """
     创建FastAPI应用实例
     
     Args:
         device_config: 设备配置管理器
         device_manager: 设备管理器
+        mqtt_client: MQTT客户端或连接池，用于提供连接统计
         
     Returns:
         FastAPI: FastAPI应用实例
@@ -100,15 +143,8 @@ def create_app(device_config: DeviceConfig, device_manager: MockDeviceManager) -
         devices_data = config.get_all_devices()
         
         # 为每个设备添加当前状态
-        for device_data in devices_data:
-            device_id = device_data.get("object_id")
-            device = manager.get_device(device_id)
-            if device:
-                device_data["state"] = device.state
-            else:
-                device_data["state"] = {}
-        
-        return devices_data
+        states = await _resolve(manager.get_all_states())
+        return [_with_state(device_data, states.get(device_data.get("object_id"))) for device_data in devices_data]
     
     @app.post("/api/devices", response_model=DeviceResponse, tags=["设备"])
     async def create_device(
@@ -137,12 +173,10 @@ def create_app(device_config: DeviceConfig, device_manager: MockDeviceManager) -
             raise HTTPException(status_code=500, detail="创建设备后无法找到")
         
         # 添加到设备管理器
-        manager.add_device(new_device)
+        await _resolve(manager.add_device(new_device))
         
         # 返回设备数据
-        response_data = device_data.copy()
-        response_data["state"] = new_device.state
-        return response_data
+        return _with_state(device_data, new_device.state)
     
     @app.get("/api/devices/{device_id}", response_model=DeviceResponse, tags=["设备"])
     async def get_device(
@@ -156,13 +190,8 @@ def create_app(device_config: DeviceConfig, device_manager: MockDeviceManager) -
             raise HTTPException(status_code=404, detail=f"设备 {device_id} 不存在")
         
         # 添加设备当前状态
-        device = manager.get_device(device_id)
-        if device:
-            device_data["state"] = device.state
-        else:
-            device_data["state"] = {}
-        
-        return device_data
+        state = await _resolve(manager.get_device_state(device_id))
+        return _with_state(device_data, state)
     
     @app.put("/api/devices/{device_id}", response_model=DeviceResponse, tags=["设备"])
     async def update_device(
@@ -188,7 +217,7 @@ def create_app(device_config: DeviceConfig, device_manager: MockDeviceManager) -
             raise HTTPException(status_code=400, detail="更新设备失败")
         
         # 从设备管理器中移除旧设备
-        manager.remove_device(device_id)
+        await _resolve(manager.remove_device(device_id))
         
         # 创建新设备实例
         new_devices = config.create_devices()
@@ -198,15 +227,14 @@ def create_app(device_config: DeviceConfig, device_manager: MockDeviceManager) -
         for d in new_devices:
             if d.object_id == device_id:
                 new_device = d
-                manager.add_device(d)
+                await _resolve(manager.add_device(d))
                 break
         
         if not new_device:
             raise HTTPException(status_code=500, detail="更新设备后无法找到")
         
         # 返回更新后的设备数据
-        update_data["state"] = new_device.state
-        return update_data
+        return _with_state(update_data, new_device.state)
     
     @app.delete("/api/devices/{device_id}", tags=["设备"])
     async def delete_device(
@@ -225,7 +253,7 @@ def create_app(device_config: DeviceConfig, device_manager: MockDeviceManager) -
             raise HTTPException(status_code=400, detail="从配置中删除设备失败")
         
         # 从设备管理器中移除设备
-        if not manager.remove_device(device_id):
+        if not await _resolve(manager.remove_device(device_id)):
             logger.warning(f"从设备管理器中删除设备 {device_id} 失败")
         
         return {"status": "success", "message": f"设备 {device_id} 已删除"}
@@ -237,16 +265,13 @@ def create_app(device_config: DeviceConfig, device_manager: MockDeviceManager) -
         manager: MockDeviceManager = Depends(get_device_manager)
     ):
         """更新设备状态"""
-        # 获取设备
-        device = manager.get_device(device_id)
-        if not device:
+        # 更新状态并标记为待发布
+        state = await _resolve(manager.update_device_state(device_id, state_update.state))
+        if state is None:
             raise HTTPException(status_code=404, detail=f"设备 {device_id} 不存在")
         
-        # 更新状态
-        device.state.update(state_update.state)
-        
         # 返回更新后的状态
-        return {"state": device.state}
+        return {"state": state}
     
     @app.get("/api/devices/{device_id}/state", response_model=DeviceState, tags=["设备状态"])
     async def get_device_state(
@@ -254,13 +279,287 @@ def create_app(device_config: DeviceConfig, device_manager: MockDeviceManager) -
         manager: MockDeviceManager = Depends(get_device_manager)
     ):
         """获取设备状态"""
-        # 获取设备
-        device = manager.get_device(device_id)
-        if not device:
+        # 获取设备状态
+        state = await _resolve(manager.get_device_state(device_id))
+        if state is None:
             raise HTTPException(status_code=404, detail=f"设备 {device_id} 不存在")
         
         # 返回状态
-        return {"state": device.state}
+        return {"state": state}
+    
+    # 连接统计接口的吞吐量按该接口上一次读取的发布计数计算
+    throughput = ThroughputSampler()
+    
+    @app.get("/api/mqtt/connections", tags=["系统"])
+    async def get_mqtt_connections(
+        manager: MockDeviceManager = Depends(get_device_manager)
+    ):
+        """获取每个MQTT连接的吞吐量和队列统计"""
+        if isinstance(manager, ShardedDeviceManager):
+            # 分片模式下汇总各工作进程的连接
+            return throughput.annotate([
+                {"shard": shard["shard"], **connection}
+                for shard in await manager.get_stats()
+                for connection in shard["connections"]
+            ])
+        return throughput.annotate(get_connection_stats(mqtt_client))
+    
+    @app.get("/api/broker", tags=["系统"])
+    async def get_broker(topic: str = "#"):
+        """获取内嵌MQTT Broker的总体统计和匹配过滤器的各主题流量"""
+        broker = get_embedded_broker()
+        if broker is None:
+            return {"enabled": False}
+        return {"enabled": True, **broker.get_stats(), "topic_stats": broker.get_topic_stats(topic)}
+    
+    @app.get("/metrics", response_class=PlainTextResponse, tags=["系统"])
+    async def get_metrics(
+        manager: MockDeviceManager = Depends(get_device_manager)
+    ):
+        """Prometheus文本格式的运行指标"""
+        if isinstance(manager, ShardedDeviceManager):
+            # 分片模式下合并各工作进程的计数
+            shards = await manager.get_stats()
+            registry = metrics_registry.merged(shard["metrics"] for shard in shards)
+            connections = [
+                ((str(shard["shard"]), connection["client_id"]), connection.get("out_packet_queue", 0))
+                for shard in shards
+                for connection in shard["connections"]
+            ]
+            command_queues = {
+                (str(shard["shard"]),): shard["command_queue"]["depth"]
+                for shard in shards
+                if shard["command_queue"] is not None
+            }
+        else:
+            registry = metrics_registry
+            connections = [
+                (("0", connection["client_id"]), connection.get("out_packet_queue", 0))
+                for connection in get_connection_stats(mqtt_client)
+            ]
+            queue_stats = manager.get_command_queue_stats()
+            command_queues = {("0",): queue_stats["depth"]} if queue_stats is not None else {}
+        
+        devices: Dict[tuple, float] = {}
+        for device in manager.devices:
+            devices[(device.component,)] = devices.get((device.component,), 0) + 1
+        
+        return registry.render([
+            ("ha_mqtt_mock_devices", "按类型统计的设备数", ("component",), devices),
+            ("ha_mqtt_mock_mqtt_outbound_queue", "MQTT客户端待发送的报文数", ("shard", "client_id"),
+             dict(connections)),
+            ("ha_mqtt_mock_command_queue_depth", "等待事件循环处理的命令数", ("shard",), command_queues),
+        ])
+    
+    @app.get("/api/coalescing", tags=["系统"])
+    async def get_coalescing(
+        manager: MockDeviceManager = Depends(get_device_manager)
+    ):
+        """获取命令合并的统计（收到的命令数、实际执行的状态更新数和合并比例）"""
+        if isinstance(manager, ShardedDeviceManager):
+            shards = [
+                {"shard": shard["shard"], **shard["coalescing"]}
+                for shard in await manager.get_stats()
+                if shard["coalescing"] is not None
+            ]
+            if not shards:
+                return {"enabled": False}
+            commands = sum(shard["commands"] for shard in shards)
+            updates = sum(shard["updates"] for shard in shards)
+            return {
+                "enabled": True,
+                "window_ms": shards[0]["window_ms"],
+                "commands": commands,
+                "updates": updates,
+                "pending": sum(shard["pending"] for shard in shards),
+                "ratio": round(commands / updates, 3) if updates else None,
+                "shards": shards,
+            }
+        stats = manager.get_coalescing_stats()
+        if stats is None:
+            return {"enabled": False}
+        return {"enabled": True, **stats}
+    
+    @app.get("/api/transitions", tags=["系统"])
+    async def get_transitions(
+        manager: MockDeviceManager = Depends(get_device_manager)
+    ):
+        """获取定时状态转换的统计（等待中的转换数和已执行/取代/取消的转换数）"""
+        if isinstance(manager, ShardedDeviceManager):
+            shards = [
+                {"shard": shard["shard"], **shard["transitions"]}
+                for shard in await manager.get_stats()
+                if shard["transitions"] is not None
+            ]
+            if not shards:
+                return {"enabled": False}
+            merged = {
+                key: sum(shard[key] for shard in shards)
+                for key in ("pending", "devices", "scheduled", "fired", "superseded", "cancelled")
+            }
+            return {"enabled": True, **merged, "shards": shards}
+        stats = manager.get_transition_stats()
+        if stats is None:
+            return {"enabled": False}
+        return {"enabled": True, **stats}
+    
+    @app.get("/api/stochastic", tags=["系统"])
+    async def get_stochastic(
+        manager: MockDeviceManager = Depends(get_device_manager)
+    ):
+        """获取随机状态转换的采样方式和已发生的事件数"""
+        if isinstance(manager, ShardedDeviceManager):
+            shards = [
+                {"shard": shard["shard"], **shard["stochastic"]}
+                for shard in await manager.get_stats()
+                if shard["stochastic"] is not None
+            ]
+            if not shards:
+                return {"mode": "tick"}
+            fired: Dict[str, int] = {}
+            for shard in shards:
+                for name, count in shard["fired"].items():
+                    fired[name] = fired.get(name, 0) + count
+            return {
+                "mode": shards[0]["mode"],
+                "devices": sum(shard["devices"] for shard in shards),
+                "pending": sum(shard["pending"] for shard in shards),
+                "fired": fired,
+                "stale": sum(shard["stale"] for shard in shards),
+                "shards": shards,
+            }
+        stats = manager.get_event_stats()
+        if stats is None:
+            return {"mode": "tick"}
+        return stats
+    
+    @app.get("/api/slicing", tags=["系统"])
+    async def get_slicing(
+        manager: MockDeviceManager = Depends(get_device_manager)
+    ):
+        """获取模拟循环的时间片统计，以及就绪的回调（如API请求）排在模拟工作后面等待的时间"""
+        if isinstance(manager, ShardedDeviceManager):
+            shards = [{"shard": shard["shard"], **shard["slicing"]} for shard in await manager.get_stats()]
+            return {
+                "max_slice_ms": shards[0]["max_slice_ms"] if shards else None,
+                "longest_slice_ms": max((shard["longest_slice_ms"] for shard in shards), default=0.0),
+                "max_loop_lag_ms": max((shard["loop_lag"]["max_ms"] for shard in shards), default=0.0),
+                "shards": shards,
+            }
+        return manager.get_slice_stats()
+    
+    @app.get("/api/command-queue", tags=["系统"])
+    async def get_command_queue(
+        manager: MockDeviceManager = Depends(get_device_manager)
+    ):
+        """获取命令队列的深度、丢弃数和批处理统计"""
+        if isinstance(manager, ShardedDeviceManager):
+            shards = [
+                {"shard": shard["shard"], **shard["command_queue"]}
+                for shard in await manager.get_stats()
+                if shard["command_queue"] is not None
+            ]
+            return {"enabled": bool(shards), "shards": shards}
+        stats = manager.get_command_queue_stats()
+        if stats is None:
+            return {"enabled": False}
+        return {"enabled": True, **stats}
+    
+    @app.get("/api/latency", tags=["系统"])
+    async def get_latency(
+        manager: MockDeviceManager = Depends(get_device_manager)
+    ):
+        """获取按设备类型统计的命令到状态发布的往返延迟"""
+        if isinstance(manager, ShardedDeviceManager):
+            return summarize_latency([shard["latency"] for shard in await manager.get_stats()])
+        tracer = get_tracer()
+        return summarize_latency([tracer.snapshot()] if tracer is not None else [])
+    
+    @app.get("/api/startup", tags=["系统"])
+    async def get_startup(
+        manager: MockDeviceManager = Depends(get_device_manager)
+    ):
+        """获取启动时分批发布发现信息和初始状态的进度"""
+        if isinstance(manager, ShardedDeviceManager):
+            shards = [
+                {"shard": shard["shard"], **shard["startup"]}
+                for shard in await manager.get_stats()
+                if shard["startup"] is not None
+            ]
+            return {**merge_startup_stats(shards), "shards": shards}
+        stats = manager.get_startup_stats()
+        if stats is None:
+            return {"phase": "pending", "devices": len(manager.devices)}
+        return stats
+    
+    @app.get("/api/resync", tags=["系统"])
+    async def get_resync(
+        manager: MockDeviceManager = Depends(get_device_manager)
+    ):
+        """获取Home Assistant重启（birth消息）后重新同步的状态"""
+        if isinstance(manager, ShardedDeviceManager):
+            shards = [
+                {"shard": shard["shard"], **shard["resync"]}
+                for shard in await manager.get_stats()
+                if shard["resync"] is not None
+            ]
+            if not shards:
+                return {"enabled": False}
+            last = [{"shard": shard["shard"], **shard["last"]} for shard in shards if shard["last"] is not None]
+            return {
+                "enabled": True,
+                "status_topic": shards[0]["status_topic"],
+                "births": max(shard["births"] for shard in shards),
+                "last": merge_startup_stats(last) if last else None,
+                "shards": shards,
+            }
+        stats = manager.get_resync_stats()
+        if stats is None:
+            return {"enabled": False}
+        return {"enabled": True, **stats}
+    
+    @app.get("/api/rate-limits", tags=["系统"])
+    async def get_rate_limits(
+        manager: MockDeviceManager = Depends(get_device_manager)
+    ):
+        """获取发布限速器的计数和各级令牌桶的填充水平"""
+        if isinstance(manager, ShardedDeviceManager):
+            shards = [
+                {"shard": shard["shard"], **shard["rate_limit"]}
+                for shard in await manager.get_stats()
+                if shard["rate_limit"] is not None
+            ]
+            return {"enabled": bool(shards), "shards": shards}
+        limiter = get_rate_limiter()
+        if limiter is None:
+            return {"enabled": False}
+        return {"enabled": True, **limiter.get_stats()}
+    
+    @app.get("/api/load", tags=["系统"])
+    async def get_load(
+        manager: MockDeviceManager = Depends(get_device_manager)
+    ):
+        """获取负载曲线的目标速率、实际速率和活跃设备数"""
+        if isinstance(manager, ShardedDeviceManager):
+            shards = [
+                {"shard": shard["shard"], **shard["load"]}
+                for shard in await manager.get_stats()
+                if shard["load"] is not None
+            ]
+            if not shards:
+                return {"enabled": False}
+            return {
+                "enabled": True,
+                "target_rate": round(sum(shard["target_rate"] for shard in shards), 2),
+                "achieved_rate": round(sum(
+                    shard["last_report"]["achieved_rate"] for shard in shards if shard["last_report"]
+                ), 2),
+                "shards": shards,
+            }
+        stats = manager.get_load_stats()
+        if stats is None:
+            return {"enabled": False}
+        return {"enabled": True, **stats}
     
     @app.post("/api/reload", tags=["系统"])
     async def reload_devices(
@@ -272,15 +571,13 @@ def create_app(device_config: DeviceConfig, device_manager: MockDeviceManager) -
         config.load()
         
         # 清除现有设备
-        manager.devices.clear()
-        manager.command_device_mapping.clear()
+        await _resolve(manager.clear_devices())
         
         # 创建设备实例
         devices = config.create_devices()
         
         # 添加设备到管理器
-        for device in devices:
-            manager.add_device(device)
+        await _resolve(manager.add_devices(devices))
         
         return {
             "status": "success", 
@@ -0,0 +1,11 @@
+"""性能基准测试模块
+
+基准测试不需要真实的MQTT Broker，发布操作使用NullClient代替
+"""
+
+from .common import NullClient, generate_fleet
+
+__all__ = [
+    "NullClient",
+    "generate_fleet",
+]
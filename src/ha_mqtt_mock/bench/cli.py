@@ -0,0 +1,41 @@
+"""基准测试命令行入口
+
+运行方式:
+    python -m ha_mqtt_mock.main bench micro
+    python -m ha_mqtt_mock.main bench engine --sizes 1000 10000
+    python -m ha_mqtt_mock.main bench transport --broker localhost
+    python -m ha_mqtt_mock.main bench fleet --sizes 1000 10000
+    python -m ha_mqtt_mock.main bench memory
+"""
+
+import sys
+from typing import List, Optional
+
+# 子命令名称到模块的映射，按需导入，避免加载不需要的依赖
+SUITES = {
+    "micro": "ha_mqtt_mock.bench.micro",
+    "engine": "ha_mqtt_mock.bench.engine",
+    "transport": "ha_mqtt_mock.bench.transport",
+    "fleet": "ha_mqtt_mock.bench.fleet",
+    "memory": "ha_mqtt_mock.bench.memory",
+}
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    """
+    运行指定的基准测试
+
+    Args:
+        args: 命令行参数，第一个为基准测试名称，其余传递给该基准测试
+
+    Returns:
+        int: 退出码
+    """
+    import importlib
+
+    args = list(sys.argv[1:] if args is None else args)
+    if not args or args[0] not in SUITES:
+        print(f"用法: bench {{{','.join(SUITES)}}} [参数...]", file=sys.stderr)
+        return 0 if args and args[0] in ("-h", "--help") else 2
+    module = importlib.import_module(SUITES[args[0]])
+    return module.main(args[1:])
@@ -0,0 +1,165 @@
+"""基准测试公共工具"""
+
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from ha_mqtt_mock.models import MQTTDevice
+from ha_mqtt_mock.models import DEVICE_TYPE_MAP
+from ha_mqtt_mock.models import Sensor, BinarySensor
+
+
+class _PublishResult:
+    """模拟paho的MQTTMessageInfo，只提供rc和mid"""
+
+    __slots__ = ("rc", "mid")
+
+    def __init__(self, mid: int) -> None:
+        self.rc = 0
+        self.mid = mid
+
+
+class NullClient:
+    """不进行任何网络操作的MQTT客户端，只统计发布数量和字节数"""
+
+    def __init__(self) -> None:
+        self.published = 0
+        self.bytes = 0
+        self.subscriptions: List[str] = []
+        self.on_message = None
+
+    def publish(self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False) -> _PublishResult:
+        self.published += 1
+        if payload is not None:
+            self.bytes += len(payload)
+        return _PublishResult(self.published)
+
+    def subscribe(self, topic, qos: int = 0):
+        self.subscriptions.append(topic)
+        return (0, len(self.subscriptions))
+
+    def reset(self) -> None:
+        """清零统计"""
+        self.published = 0
+        self.bytes = 0
+
+
+def generate_fleet(size: int, types: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """
+    生成合成的设备配置列表，按类型轮流分配
+
+    Args:
+        size: 设备数量
+        types: 设备类型列表，默认使用DEVICE_TYPE_MAP中的所有类型
+
+    Returns:
+        List[Dict[str, Any]]: 可以写入devices.json的设备配置列表
+    """
+    types = list(types or DEVICE_TYPE_MAP)
+    sensor_types = list(Sensor.SENSOR_TYPES)
+    binary_sensor_types = list(BinarySensor.SENSOR_TYPES)
+    fleet = []
+    for i in range(size):
+        device_type = types[i % len(types)]
+        device = {
+            "type": device_type,
+            "object_id": f"bench_{device_type}_{i}",
+            "name": f"Bench {device_type} {i}",
+        }
+        if device_type == "sensor":
+            device["sensor_type"] = sensor_types[(i // len(types)) % len(sensor_types)]
+        elif device_type == "binary_sensor":
+            device["sensor_type"] = binary_sensor_types[(i // len(types)) % len(binary_sensor_types)]
+        fleet.append(device)
+    return fleet
+
+
+def create_devices(fleet: List[Dict[str, Any]]) -> List[MQTTDevice]:
+    """
+    根据设备配置创建设备实例（不经过DeviceConfig，避免日志开销）
+
+    Args:
+        fleet: 设备配置列表
+
+    Returns:
+        List[MQTTDevice]: 设备实例列表
+    """
+    devices = []
+    for data in fleet:
+        params = {k: v for k, v in data.items() if k != "type"}
+        devices.append(DEVICE_TYPE_MAP[data["type"]](**params))
+    return devices
+
+
+def environment_info() -> Dict[str, str]:
+    """
+    获取运行环境信息，写入结果文件便于比较
+
+    Returns:
+        Dict[str, str]: 环境信息
+    """
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def _result_key(result: Dict[str, Any]) -> str:
+    return f"{result['name']}({json.dumps(result.get('params', {}), sort_keys=True)})"
+
+
+def compare_results(results: Dict[str, Any], baseline_path: str, metric: str,
+                    threshold: float = 0.2, higher_is_better: bool = False) -> int:
+    """
+    与基线结果比较并打印变化，用于在评审中发现性能回归
+
+    Args:
+        results: 本次结果
+        baseline_path: 基线结果文件
+        metric: 比较的指标
+        threshold: 判定为回归的变化比例
+        higher_is_better: 指标是否越大越好
+
+    Returns:
+        int: 没有回归时为0，否则为1
+    """
+    baseline = {
+        _result_key(result): result
+        for result in json.loads(Path(baseline_path).read_text(encoding="utf-8"))["results"]
+    }
+    regressions = 0
+    for result in results["results"]:
+        key = _result_key(result)
+        old = baseline.get(key, {}).get(metric)
+        new = result.get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        regressed = change < -threshold if higher_is_better else change > threshold
+        regressions += regressed
+        print(f"{'回归' if regressed else '    '} {key:<60} {old:>14,.1f} -> {new:>14,.1f} ({change:+.1%})")
+    print(f"与基线 {baseline_path} 比较：{regressions} 项回归（阈值 {threshold:.0%}）")
+    return 1 if regressions else 0
+
+
+def write_results(results: Dict[str, Any], output: Optional[str]) -> None:
+    """
+    写入JSON格式的基准测试结果
+
+    Args:
+        results: 结果数据
+        output: 输出文件路径，为None或"-"时输出到标准输出
+    """
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if not output or output == "-":
+        print(text)
+        return
+    path = Path(output)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text + "\n", encoding="utf-8")
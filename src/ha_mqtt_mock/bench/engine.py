@@ -0,0 +1,115 @@
+"""模拟引擎基准测试
+
+比较对象引擎和向量化引擎在不同规模数值设备上的每秒更新次数（整个设备群推进一次记为一次tick）
+
+运行方式:
+    python -m ha_mqtt_mock.bench.engine --sizes 1000 10000 100000
+"""
+
+import argparse
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from ha_mqtt_mock.engine import MockDeviceManager
+from ha_mqtt_mock.engine.vectorized import numpy_available
+
+from .common import NullClient, create_devices, environment_info, generate_fleet, write_results
+
+# 数值设备群：以传感器为主，混合少量吸尘器和割草机
+NUMERIC_FLEET_TYPES = ["sensor"] * 8 + ["vacuum", "lawn_mower"]
+
+
+def bench_engine(engine: str, size: int, ticks: int = 5, interval: float = 10) -> Dict[str, Any]:
+    """
+    测量指定引擎推进整个设备群的速度
+
+    每次tick模拟时间前进一个模拟间隔，使上报策略按正常节奏生效
+
+    Args:
+        engine: 模拟引擎名称
+        size: 设备数量
+        ticks: 测量的tick次数
+        interval: 每次tick对应的模拟间隔（秒）
+
+    Returns:
+        Dict[str, Any]: 测量结果
+    """
+    manager = MockDeviceManager(heartbeat_interval=60, engine=engine)
+    devices = create_devices(generate_fleet(size, NUMERIC_FLEET_TYPES))
+    client = NullClient()
+
+    if manager.vector_engine is not None:
+        remaining = manager.vector_engine.add_devices(devices)
+
+        def tick(now: float) -> None:
+            manager.vector_engine.tick(client, now, manager.heartbeat_interval, bucket=-1)
+            for device in remaining:
+                manager.mock_device(client, device, now)
+    else:
+        def tick(now: float) -> None:
+            for device in devices:
+                manager.mock_device(client, device, now)
+
+    start_clock = time.monotonic()
+    # 预热一次，完成首次发布和列构建
+    tick(start_clock)
+    client.reset()
+
+    elapsed = 0.0
+    for i in range(1, ticks + 1):
+        started = time.perf_counter()
+        tick(start_clock + i * interval)
+        elapsed += time.perf_counter() - started
+
+    return {
+        "engine": engine,
+        "devices": size,
+        "ticks": ticks,
+        "seconds": round(elapsed, 6),
+        "ticks_per_second": round(ticks / elapsed, 3) if elapsed else None,
+        "device_updates_per_second": round(ticks * size / elapsed, 1) if elapsed else None,
+        "messages_per_tick": round(client.published / ticks, 1),
+    }
+
+
+def run(sizes: Sequence[int], ticks: int = 5, engines: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    在多个规模上运行引擎基准测试
+
+    Args:
+        sizes: 设备数量列表
+        ticks: 每个规模测量的tick次数
+        engines: 引擎列表，默认测试所有可用引擎
+
+    Returns:
+        Dict[str, Any]: 测试结果
+    """
+    if engines is None:
+        engines = ["object", "vectorized"] if numpy_available() else ["object"]
+    results = [bench_engine(engine, size, ticks) for size in sizes for engine in engines]
+    return {
+        "benchmark": "engine",
+        "environment": environment_info(),
+        "results": results,
+    }
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="模拟引擎基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="设备数量")
+    parser.add_argument("--ticks", type=int, default=5, help="每个规模测量的tick次数")
+    parser.add_argument("--engine", action="append", choices=MockDeviceManager.ENGINES, help="只测试指定引擎")
+    parser.add_argument("-o", "--output", help="结果输出文件（JSON），默认输出到标准输出")
+    parsed = parser.parse_args(args)
+
+    results = run(parsed.sizes, parsed.ticks, parsed.engine)
+    for result in results["results"]:
+        print(f"{result['engine']:>10} {result['devices']:>8} 设备: {result['ticks_per_second']:>10} ticks/s")
+    if parsed.output:
+        write_results(results, parsed.output)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
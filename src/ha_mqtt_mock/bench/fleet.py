@@ -0,0 +1,334 @@
+"""设备群宏基准测试
+
+为每个规模生成包含DEVICE_TYPE_MAP中所有类型的合成devices.json，在独立的子进程中运行
+AppService.initialize和start，连接到本进程中的内嵌MQTT Broker（inprocess传输时Broker
+运行在子进程内，不经过套接字），记录：
+    - 首次发布耗时和所有发现信息发送完成的耗时
+    - 峰值和稳定状态的RSS
+    - 稳定状态下每秒收到的消息数
+    - 子进程事件循环的延迟
+
+运行方式:
+    python -m ha_mqtt_mock.main bench fleet --sizes 1000 10000 100000 -o bench-results/fleet.json
+    python -m ha_mqtt_mock.main bench fleet --baseline bench-results/fleet-main.json
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from ha_mqtt_mock.engine.broker import Broker, BrokerMessage
+
+from .common import compare_results, environment_info, generate_fleet, write_results
+
+# 用于基线比较的指标，以及是否越大越好
+METRICS = {
+    "time_to_first_publish": False,
+    "time_to_all_discoveries": False,
+    "peak_rss_mb": False,
+    "steady_rss_mb": False,
+    "messages_per_second": True,
+    "loop_lag_p99_ms": False,
+}
+
+
+class TrafficRecorder:
+    """Broker消息监听器，记录首次发布、发现信息完成时间和每秒消息数"""
+
+    def __init__(self, expected_discoveries: int) -> None:
+        """
+        初始化记录器
+
+        Args:
+            expected_discoveries: 期望收到的发现信息数量
+        """
+        self.expected_discoveries = expected_discoveries
+        self.messages = 0
+        self.bytes = 0
+        self.discoveries = 0
+        self.first_publish: Optional[float] = None
+        self.discoveries_done: Optional[float] = None
+        # 每秒收到的消息数（键为整数秒的墙上时间）
+        self.per_second: Dict[int, int] = {}
+
+    def __call__(self, message: BrokerMessage) -> None:
+        now = time.time()
+        self.messages += 1
+        self.bytes += len(message.payload)
+        if self.first_publish is None:
+            self.first_publish = now
+        second = int(now)
+        self.per_second[second] = self.per_second.get(second, 0) + 1
+        if message.topic.endswith("/config"):
+            self.discoveries += 1
+            if self.discoveries == self.expected_discoveries:
+                self.discoveries_done = now
+
+    def to_dict(self) -> Dict[str, Any]:
+        """可以在进程间传递的记录"""
+        return {
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "first_publish": self.first_publish,
+            "discoveries_done": self.discoveries_done,
+            "per_second": self.per_second,
+        }
+
+
+def _rate_between(per_second: Dict[int, int], start: float, end: float) -> float:
+    """
+    计算墙上时间[start, end)内的平均消息速率（按整秒统计）
+
+    Args:
+        per_second: 每秒消息数
+        start: 开始时间
+        end: 结束时间
+
+    Returns:
+        float: 消息/秒
+    """
+    seconds = range(int(start), int(end))
+    if not seconds:
+        return 0.0
+    return sum(per_second.get(second, 0) for second in seconds) / len(seconds)
+
+
+def _rss_mb() -> float:
+    """当前进程的常驻内存（MB），非Linux平台使用峰值代替"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / 2 ** 20
+    except OSError:
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    """当前进程的峰值常驻内存（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS以字节为单位，Linux以KB为单位
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+async def _run_service(config_file: str, port: int, options: Dict[str, Any], started: float) -> Dict[str, Any]:
+    from ha_mqtt_mock.config import MQTTConfig
+    from ha_mqtt_mock.engine import AppService
+    from ha_mqtt_mock.engine.broker import set_embedded_broker
+
+    # 进程内传输：Broker和记录器运行在子进程中，AppService复用这个Broker
+    recorder = None
+    if options["transport"] == "inprocess":
+        broker = Broker(history=0)
+        recorder = TrafficRecorder(options["devices"])
+        broker.add_listener(recorder)
+        set_embedded_broker(broker)
+
+    mqtt_config = MQTTConfig.get_instance()
+    mqtt_config.update(broker_address="127.0.0.1", client_id="bench_fleet", transport=options["transport"])
+    if port:
+        mqtt_config.update(broker_port=port)
+    service = AppService(
+        mqtt_config=mqtt_config,
+        config_file=config_file,
+        mock_interval=options["interval"],
+        engine=options["engine"],
+        enable_api=False,
+        startup={"rate": options["startup_rate"]},
+    )
+
+    # 事件循环延迟：固定间隔睡眠的超时部分
+    lags: List[float] = []
+    rss_samples: List[float] = []
+
+    async def monitor() -> None:
+        tick = 0.05
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(tick)
+            lags.append(time.perf_counter() - before - tick)
+            if len(lags) % 10 == 0:
+                rss_samples.append(_rss_mb())
+
+    monitor_task = asyncio.create_task(monitor())
+    if not await service.initialize():
+        raise RuntimeError("服务初始化失败")
+    initialized = time.time()
+    start_task = asyncio.create_task(service.start())
+
+    await asyncio.sleep(options["warmup"])
+    # 稳定状态从预热结束开始计算
+    lags.clear()
+    rss_samples.clear()
+    steady_start = time.time()
+    await asyncio.sleep(options["duration"])
+    steady_end = time.time()
+
+    await service.shutdown()
+    await start_task
+    monitor_task.cancel()
+
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    return {
+        "initialize_seconds": round(initialized - started, 3),
+        "steady_start": steady_start,
+        "steady_end": steady_end,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "steady_rss_mb": round(statistics.median(rss_samples), 1) if rss_samples else round(_rss_mb(), 1),
+        "loop_lag_p50_ms": round(lags_ms[len(lags_ms) // 2], 2),
+        "loop_lag_p99_ms": round(lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))], 2),
+        "loop_lag_max_ms": round(lags_ms[-1], 2),
+        "traffic": recorder.to_dict() if recorder is not None else None,
+    }
+
+
+def _child_main(config_file: str, port: int, options: Dict[str, Any], started: float, conn) -> None:
+    """子进程入口：运行服务并把测量结果发送给父进程"""
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        conn.send((True, asyncio.run(_run_service(config_file, port, options, started))))
+    except Exception as e:
+        conn.send((False, repr(e)))
+    finally:
+        conn.close()
+
+
+async def bench_fleet(size: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    测量指定规模设备群的启动和稳定运行指标
+
+    Args:
+        size: 设备数量
+        options: 运行参数（interval、engine、transport、startup_rate、warmup、duration）
+
+    Returns:
+        Dict[str, Any]: 测量结果
+    """
+    from ha_mqtt_mock.engine import DeviceConfig
+
+    # Broker不保留消息记录，只通过监听器计数
+    broker = Broker(history=0)
+    recorder = TrafficRecorder(size)
+    broker.add_listener(recorder)
+    port = await broker.start(port=0) if options["transport"] != "inprocess" else 0
+    options = {**options, "devices": size}
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_file = str(Path(tmp) / "devices.json")
+        DeviceConfig(config_file).save(generate_fleet(size))
+
+        started = time.time()
+        process = context.Process(target=_child_main, args=(config_file, port, options, started, child_conn))
+        process.start()
+        child_conn.close()
+        try:
+            # 在事件循环中等待子进程结果，Broker需要持续处理消息
+            while not parent_conn.poll():
+                if not process.is_alive():
+                    raise RuntimeError(f"{size} 个设备的基准测试子进程异常退出: {process.exitcode}")
+                await asyncio.sleep(0.1)
+            ok, child = parent_conn.recv()
+        finally:
+            process.join(timeout=10)
+            await broker.stop()
+    if not ok:
+        raise RuntimeError(f"{size} 个设备的基准测试失败: {child}")
+
+    traffic = child["traffic"] or recorder.to_dict()
+    steady_rate = _rate_between(traffic["per_second"], child["steady_start"], child["steady_end"])
+
+    return {
+        "name": "fleet",
+        "params": {"devices": size, "engine": options["engine"], "transport": options["transport"]},
+        "time_to_first_publish": round(traffic["first_publish"] - started, 3) if traffic["first_publish"] else None,
+        "time_to_all_discoveries": (
+            round(traffic["discoveries_done"] - started, 3) if traffic["discoveries_done"] else None
+        ),
+        "initialize_seconds": child["initialize_seconds"],
+        "peak_rss_mb": child["peak_rss_mb"],
+        "steady_rss_mb": child["steady_rss_mb"],
+        "messages_per_second": round(steady_rate, 1),
+        "loop_lag_p50_ms": child["loop_lag_p50_ms"],
+        "loop_lag_p99_ms": child["loop_lag_p99_ms"],
+        "loop_lag_max_ms": child["loop_lag_max_ms"],
+        "messages": traffic["messages"],
+        "bytes": traffic["bytes"],
+    }
+
+
+async def run(sizes: List[int], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    在多个规模上运行宏基准测试，每个规模使用新的子进程以便分别测量内存
+
+    Args:
+        sizes: 设备数量列表
+        options: 运行参数
+
+    Returns:
+        Dict[str, Any]: 测试结果
+    """
+    results = []
+    for size in sizes:
+        results.append(await bench_fleet(size, options))
+    return {
+        "benchmark": "fleet",
+        "environment": environment_info(),
+        "options": options,
+        "results": results,
+    }
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog="ha_mqtt_mock bench fleet", description="设备群宏基准测试（使用内嵌MQTT Broker）")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="设备数量")
+    parser.add_argument("--interval", type=float, default=10, help="模拟更新间隔（秒）")
+    parser.add_argument("--engine", choices=["object", "vectorized"], default="object", help="模拟引擎")
+    parser.add_argument("--transport", choices=["thread", "asyncio", "inprocess"], default="thread",
+                        help="MQTT传输方式，inprocess不经过套接字")
+    parser.add_argument("--startup-rate", type=float, default=0,
+                        help="启动时发现信息的发布速率（条/秒），默认0表示不限速，只测量分批等待PUBACK的开销")
+    parser.add_argument("--warmup", type=float, default=15, help="启动后到开始测量稳定状态的时间（秒）")
+    parser.add_argument("--duration", type=float, default=20, help="稳定状态测量时长（秒）")
+    parser.add_argument("-o", "--output", help="结果输出文件（JSON），默认只输出摘要")
+    parser.add_argument("--baseline", help="与之比较的基线结果文件，出现回归时返回非零退出码")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定为回归的变化比例")
+    parsed = parser.parse_args(args)
+
+    options = {
+        "interval": parsed.interval,
+        "engine": parsed.engine,
+        "transport": parsed.transport,
+        "startup_rate": parsed.startup_rate,
+        "warmup": parsed.warmup,
+        "duration": parsed.duration,
+    }
+    results = asyncio.run(run(parsed.sizes, options))
+    for result in results["results"]:
+        print(
+            f"{result['params']['devices']:>8} 设备: 首次发布 {result['time_to_first_publish']}s，"
+            f"发现信息完成 {result['time_to_all_discoveries']}s，"
+            f"RSS 峰值/稳定 {result['peak_rss_mb']}/{result['steady_rss_mb']} MB，"
+            f"{result['messages_per_second']} 消息/秒，循环延迟 p99 {result['loop_lag_p99_ms']} ms"
+        )
+    if parsed.output:
+        write_results(results, parsed.output)
+    if parsed.baseline:
+        regressions = 0
+        for metric, higher_is_better in METRICS.items():
+            regressions += compare_results(results, parsed.baseline, metric, parsed.threshold, higher_is_better)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,112 @@
+"""设备内存占用基准测试
+
+为DEVICE_TYPE_MAP中的每种设备创建大量实例，用tracemalloc测量每个设备占用的字节数
+（设备对象、状态和它独占的字符串等，不包括设备之间共享的常量）。最后一项把所有类型的设备
+加入MockDeviceManager，包含管理器的索引结构。
+
+运行方式:
+    python -m ha_mqtt_mock.main bench memory -o bench-results/memory.json
+    python -m ha_mqtt_mock.main bench memory --baseline bench-results/memory-main.json
+"""
+
+import argparse
+import gc
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from ha_mqtt_mock.engine import MockDeviceManager
+from ha_mqtt_mock.models import DEVICE_TYPE_MAP
+
+from .common import compare_results, create_devices, environment_info, generate_fleet, write_results
+
+
+def measure_bytes(build: Callable[[], Any], count: int) -> Dict[str, float]:
+    """
+    测量build()创建的对象在保持存活时占用的内存
+
+    Args:
+        build: 创建对象的函数，返回值在测量期间保持存活
+        count: 创建的设备数量，用于计算每个设备的字节数
+
+    Returns:
+        Dict[str, float]: 总字节数和每个设备的字节数
+    """
+    # 先创建一次，让类型级别的缓存和常量不计入测量
+    build()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = build()
+        gc.collect()
+        total = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del objects
+    return {"bytes": total, "bytes_per_device": round(total / count, 1)}
+
+
+def bench_types(count: int) -> List[Dict[str, Any]]:
+    """测量每种设备的单设备内存占用"""
+    results = []
+    for device_type in DEVICE_TYPE_MAP:
+        fleet = generate_fleet(count, [device_type])
+        results.append({
+            "name": "device_bytes",
+            "params": {"type": device_type},
+            **measure_bytes(lambda: create_devices(fleet), count),
+        })
+    return results
+
+
+def bench_manager(count: int) -> List[Dict[str, Any]]:
+    """测量包含所有设备类型的设备群加入MockDeviceManager后的单设备内存占用"""
+    fleet = generate_fleet(count)
+
+    def build() -> MockDeviceManager:
+        manager = MockDeviceManager()
+        manager.add_devices(create_devices(fleet))
+        return manager
+
+    return [{"name": "manager_bytes", "params": {"devices": count}, **measure_bytes(build, count)}]
+
+
+def run(count: int) -> Dict[str, Any]:
+    """
+    运行内存基准测试
+
+    Args:
+        count: 每项测量创建的设备数量
+
+    Returns:
+        Dict[str, Any]: 测试结果
+    """
+    return {
+        "benchmark": "memory",
+        "environment": environment_info(),
+        "results": bench_types(count) + bench_manager(count),
+    }
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog="ha_mqtt_mock bench memory", description="设备内存占用基准测试")
+    parser.add_argument("--count", type=int, default=10000, help="每项测量创建的设备数量")
+    parser.add_argument("-o", "--output", help="结果输出文件（JSON），默认只输出摘要")
+    parser.add_argument("--baseline", help="与之比较的基线结果文件，出现回归时返回非零退出码")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定为回归的内存增加比例")
+    parsed = parser.parse_args(args)
+
+    results = run(parsed.count)
+    for result in results["results"]:
+        params = " ".join(f"{key}={value}" for key, value in result["params"].items())
+        print(f"{result['name']:>14} {params:<24} {result['bytes_per_device']:>10,.1f} 字节/设备")
+    if parsed.output:
+        write_results(results, parsed.output)
+    if parsed.baseline:
+        return compare_results(results, parsed.baseline, "bytes_per_device", parsed.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,270 @@
+"""热点路径微基准测试
+
+不需要MQTT Broker，测量以下操作的单次耗时：
+    - MQTTDevice.publish_state（状态序列化和发布调用）
+    - _get_discovery_payload、generate_device_info 和缓存的发现信息发布
+    - MockDeviceManager.on_message 命令分发（JSON和纯文本命令）
+    - DEVICE_TYPE_MAP 中每种设备的 update_state_mock
+    - DeviceConfig.load / save 大文件
+    - 各JSON序列化后端编码状态和发现信息（并检查输出字节完全相同）
+
+运行方式:
+    python -m ha_mqtt_mock.main bench micro -o bench-results/micro.json
+    python -m ha_mqtt_mock.main bench micro --baseline bench-results/main.json
+"""
+
+import argparse
+import itertools
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import paho.mqtt.client as mqtt
+
+from ha_mqtt_mock.engine import DeviceConfig, MockDeviceManager
+from ha_mqtt_mock.models import DEVICE_TYPE_MAP
+from ha_mqtt_mock.utils.mqtt_helpers import generate_device_info
+from ha_mqtt_mock.utils.serializer import (SERIALIZERS, CompactJsonSerializer, StdlibSerializer, get_serializer,
+                                           orjson_available, to_bytes)
+
+from .common import NullClient, compare_results, create_devices, environment_info, generate_fleet, write_results
+
+
+def measure(func: Callable[[], Any], repeat: int = 5, min_time: float = 0.05) -> Dict[str, float]:
+    """
+    测量函数的单次耗时
+
+    先自动确定每轮调用次数，使一轮至少持续min_time秒，再重复测量repeat轮
+
+    Args:
+        func: 被测函数（无参数）
+        repeat: 测量轮数
+        min_time: 每轮最短时间（秒）
+
+    Returns:
+        Dict[str, float]: 每轮调用次数、最快和中位数单次耗时（纳秒）及每秒操作数
+    """
+    # 与timeit.Timer.autorange相同：按1、2、5、10、20、50……增加调用次数
+    number = 1
+    for scale in itertools.count():
+        for multiplier in (1, 2, 5):
+            number = multiplier * 10 ** scale
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            if time.perf_counter() - started >= min_time:
+                break
+        else:
+            continue
+        break
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter_ns() - started) / number)
+
+    best = min(timings)
+    return {
+        "number": number,
+        "ns_per_op": round(best, 1),
+        "median_ns_per_op": round(statistics.median(timings), 1),
+        "ops_per_second": round(1e9 / best, 1) if best else None,
+    }
+
+
+def _sample_devices() -> Dict[str, Any]:
+    """每种设备类型创建一个实例"""
+    fleet = generate_fleet(len(DEVICE_TYPE_MAP))
+    return {data["type"]: device for data, device in zip(fleet, create_devices(fleet))}
+
+
+def bench_publish_state(repeat: int) -> List[Dict[str, Any]]:
+    """测量每种设备的publish_state（包含JSON序列化）"""
+    client = NullClient()
+    results = []
+    for device_type, device in _sample_devices().items():
+        results.append({
+            "name": "publish_state",
+            "params": {"type": device_type},
+            **measure(lambda: device.publish_state(client), repeat),
+        })
+    return results
+
+
+def bench_discovery(repeat: int) -> List[Dict[str, Any]]:
+    """测量每种设备的发现信息构造和generate_device_info"""
+    results = [{
+        "name": "generate_device_info",
+        "params": {},
+        **measure(lambda: generate_device_info("Bench Living Room Light"), repeat),
+    }]
+    for device_type, device in _sample_devices().items():
+        results.append({
+            "name": "discovery_payload",
+            "params": {"type": device_type},
+            **measure(device._get_discovery_payload, repeat),
+        })
+    # 缓存的发现信息发布（重新发布全部发现信息时的单设备开销）
+    client = NullClient()
+    for device_type, device in _sample_devices().items():
+        device.publish_discovery(client)
+        results.append({
+            "name": "publish_discovery",
+            "params": {"type": device_type},
+            **measure(lambda: device.publish_discovery(client), repeat),
+        })
+    return results
+
+
+def bench_update_state_mock(repeat: int) -> List[Dict[str, Any]]:
+    """测量每种设备的update_state_mock"""
+    random.seed(0)
+    results = []
+    for device_type, device in _sample_devices().items():
+        results.append({
+            "name": "update_state_mock",
+            "params": {"type": device_type},
+            **measure(device.update_state_mock, repeat),
+        })
+    return results
+
+
+def _command_message(topic: str, payload: bytes) -> mqtt.MQTTMessage:
+    """构造与paho网络线程交给on_message相同的消息对象"""
+    message = mqtt.MQTTMessage(topic=topic.encode("utf-8"))
+    message.payload = payload
+    return message
+
+
+def bench_on_message(repeat: int, sizes: List[int]) -> List[Dict[str, Any]]:
+    """测量不同设备数量下on_message的命令分发（包含命令处理和状态发布）"""
+    results = []
+    for size in sizes:
+        manager = MockDeviceManager()
+        manager.add_devices(create_devices(generate_fleet(size)))
+        client = NullClient()
+        rng = random.Random(0)
+        sample = rng.sample(manager.devices, min(size, 1000))
+        payloads = {
+            "json": lambda device: to_bytes(get_serializer().dumps(device.state)),
+            "plain": lambda device: b"ON",
+        }
+        for kind, payload in payloads.items():
+            messages = [_command_message(device.command_topic, payload(device)) for device in sample]
+            cursor = [0]
+
+            def dispatch() -> None:
+                message = messages[cursor[0]]
+                cursor[0] = (cursor[0] + 1) % len(messages)
+                manager.on_message(client, None, message)
+
+            results.append({"name": "on_message", "params": {"devices": size, "payload": kind},
+                            **measure(dispatch, repeat)})
+    return results
+
+
+def bench_device_config(repeat: int, sizes: List[int]) -> List[Dict[str, Any]]:
+    """测量大配置文件的DeviceConfig.load和save"""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            config = DeviceConfig(Path(tmp) / f"devices_{size}.json")
+            fleet = generate_fleet(size)
+            config.save(fleet)
+            # 大文件每轮只执行一次，减少轮数
+            rounds = max(3, repeat // 2)
+            results.append({"name": "device_config_save", "params": {"devices": size},
+                            **measure(lambda: config.save(fleet), rounds, min_time=0)})
+            results.append({"name": "device_config_load", "params": {"devices": size},
+                            **measure(config.load, rounds, min_time=0)})
+    return results
+
+
+def bench_serializer(repeat: int) -> List[Dict[str, Any]]:
+    """
+    测量每个可用的序列化后端编码各种设备的状态和发现信息，并与同一格式的标准库输出逐字节比较
+
+    输出不一致的结果项带有 "identical": False，命令行会返回非零退出码。
+    """
+    backends = {name: cls() for name, cls in SERIALIZERS.items() if name != "orjson" or orjson_available()}
+    references = {False: StdlibSerializer(), True: CompactJsonSerializer()}
+    results = []
+    for device_type, device in _sample_devices().items():
+        payloads = {"state": device.state, "discovery": device._get_discovery_payload()}
+        for kind, payload in payloads.items():
+            for name, serializer in backends.items():
+                expected = to_bytes(references[serializer.compact].dumps(payload))
+                results.append({
+                    "name": f"serialize_{kind}",
+                    "params": {"type": device_type, "backend": name},
+                    "identical": (to_bytes(serializer.dumps(payload)) == expected
+                                  and serializer.loads(expected) == references[False].loads(expected)),
+                    **measure(lambda: serializer.dumps(payload), repeat),
+                })
+    return results
+
+
+SUITES = {
+    "publish_state": lambda options: bench_publish_state(options.repeat),
+    "discovery": lambda options: bench_discovery(options.repeat),
+    "update_state_mock": lambda options: bench_update_state_mock(options.repeat),
+    "on_message": lambda options: bench_on_message(options.repeat, options.dispatch_sizes),
+    "device_config": lambda options: bench_device_config(options.repeat, options.config_sizes),
+    "serializer": lambda options: bench_serializer(options.repeat),
+}
+
+
+def run(options: argparse.Namespace) -> Dict[str, Any]:
+    """
+    运行微基准测试
+
+    Args:
+        options: 命令行参数
+
+    Returns:
+        Dict[str, Any]: 测试结果
+    """
+    results = []
+    for suite in options.suite or list(SUITES):
+        results.extend(SUITES[suite](options))
+    return {
+        "benchmark": "micro",
+        "environment": environment_info(),
+        "results": results,
+    }
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog="ha_mqtt_mock bench micro", description="热点路径微基准测试（不需要MQTT Broker）")
+    parser.add_argument("--suite", action="append", choices=list(SUITES), help="只运行指定的测试组，可重复指定")
+    parser.add_argument("--repeat", type=int, default=5, help="每项测量的轮数")
+    parser.add_argument("--dispatch-sizes", type=int, nargs="+", default=[100, 10000], help="on_message测试的设备数量")
+    parser.add_argument("--config-sizes", type=int, nargs="+", default=[1000, 100000], help="配置文件测试的设备数量")
+    parser.add_argument("-o", "--output", help="结果输出文件（JSON），默认只输出摘要")
+    parser.add_argument("--baseline", help="与之比较的基线结果文件，出现回归时返回非零退出码")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定为回归的单次耗时增加比例")
+    parsed = parser.parse_args(args)
+
+    results = run(parsed)
+    for result in results["results"]:
+        params = " ".join(f"{key}={value}" for key, value in result["params"].items())
+        print(f"{result['name']:>22} {params:<24} {result['ns_per_op']:>14,.1f} ns/op")
+    if parsed.output:
+        write_results(results, parsed.output)
+    mismatches = [result for result in results["results"] if result.get("identical") is False]
+    for result in mismatches:
+        print(f"序列化输出不一致: {result['name']} {result['params']}")
+    if parsed.baseline:
+        return compare_results(results, parsed.baseline, "ns_per_op", parsed.threshold) or int(bool(mismatches))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,164 @@
+"""MQTT传输基准测试
+
+比较paho网络线程（thread）和asyncio原生传输（asyncio，可选uvloop）向真实Broker发布消息的吞吐量。
+计时从第一条发布开始，到所有消息完成为止（QoS 0为写入套接字，QoS 1为收到PUBACK）。
+
+运行方式:
+    python -m ha_mqtt_mock.bench.transport --broker localhost --messages 50000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import paho.mqtt.client as mqtt
+
+from ha_mqtt_mock.engine.mqtt_asyncio import AsyncioMQTTClient, get_loop_factory, uvloop_available
+
+from .common import environment_info, write_results
+
+# 与温度传感器状态大小相近的负载
+PAYLOAD = json.dumps({"temperature": 23.45, "unit_of_measurement": "°C"}).encode("utf-8")
+
+
+def _result(transport: str, qos: int, messages: int, elapsed: float) -> Dict[str, Any]:
+    return {
+        "transport": transport,
+        "qos": qos,
+        "messages": messages,
+        "seconds": round(elapsed, 6),
+        "messages_per_second": round(messages / elapsed, 1) if elapsed else None,
+    }
+
+
+def _topic(i: int) -> str:
+    return f"bench/sensor/bench_sensor_{i % 1000}/state"
+
+
+def bench_thread(host: str, port: int, messages: int, qos: int) -> Dict[str, Any]:
+    """
+    使用paho网络线程发布消息
+
+    Args:
+        host: Broker地址
+        port: Broker端口
+        messages: 消息数量
+        qos: 服务质量等级
+
+    Returns:
+        Dict[str, Any]: 测量结果
+    """
+    client = mqtt.Client(client_id="bench_transport_thread")
+    client.max_queued_messages_set(0)
+    client.connect(host, port)
+    client.loop_start()
+    try:
+        while not client.is_connected():
+            time.sleep(0.01)
+        started = time.perf_counter()
+        infos = [client.publish(_topic(i), PAYLOAD, qos=qos) for i in range(messages)]
+        for info in infos:
+            info.wait_for_publish(timeout=60)
+        elapsed = time.perf_counter() - started
+    finally:
+        client.disconnect()
+        client.loop_stop()
+    return _result("thread", qos, messages, elapsed)
+
+
+async def _bench_asyncio(host: str, port: int, messages: int, qos: int, max_pending: int) -> float:
+    client = AsyncioMQTTClient(client_id="bench_transport_asyncio", max_pending=max_pending)
+    connected = asyncio.Event()
+    client.on_connect = lambda *args: connected.set()
+    client.connect(host, port)
+    client.loop_start()
+    try:
+        await asyncio.wait_for(connected.wait(), timeout=10)
+        started = time.perf_counter()
+        # 与模拟循环相同的方式：同步发布，发送队列积压时等待
+        for i in range(messages - 1):
+            if client.pending >= max_pending:
+                await client.wait_writable()
+            client.publish(_topic(i), PAYLOAD, qos=qos)
+        await client.publish_async(_topic(messages - 1), PAYLOAD, qos=qos)
+        # QoS 1按顺序确认，最后一条完成时之前的消息也已完成
+        while client._out_messages:
+            await asyncio.sleep(0.001)
+        return time.perf_counter() - started
+    finally:
+        client.disconnect()
+        client.loop_stop()
+
+
+def bench_asyncio(host: str, port: int, messages: int, qos: int, use_uvloop: bool = False,
+                  max_pending: int = 1000) -> Dict[str, Any]:
+    """
+    使用asyncio原生传输发布消息
+
+    Args:
+        host: Broker地址
+        port: Broker端口
+        messages: 消息数量
+        qos: 服务质量等级
+        use_uvloop: 是否使用uvloop
+        max_pending: 发送队列背压阈值
+
+    Returns:
+        Dict[str, Any]: 测量结果
+    """
+    elapsed = asyncio.run(
+        _bench_asyncio(host, port, messages, qos, max_pending),
+        loop_factory=get_loop_factory(use_uvloop),
+    )
+    return _result("asyncio+uvloop" if use_uvloop else "asyncio", qos, messages, elapsed)
+
+
+def run(host: str, port: int, messages: int, qos_levels: List[int]) -> Dict[str, Any]:
+    """
+    运行传输基准测试
+
+    Args:
+        host: Broker地址
+        port: Broker端口
+        messages: 每项测试的消息数量
+        qos_levels: 测试的服务质量等级
+
+    Returns:
+        Dict[str, Any]: 测试结果
+    """
+    results = []
+    for qos in qos_levels:
+        results.append(bench_thread(host, port, messages, qos))
+        results.append(bench_asyncio(host, port, messages, qos))
+        if uvloop_available():
+            results.append(bench_asyncio(host, port, messages, qos, use_uvloop=True))
+    return {
+        "benchmark": "transport",
+        "environment": environment_info(),
+        "broker": f"{host}:{port}",
+        "results": results,
+    }
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="MQTT传输基准测试（需要可用的MQTT Broker）")
+    parser.add_argument("-b", "--broker", default="localhost", help="MQTT服务器地址")
+    parser.add_argument("-p", "--port", type=int, default=1883, help="MQTT服务器端口")
+    parser.add_argument("--messages", type=int, default=50000, help="每项测试的消息数量")
+    parser.add_argument("--qos", type=int, nargs="+", choices=[0, 1], default=[0, 1], help="测试的服务质量等级")
+    parser.add_argument("-o", "--output", help="结果输出文件（JSON），默认输出到标准输出")
+    parsed = parser.parse_args(args)
+
+    results = run(parsed.broker, parsed.port, parsed.messages, parsed.qos)
+    for result in results["results"]:
+        print(f"{result['transport']:>15} QoS {result['qos']}: {result['messages_per_second']:>10} 消息/秒")
+    if parsed.output:
+        write_results(results, parsed.output)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,11 +4,13 @@ import argparse
 import asyncio
 import logging
 import sys
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from . import __version__
 from .config import MQTTConfig, create_default_config
 from .engine import AppService
+from .engine.load_profile import resolve_profile
+from .engine.mqtt_asyncio import get_loop_factory
 from .utils.logging import setup_logging
 
 logger = logging.getLogger(__name__)
@@ -32,7 +34,59 @@ def parse_args(args: Optional[List[str]] = None) -> argparse.Namespace:
     parser.add_argument("-p", "--port", type=int, help="MQTT服务器端口", default=mqtt_config.broker_port)
     parser.add_argument("-u", "--username", help="MQTT用户名", default=mqtt_config.username)
     parser.add_argument("--password", help="MQTT密码", default=mqtt_config.password)
+    parser.add_argument("--connections", type=int, help="MQTT连接数，大于1时设备按ID分配到多个连接", default=mqtt_config.connections)
+    parser.add_argument("--transport", choices=["thread", "asyncio", "inprocess"], default=mqtt_config.transport,
+                        help="MQTT传输方式：thread使用paho网络线程，asyncio在事件循环中处理网络I/O并提供背压，"
+                             "inprocess不经过套接字直接连接内嵌Broker")
+    parser.add_argument("--embedded-broker", action="store_true",
+                        help="在本进程中运行内嵌MQTT Broker，监听 --broker 和 --port 指定的地址（inprocess传输时不监听）")
+    parser.add_argument("--uvloop", action="store_true", help="使用uvloop事件循环（需要安装uvloop）")
+    parser.add_argument("--rate-limit", type=float, help="全局发布速率上限（消息/秒）")
+    parser.add_argument("--component-rate-limit", action="append", default=[], metavar="COMPONENT=RATE",
+                        help="按组件类型的发布速率上限，如 light=5，可重复指定")
+    parser.add_argument("--device-rate-limit", type=float, help="每个设备的发布速率上限（消息/秒）")
+    parser.add_argument("--rate-limit-policy", choices=["delay", "drop", "latest"], default="delay",
+                        help="超出速率时的策略：delay排队，drop丢弃，latest每个主题只保留最新状态")
+    parser.add_argument("--rate-burst", type=float, default=1.0, help="限速的突发容量（秒），桶容量 = 速率 × 该值")
+    parser.add_argument("--load-profile", help="按负载曲线文件中指定名称的曲线改变发布速率和活跃设备比例")
+    parser.add_argument("--profile-file", default="profiles.json", help="负载曲线文件路径")
+    parser.add_argument("--load-report", help="负载曲线实际速率报告文件（JSON Lines）")
+    parser.add_argument("--load-report-interval", type=float, default=10.0, help="负载曲线报告间隔（秒）")
+    parser.add_argument("--serializer", choices=["json", "json-compact", "orjson", "auto"], default="json",
+                        help="JSON序列化后端：json为标准库默认格式，json-compact和orjson为紧凑格式，"
+                             "auto在安装了orjson时使用orjson，否则使用json-compact")
+    parser.add_argument("--trace-spans", help="命令往返延迟分段记录文件（JSON Lines）")
+    parser.add_argument("--startup-batch", type=int, default=100, help="启动时每批发布发现信息的设备数量")
+    parser.add_argument("--startup-rate", type=float, default=2000,
+                        help="启动时发现信息的最大发布速率（条/秒），0表示不限速")
+    parser.add_argument("--startup-ack-timeout", type=float, default=10,
+                        help="启动时等待每批发现信息PUBACK的最长时间（秒）")
+    parser.add_argument("--ha-status-topic", help="Home Assistant的状态主题（birth消息），默认为 <MQTT_ROOT_PREFIX>/status")
+    parser.add_argument("--resync-settle", type=float, default=1.0,
+                        help="Home Assistant重启后等待Broker发送保留的发现信息的最长时间（秒）")
+    parser.add_argument("--no-ha-resync", action="store_true",
+                        help="不订阅Home Assistant的状态主题，Home Assistant重启后不重新发布发现信息和状态")
+    parser.add_argument("--command-subscription", choices=["wildcard", "device"], default="wildcard",
+                        help="命令订阅方式：wildcard只订阅 <MQTT_ROOT_PREFIX>/+/+/set，device为每个设备订阅一次")
+    parser.add_argument("--command-queue-size", type=int, default=10000,
+                        help="命令队列容量，网络线程收到的命令在事件循环中分批处理，0表示在网络线程中直接处理")
+    parser.add_argument("--command-queue-policy", choices=["drop_oldest", "drop_newest"], default="drop_oldest",
+                        help="命令队列已满时丢弃最旧或最新的命令")
+    parser.add_argument("--command-batch", type=int, default=500, help="每次事件循环迭代最多处理的命令数")
+    parser.add_argument("--coalesce-window", type=float, default=0,
+                        help="同一设备的命令合并窗口（毫秒），窗口内的命令合并为一次状态更新，0表示不合并")
+    parser.add_argument("--no-transitions", action="store_true",
+                        help="禁用定时状态转换（布防延迟、窗帘行程、灯光渐变、门锁动作），设备立即给出最终状态")
+    parser.add_argument("--stochastic", choices=["tick", "geometric", "exponential"], default="geometric",
+                        help="随机状态转换（如灯光开关、报警触发）的方式：tick每个模拟周期掷骰子，"
+                             "geometric按几何分布抽取下一次事件（与tick同分布），exponential按指数分布在连续时间上抽取")
+    parser.add_argument("--max-slice", type=float, default=10,
+                        help="模拟循环不让出事件循环的最长连续执行时间（毫秒），超过时分成多个时间片，使API保持响应，0表示不切分")
     parser.add_argument("-i", "--interval", type=int, help="模拟更新间隔（秒）", default=10)
+    parser.add_argument("--heartbeat", type=float, help="状态未变化时重新发布的心跳间隔（秒），0表示只发布变化", default=60)
+    parser.add_argument("--engine", choices=["object", "vectorized"], default="object",
+                        help="模拟引擎：object逐设备模拟，vectorized使用NumPy按列模拟数值设备（需要numpy）")
+    parser.add_argument("--workers", type=int, default=1, help="模拟工作进程数量，大于1时按设备ID分片到多个进程")
     parser.add_argument("-v", "--verbose", action="store_true", help="启用详细日志")
     parser.add_argument("--no-rich", action="store_true", help="禁用富文本日志格式")
     parser.add_argument("--log-file", help="日志文件路径")
@@ -41,7 +95,39 @@ def parse_args(args: Optional[List[str]] = None) -> argparse.Namespace:
     parser.add_argument("--api-port", type=int, help="API服务器端口", default=8080)
     parser.add_argument("--disable-api", action="store_true", help="禁用API服务器")
 
-    return parser.parse_args(args)
+    parsed_args = parser.parse_args(args)
+    
+    # 解析按组件类型的限速
+    component_rates = {}
+    for item in parsed_args.component_rate_limit:
+        component, _, rate = item.partition("=")
+        try:
+            component_rates[component.strip()] = float(rate)
+        except ValueError:
+            parser.error(f"无效的组件限速: {item}，格式应为 COMPONENT=RATE")
+    parsed_args.component_rate_limit = component_rates
+    
+    return parsed_args
+
+def build_rate_limits(parsed_args: argparse.Namespace) -> Optional[Dict[str, Any]]:
+    """
+    根据命令行参数生成发布限速配置
+    
+    Args:
+        parsed_args: 解析后的参数
+        
+    Returns:
+        Optional[Dict[str, Any]]: 限速配置，未配置任何速率时为None
+    """
+    if not (parsed_args.rate_limit or parsed_args.component_rate_limit or parsed_args.device_rate_limit):
+        return None
+    return {
+        "global_rate": parsed_args.rate_limit,
+        "component_rates": parsed_args.component_rate_limit,
+        "device_rate": parsed_args.device_rate_limit,
+        "policy": parsed_args.rate_limit_policy,
+        "burst": parsed_args.rate_burst,
+    }
 
 async def main(args: Optional[List[str]] = None) -> int:
     """
@@ -67,14 +153,55 @@ async def main(args: Optional[List[str]] = None) -> int:
         broker_port=parsed_args.port,
         username=parsed_args.username,
         password=parsed_args.password,
+        connections=parsed_args.connections,
+        transport=parsed_args.transport,
     )
     logger.debug(f"MQTT配置: {mqtt_config}")
     
+    # 加载负载曲线
+    load_profile = None
+    if parsed_args.load_profile:
+        try:
+            load_profile = resolve_profile(parsed_args.load_profile, parsed_args.profile_file)
+        except (ValueError, OSError) as e:
+            logger.error(f"加载负载曲线失败: {e}")
+            return 1
+    
     # 创建应用服务
     service = AppService(
         mqtt_config=mqtt_config,
         config_file=parsed_args.config_file,
         mock_interval=parsed_args.interval,
+        heartbeat_interval=parsed_args.heartbeat,
+        engine=parsed_args.engine,
+        workers=parsed_args.workers,
+        use_uvloop=parsed_args.uvloop,
+        embedded_broker=parsed_args.embedded_broker,
+        rate_limits=build_rate_limits(parsed_args),
+        load_profile=load_profile,
+        load_report=parsed_args.load_report,
+        load_report_interval=parsed_args.load_report_interval,
+        trace_spans=parsed_args.trace_spans,
+        serializer=parsed_args.serializer,
+        startup={
+            "batch_size": parsed_args.startup_batch,
+            "rate": parsed_args.startup_rate,
+            "ack_timeout": parsed_args.startup_ack_timeout,
+        },
+        ha_resync=None if parsed_args.no_ha_resync else {
+            "status_topic": parsed_args.ha_status_topic,
+            "settle": parsed_args.resync_settle,
+        },
+        command_subscription=parsed_args.command_subscription,
+        command_queue=None if parsed_args.command_queue_size <= 0 else {
+            "maxsize": parsed_args.command_queue_size,
+            "batch_size": parsed_args.command_batch,
+            "policy": parsed_args.command_queue_policy,
+        },
+        coalesce_window=parsed_args.coalesce_window / 1000,
+        transitions=not parsed_args.no_transitions,
+        stochastic=parsed_args.stochastic,
+        max_slice=parsed_args.max_slice / 1000,
         api_host=parsed_args.api_host,
         api_port=parsed_args.api_port,
         enable_api=not parsed_args.disable_api
@@ -106,8 +233,16 @@ async def main(args: Optional[List[str]] = None) -> int:
 
 def run():
     """命令行入口点"""
+    args = sys.argv[1:]
+    
+    # 基准测试子命令，不启动模拟服务
+    if args and args[0] == "bench":
+        from .bench.cli import main as bench_main
+        sys.exit(bench_main(args[1:]))
+    
     try:
-        sys.exit(asyncio.run(main()))
+        loop_factory = get_loop_factory(parse_args(args).uvloop)
+        sys.exit(asyncio.run(main(args), loop_factory=loop_factory))
     except KeyboardInterrupt:
         # 这里可能捕获到asyncio.run()本身的中断
         logger.info("程序已通过键盘中断退出")
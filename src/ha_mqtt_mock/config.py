@@ -40,6 +40,8 @@ class MQTTConfig(metaclass=Singleton):
     password: Optional[str] = field(default_factory=lambda: os.environ.get("MQTT_PASSWORD", None))
     client_id: str = field(default_factory=lambda: os.environ.get("MQTT_CLIENT_ID", "mock_device_client"))
     root_prefix: str = field(default_factory=lambda: os.environ.get("MQTT_ROOT_PREFIX", "homeassistant"))
+    connections: int = field(default_factory=lambda: int(os.environ.get("MQTT_CONNECTIONS", "1")))
+    transport: str = field(default_factory=lambda: os.environ.get("MQTT_TRANSPORT", "thread"))
     
     def __post_init__(self):
         """验证配置"""
@@ -49,6 +51,12 @@ class MQTTConfig(metaclass=Singleton):
         
         if not isinstance(self.broker_port, int) or self.broker_port <= 0:
             raise ValueError(f"无效的MQTT端口号: {self.broker_port}")
+        
+        if not isinstance(self.connections, int) or self.connections <= 0:
+            raise ValueError(f"无效的MQTT连接数: {self.connections}")
+        
+        if self.transport not in ("thread", "asyncio", "inprocess"):
+            raise ValueError(f"无效的MQTT传输方式: {self.transport}")
             
         # 如果提供了用户名但没有密码，发出警告
         if self.username and not self.password:
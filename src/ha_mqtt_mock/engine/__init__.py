@@ -1,11 +1,13 @@
 from .device_config import DeviceConfig
 from .mock import MockDeviceManager
 from .mqtt_client import create_mqtt_client, setup_mqtt_client, disconnect_mqtt_client
+from .sharding import ShardedDeviceManager
 from .service import AppService
 
 __all__ = [
     "DeviceConfig",
     "MockDeviceManager",
+    "ShardedDeviceManager",
     "create_mqtt_client",
     "setup_mqtt_client",
     "disconnect_mqtt_client",
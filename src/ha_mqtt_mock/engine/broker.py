@@ -0,0 +1,838 @@
+"""内嵌MQTT Broker模块
+
+实现模拟器用到的MQTT 3.1.1/5子集：CONNECT（含遗嘱消息）、QoS 0/1的PUBLISH、保留消息、
+带通配符的SUBSCRIBE/UNSUBSCRIBE、PINGREQ和DISCONNECT。不支持QoS 2和持久会话。
+
+两种接入方式：
+    - 回环TCP监听，任何MQTT客户端（包括paho）都可以连接
+    - 进程内客户端（InProcessClient），接口与paho客户端一致但不经过套接字
+
+Broker记录每个主题的消息数、字节数、投递次数和投递延迟，并保留最近的消息记录，便于测试断言流量。
+Broker的方法需要在同一个线程（通常是事件循环线程）中调用。
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 报文类型
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+MQTT_V311 = 4
+MQTT_V5 = 5
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """
+    判断主题是否匹配订阅过滤器（支持+和#通配符）
+
+    Args:
+        topic_filter: 订阅过滤器
+        topic: 主题
+
+    Returns:
+        bool: 是否匹配
+    """
+    filter_parts = topic_filter.split("/")
+    topic_parts = topic.split("/")
+    # 以$开头的主题不匹配以通配符开头的过滤器
+    if topic.startswith("$") and filter_parts[0] in ("+", "#"):
+        return False
+    for i, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != "+" and part != topic_parts[i]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+def _is_wildcard(topic_filter: str) -> bool:
+    return "+" in topic_filter or "#" in topic_filter
+
+
+class BrokerMessage:
+    """Broker中流转的消息，同时作为进程内客户端收到的消息（属性与paho的MQTTMessage一致）"""
+
+    __slots__ = ("topic", "payload", "qos", "retain", "mid", "client_id", "received")
+
+    def __init__(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False,
+                 client_id: Optional[str] = None, received: Optional[float] = None) -> None:
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = 0
+        self.client_id = client_id
+        # Broker收到消息的时间（perf_counter），用于计算投递延迟
+        self.received = time.perf_counter() if received is None else received
+
+    def copy_for(self, qos: int, retain: bool) -> "BrokerMessage":
+        """生成投递给某个订阅者的副本"""
+        return BrokerMessage(self.topic, self.payload, qos, retain, self.client_id, self.received)
+
+    def __repr__(self) -> str:
+        return f"BrokerMessage(topic={self.topic!r}, payload={self.payload!r}, qos={self.qos}, retain={self.retain})"
+
+
+class TopicStats:
+    """单个主题的流量统计"""
+
+    __slots__ = ("messages", "bytes", "deliveries", "latency_total", "latency_max")
+
+    def __init__(self) -> None:
+        self.messages = 0
+        self.bytes = 0
+        self.deliveries = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "deliveries": self.deliveries,
+            "latency_avg_ms": round(self.latency_total / self.deliveries * 1000, 3) if self.deliveries else None,
+            "latency_max_ms": round(self.latency_max * 1000, 3),
+        }
+
+
+class _Session(ABC):
+    """一个已连接的客户端"""
+
+    def __init__(self, client_id: str) -> None:
+        self.client_id = client_id
+        self.will: Optional[BrokerMessage] = None
+        self.subscriptions: Dict[str, int] = {}
+        self.connected = True
+
+    @abstractmethod
+    def deliver(self, message: BrokerMessage) -> None:
+        """
+        把消息投递给客户端
+
+        Args:
+            message: 要投递的消息（QoS已按订阅降级）
+        """
+        pass
+
+    def close(self) -> None:
+        self.connected = False
+
+
+class Broker:
+    """内嵌MQTT Broker"""
+
+    def __init__(self, history: int = 1000) -> None:
+        """
+        初始化Broker
+
+        Args:
+            history: 保留的最近消息记录条数，0表示不记录
+        """
+        self.sessions: Dict[str, _Session] = {}
+        # 精确主题的订阅直接查表，通配符订阅逐个匹配
+        self._exact: Dict[str, Dict[_Session, int]] = {}
+        self._wildcards: Dict[str, Dict[_Session, int]] = {}
+        self.retained: Dict[str, BrokerMessage] = {}
+        self.topic_stats: Dict[str, TopicStats] = {}
+        self.history: Deque[BrokerMessage] = deque(maxlen=history)
+        self._listeners: List[Callable[[BrokerMessage], None]] = []
+        self._pending: Deque[Tuple[_Session, BrokerMessage]] = deque()
+        self._dispatching = False
+        self._client_ids = itertools.count(1)
+        self._tcp_sessions: Set["_TCPSession"] = set()
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.host: Optional[str] = None
+        self.port: Optional[int] = None
+        self.messages_in = 0
+        self.messages_out = 0
+        self.connections = 0
+
+    # ---- 监听 ----
+
+    async def start(self, host: str = "127.0.0.1", port: int = 1883) -> int:
+        """
+        开始在TCP端口上监听
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示自动分配
+
+        Returns:
+            int: 实际监听的端口
+        """
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        self.host = host
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"内嵌MQTT Broker已在 {host}:{self.port} 上监听")
+        return self.port
+
+    async def stop(self) -> None:
+        """停止监听并断开所有TCP连接"""
+        if self.server is not None:
+            self.server.close()
+            for session in list(self._tcp_sessions):
+                session.writer.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        session = _TCPSession(self, reader, writer)
+        self._tcp_sessions.add(session)
+        try:
+            await session.run()
+        finally:
+            self._tcp_sessions.discard(session)
+
+    # ---- 会话 ----
+
+    def client(self, client_id: str = "") -> "InProcessClient":
+        """
+        创建进程内客户端
+
+        Args:
+            client_id: 客户端ID，为空时自动生成
+
+        Returns:
+            InProcessClient: 进程内客户端
+        """
+        return InProcessClient(self, client_id)
+
+    def _generate_client_id(self) -> str:
+        return f"auto-{next(self._client_ids)}"
+
+    def register(self, session: _Session) -> None:
+        """注册新连接，同一客户端ID的旧连接被踢下线（不发送遗嘱）"""
+        old = self.sessions.get(session.client_id)
+        if old is not None and old is not session:
+            logger.debug(f"客户端 {session.client_id} 重复连接，断开旧连接")
+            old.will = None
+            self.unregister(old, clean=True)
+            old.close()
+        self.sessions[session.client_id] = session
+        self.connections += 1
+
+    def unregister(self, session: _Session, clean: bool) -> None:
+        """
+        注销连接并移除其订阅，非正常断开时发布遗嘱消息
+
+        Args:
+            session: 连接
+            clean: 是否为正常断开（收到DISCONNECT）
+        """
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+        for topic_filter in list(session.subscriptions):
+            self.unsubscribe(session, topic_filter)
+        will, session.will = session.will, None
+        session.connected = False
+        if not clean and will is not None:
+            logger.debug(f"客户端 {session.client_id} 异常断开，发布遗嘱消息到 {will.topic}")
+            will.received = time.perf_counter()
+            self.route(will)
+
+    def disconnect_client(self, client_id: str, clean: bool = False) -> bool:
+        """
+        强制断开客户端，默认模拟网络中断（会发布遗嘱消息）
+
+        Args:
+            client_id: 客户端ID
+            clean: 是否按正常断开处理
+
+        Returns:
+            bool: 客户端是否存在
+        """
+        session = self.sessions.get(client_id)
+        if session is None:
+            return False
+        self.unregister(session, clean)
+        session.close()
+        return True
+
+    # ---- 订阅 ----
+
+    def subscribe(self, session: _Session, topic_filter: str, qos: int = 0) -> int:
+        """
+        添加订阅并投递匹配的保留消息
+
+        Args:
+            session: 连接
+            topic_filter: 订阅过滤器
+            qos: 请求的服务质量等级
+
+        Returns:
+            int: 授予的服务质量等级（最高为1）
+        """
+        granted = min(qos, 1)
+        table = self._wildcards if _is_wildcard(topic_filter) else self._exact
+        table.setdefault(topic_filter, {})[session] = granted
+        session.subscriptions[topic_filter] = granted
+
+        if self.retained:
+            if _is_wildcard(topic_filter):
+                matches = [message for topic, message in self.retained.items() if topic_matches(topic_filter, topic)]
+            else:
+                matches = [self.retained[topic_filter]] if topic_filter in self.retained else []
+            for message in matches:
+                # 延迟只统计实时转发，保留消息按订阅时刻计时
+                retained = message.copy_for(min(message.qos, granted), True)
+                retained.received = time.perf_counter()
+                self._enqueue(session, retained)
+            self._dispatch()
+        return granted
+
+    def unsubscribe(self, session: _Session, topic_filter: str) -> None:
+        """
+        移除订阅
+
+        Args:
+            session: 连接
+            topic_filter: 订阅过滤器
+        """
+        session.subscriptions.pop(topic_filter, None)
+        table = self._wildcards if _is_wildcard(topic_filter) else self._exact
+        subscribers = table.get(topic_filter)
+        if subscribers is not None:
+            subscribers.pop(session, None)
+            if not subscribers:
+                del table[topic_filter]
+
+    # ---- 发布 ----
+
+    def add_listener(self, listener: Callable[[BrokerMessage], None]) -> None:
+        """
+        添加消息监听器，每条发布到Broker的消息都会调用一次
+
+        Args:
+            listener: 回调函数，参数为BrokerMessage
+        """
+        self._listeners.append(listener)
+
+    def publish(self, topic: str, payload: Any = b"", qos: int = 0, retain: bool = False) -> None:
+        """
+        由Broker直接发布消息（例如模拟Home Assistant发送命令）
+
+        Args:
+            topic: 主题
+            payload: 负载
+            qos: 服务质量等级
+            retain: 是否保留
+        """
+        self.route(BrokerMessage(topic, _to_bytes(payload), qos, retain))
+
+    def route(self, message: BrokerMessage) -> None:
+        """
+        处理收到的消息：统计、保存保留消息并投递给所有匹配的订阅者
+
+        Args:
+            message: 消息
+        """
+        self.messages_in += 1
+        stats = self.topic_stats.get(message.topic)
+        if stats is None:
+            stats = self.topic_stats[message.topic] = TopicStats()
+        stats.messages += 1
+        stats.bytes += len(message.payload)
+        if self.history.maxlen:
+            self.history.append(message)
+        for listener in self._listeners:
+            listener(message)
+
+        if message.retain:
+            if message.payload:
+                self.retained[message.topic] = message
+            else:
+                # 空负载的保留消息表示删除
+                self.retained.pop(message.topic, None)
+
+        # 同一连接有多个订阅匹配时按最高QoS投递一次
+        targets: Dict[_Session, int] = {}
+        subscribers = self._exact.get(message.topic)
+        if subscribers:
+            targets.update(subscribers)
+        for topic_filter, subscribers in self._wildcards.items():
+            if topic_matches(topic_filter, message.topic):
+                for session, qos in subscribers.items():
+                    if targets.get(session, -1) < qos:
+                        targets[session] = qos
+        for session, qos in targets.items():
+            # 转发给订阅者时保留标志为0（MQTT 3.1.1 3.3.1.3）
+            self._enqueue(session, message.copy_for(min(message.qos, qos), False))
+        self._dispatch()
+
+    def _enqueue(self, session: _Session, message: BrokerMessage) -> None:
+        self._pending.append((session, message))
+
+    def _dispatch(self) -> None:
+        """投递排队的消息；回调中再次发布的消息排在队尾，避免递归"""
+        if self._dispatching:
+            return
+        self._dispatching = True
+        try:
+            while self._pending:
+                session, message = self._pending.popleft()
+                if not session.connected:
+                    continue
+                try:
+                    session.deliver(message)
+                except Exception as e:
+                    logger.exception(f"向客户端 {session.client_id} 投递消息时发生错误: {e}")
+                    continue
+                self.messages_out += 1
+                latency = time.perf_counter() - message.received
+                stats = self.topic_stats.get(message.topic)
+                if stats is not None:
+                    stats.deliveries += 1
+                    stats.latency_total += latency
+                    if latency > stats.latency_max:
+                        stats.latency_max = latency
+        finally:
+            self._dispatching = False
+
+    # ---- 统计 ----
+
+    def messages(self, topic_filter: str = "#") -> List[BrokerMessage]:
+        """
+        获取最近记录中匹配过滤器的消息
+
+        Args:
+            topic_filter: 主题过滤器
+
+        Returns:
+            List[BrokerMessage]: 消息列表（按收到的顺序）
+        """
+        return [message for message in self.history if topic_matches(topic_filter, message.topic)]
+
+    def get_topic_stats(self, topic_filter: str = "#") -> Dict[str, Dict[str, Any]]:
+        """
+        获取匹配过滤器的主题的流量统计
+
+        Args:
+            topic_filter: 主题过滤器
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 以主题为键的统计
+        """
+        return {
+            topic: stats.to_dict()
+            for topic, stats in self.topic_stats.items()
+            if topic_matches(topic_filter, topic)
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取Broker的总体统计
+
+        Returns:
+            Dict[str, Any]: 统计数据
+        """
+        deliveries = sum(stats.deliveries for stats in self.topic_stats.values())
+        latency_total = sum(stats.latency_total for stats in self.topic_stats.values())
+        return {
+            "listening": f"{self.host}:{self.port}" if self.server is not None else None,
+            "clients": len(self.sessions),
+            "connections": self.connections,
+            "subscriptions": sum(len(s) for s in self._exact.values()) + sum(len(s) for s in self._wildcards.values()),
+            "retained": len(self.retained),
+            "topics": len(self.topic_stats),
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+            "latency_avg_ms": round(latency_total / deliveries * 1000, 3) if deliveries else None,
+            "latency_max_ms": round(max((s.latency_max for s in self.topic_stats.values()), default=0.0) * 1000, 3),
+        }
+
+
+def _to_bytes(payload: Any) -> bytes:
+    if payload is None:
+        return b""
+    if isinstance(payload, str):
+        return payload.encode("utf-8")
+    if isinstance(payload, (int, float)):
+        return str(payload).encode("utf-8")
+    return bytes(payload)
+
+
+# ---- TCP连接 ----
+
+def _encode_length(length: int) -> bytes:
+    """编码剩余长度（变长整数）"""
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def _encode_string(value: bytes) -> bytes:
+    return len(value).to_bytes(2, "big") + value
+
+
+class _Reader:
+    """报文体解析器"""
+
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.pos = 0
+
+    def byte(self) -> int:
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def uint16(self) -> int:
+        value = int.from_bytes(self.data[self.pos:self.pos + 2], "big")
+        self.pos += 2
+        return value
+
+    def binary(self) -> bytes:
+        length = self.uint16()
+        value = self.data[self.pos:self.pos + length]
+        self.pos += length
+        return value
+
+    def string(self) -> str:
+        return self.binary().decode("utf-8")
+
+    def varint(self) -> int:
+        value, multiplier = 0, 1
+        while True:
+            byte = self.byte()
+            value += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                return value
+
+    def skip_properties(self) -> None:
+        """跳过MQTT 5的属性"""
+        self.pos += self.varint()
+
+    def rest(self) -> bytes:
+        return self.data[self.pos:]
+
+    def remaining(self) -> bool:
+        return self.pos < len(self.data)
+
+
+class _TCPSession(_Session):
+    """通过TCP连接的客户端"""
+
+    def __init__(self, broker: Broker, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        super().__init__("")
+        self.connected = False
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.protocol = MQTT_V311
+        self._mids = itertools.cycle(range(1, 65536))
+        self.inflight: Dict[int, BrokerMessage] = {}
+
+    def _send(self, packet_type: int, flags: int, body: bytes) -> None:
+        self.writer.write(bytes(((packet_type << 4) | flags,)) + _encode_length(len(body)) + body)
+
+    def deliver(self, message: BrokerMessage) -> None:
+        body = _encode_string(message.topic.encode("utf-8"))
+        if message.qos:
+            mid = next(self._mids)
+            self.inflight[mid] = message
+            body += mid.to_bytes(2, "big")
+        if self.protocol == MQTT_V5:
+            body += b"\x00"
+        self._send(PUBLISH, (message.qos << 1) | int(message.retain), body + message.payload)
+
+    def close(self) -> None:
+        super().close()
+        self.writer.close()
+
+    async def _read_packet(self) -> Tuple[int, int, bytes]:
+        header = (await self.reader.readexactly(1))[0]
+        length, multiplier = 0, 1
+        while True:
+            byte = (await self.reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                break
+        body = await self.reader.readexactly(length) if length else b""
+        return header >> 4, header & 0x0F, body
+
+    async def run(self) -> None:
+        clean = False
+        try:
+            packet_type, _, body = await self._read_packet()
+            if packet_type != CONNECT:
+                return
+            self._on_connect(_Reader(body))
+            while True:
+                packet_type, flags, body = await self._read_packet()
+                if packet_type == PUBLISH:
+                    self._on_publish(flags, _Reader(body))
+                elif packet_type == PUBACK:
+                    self.inflight.pop(int.from_bytes(body[:2], "big"), None)
+                elif packet_type == SUBSCRIBE:
+                    self._on_subscribe(_Reader(body))
+                elif packet_type == UNSUBSCRIBE:
+                    self._on_unsubscribe(_Reader(body))
+                elif packet_type == PINGREQ:
+                    self._send(PINGRESP, 0, b"")
+                elif packet_type == DISCONNECT:
+                    clean = True
+                    break
+                else:
+                    logger.warning(f"内嵌Broker不支持的报文类型 {packet_type}，断开客户端 {self.client_id}")
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.exception(f"处理客户端 {self.client_id} 的报文时发生错误: {e}")
+        finally:
+            if self.connected:
+                self.broker.unregister(self, clean)
+            self.connected = False
+            self.writer.close()
+
+    def _on_connect(self, reader: _Reader) -> None:
+        reader.string()  # 协议名
+        self.protocol = reader.byte()
+        flags = reader.byte()
+        reader.uint16()  # keepalive
+        if self.protocol == MQTT_V5:
+            reader.skip_properties()
+        self.client_id = reader.string() or self.broker._generate_client_id()
+        if flags & 0x04:
+            if self.protocol == MQTT_V5:
+                reader.skip_properties()
+            topic = reader.string()
+            payload = reader.binary()
+            self.will = BrokerMessage(topic, payload, (flags >> 3) & 0x03, bool(flags & 0x20), self.client_id)
+        # 用户名和密码不做校验
+
+        self.connected = True
+        self.broker.register(self)
+        if self.protocol == MQTT_V5:
+            self._send(CONNACK, 0, b"\x00\x00\x00")
+        else:
+            self._send(CONNACK, 0, b"\x00\x00")
+
+    def _on_publish(self, flags: int, reader: _Reader) -> None:
+        qos = (flags >> 1) & 0x03
+        topic = reader.string()
+        if qos > 1:
+            raise ConnectionError("内嵌Broker不支持QoS 2")
+        mid = reader.uint16() if qos else 0
+        if self.protocol == MQTT_V5:
+            reader.skip_properties()
+        self.broker.route(BrokerMessage(topic, reader.rest(), qos, bool(flags & 0x01), self.client_id))
+        if qos:
+            self._send(PUBACK, 0, mid.to_bytes(2, "big"))
+
+    def _on_subscribe(self, reader: _Reader) -> None:
+        mid = reader.uint16()
+        if self.protocol == MQTT_V5:
+            reader.skip_properties()
+        requests = []
+        while reader.remaining():
+            requests.append((reader.string(), reader.byte() & 0x03))
+        # SUBACK需要在匹配的保留消息之前发送
+        granted = bytes(min(qos, 1) for _, qos in requests)
+        self._send(SUBACK, 0, mid.to_bytes(2, "big") + (b"\x00" if self.protocol == MQTT_V5 else b"") + granted)
+        for topic_filter, qos in requests:
+            self.broker.subscribe(self, topic_filter, qos)
+
+    def _on_unsubscribe(self, reader: _Reader) -> None:
+        mid = reader.uint16()
+        if self.protocol == MQTT_V5:
+            reader.skip_properties()
+        filters = []
+        while reader.remaining():
+            filters.append(reader.string())
+        for topic_filter in filters:
+            self.broker.unsubscribe(self, topic_filter)
+        if self.protocol == MQTT_V5:
+            self._send(UNSUBACK, 0, mid.to_bytes(2, "big") + b"\x00" + bytes(len(filters)))
+        else:
+            self._send(UNSUBACK, 0, mid.to_bytes(2, "big"))
+
+
+# ---- 进程内客户端 ----
+
+class InProcessPublishInfo:
+    """发布结果，属性与paho的MQTTMessageInfo一致"""
+
+    __slots__ = ("rc", "mid")
+
+    def __init__(self, rc: int, mid: int) -> None:
+        self.rc = rc
+        self.mid = mid
+
+    def is_published(self) -> bool:
+        return self.rc == 0
+
+    def wait_for_publish(self, timeout: Optional[float] = None) -> None:
+        return None
+
+
+class InProcessClient(_Session):
+    """
+    不经过套接字直接连接内嵌Broker的客户端
+
+    提供模拟器使用的paho客户端接口（connect、publish、subscribe、on_message等），
+    消息在调用publish时同步路由，订阅者的on_message回调在同一线程中执行
+    """
+
+    # 与paho的错误码一致
+    MQTT_ERR_SUCCESS = 0
+    MQTT_ERR_NO_CONN = 4
+
+    def __init__(self, broker: Broker, client_id: str = "") -> None:
+        super().__init__(client_id or broker._generate_client_id())
+        self.connected = False
+        self.broker = broker
+        self.on_message: Optional[Callable] = None
+        self.on_connect: Optional[Callable] = None
+        self.on_disconnect: Optional[Callable] = None
+        self._userdata: Any = None
+        self._mids = itertools.count(1)
+        self._thread_terminate = False
+        self.published = 0
+        self.received = 0
+        self.bytes = 0
+
+    @property
+    def _client_id(self) -> bytes:
+        return self.client_id.encode("utf-8")
+
+    def user_data_set(self, userdata: Any) -> None:
+        self._userdata = userdata
+
+    def username_pw_set(self, username: Optional[str], password: Optional[str] = None) -> None:
+        """进程内连接不做认证"""
+
+    def will_set(self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False) -> None:
+        """设置遗嘱消息，在Broker.disconnect_client模拟异常断开时发布"""
+        self.will = BrokerMessage(topic, _to_bytes(payload), qos, retain, self.client_id)
+
+    def connect(self, host: Optional[str] = None, port: Optional[int] = None, keepalive: int = 60) -> int:
+        """连接到内嵌Broker，host和port被忽略"""
+        self.connected = True
+        self.broker.register(self)
+        if self.on_connect is not None:
+            self.on_connect(self, self._userdata, {}, 0)
+        return self.MQTT_ERR_SUCCESS
+
+    def reconnect(self) -> int:
+        return self.connect()
+
+    def loop_start(self) -> int:
+        self._thread_terminate = False
+        return self.MQTT_ERR_SUCCESS
+
+    def loop_stop(self) -> int:
+        self._thread_terminate = True
+        return self.MQTT_ERR_SUCCESS
+
+    def disconnect(self) -> int:
+        """正常断开，不发布遗嘱消息"""
+        if self.connected:
+            self.broker.unregister(self, clean=True)
+            self.close()
+        return self.MQTT_ERR_SUCCESS
+
+    def close(self) -> None:
+        was_connected = self.connected
+        super().close()
+        if was_connected and self.on_disconnect is not None:
+            self.on_disconnect(self, self._userdata, 0)
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def publish(self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False,
+                properties=None) -> InProcessPublishInfo:
+        """发布消息，接口与paho.mqtt.client.Client.publish一致"""
+        mid = next(self._mids)
+        if not self.connected:
+            return InProcessPublishInfo(self.MQTT_ERR_NO_CONN, mid)
+        data = _to_bytes(payload)
+        self.published += 1
+        self.bytes += len(data)
+        self.broker.route(BrokerMessage(topic, data, min(qos, 1), retain, self.client_id))
+        return InProcessPublishInfo(self.MQTT_ERR_SUCCESS, mid)
+
+    def subscribe(self, topic, qos: int = 0, options=None, properties=None) -> Tuple[int, int]:
+        """订阅主题，topic可以是字符串、(主题, QoS)元组或元组列表"""
+        if not self.connected:
+            return self.MQTT_ERR_NO_CONN, 0
+        requests: Iterable[Tuple[str, int]]
+        if isinstance(topic, str):
+            requests = [(topic, qos)]
+        elif isinstance(topic, tuple):
+            requests = [topic]
+        else:
+            requests = topic
+        for topic_filter, requested in requests:
+            self.broker.subscribe(self, topic_filter, requested)
+        return self.MQTT_ERR_SUCCESS, next(self._mids)
+
+    def unsubscribe(self, topic, properties=None) -> Tuple[int, int]:
+        for topic_filter in ([topic] if isinstance(topic, str) else topic):
+            self.broker.unsubscribe(self, topic_filter)
+        return self.MQTT_ERR_SUCCESS, next(self._mids)
+
+    def deliver(self, message: BrokerMessage) -> None:
+        self.received += 1
+        if self.on_message is not None:
+            self.on_message(self, self._userdata, message)
+
+    def connection_stats(self) -> Dict[str, Any]:
+        """
+        获取连接统计（与连接池的统计格式一致）
+
+        Returns:
+            Dict[str, Any]: 统计数据
+        """
+        return {
+            "client_id": self.client_id,
+            "connected": self.connected,
+            "published": self.published,
+            "bytes": self.bytes,
+            "received": self.received,
+            "transport": "inprocess",
+        }
+
+
+# 当前进程的内嵌Broker，进程内传输的客户端连接到它
+_embedded_broker: Optional[Broker] = None
+
+
+def set_embedded_broker(broker: Optional[Broker]) -> None:
+    """
+    设置当前进程的内嵌Broker
+
+    Args:
+        broker: 内嵌Broker，为None时清除
+    """
+    global _embedded_broker
+    _embedded_broker = broker
+
+
+def get_embedded_broker() -> Optional[Broker]:
+    """
+    获取当前进程的内嵌Broker
+
+    Returns:
+        Optional[Broker]: 内嵌Broker，未设置时为None
+    """
+    return _embedded_broker
@@ -0,0 +1,126 @@
+"""命令合并模块
+
+自动化批量切换场景或在界面中拖动滑块时，同一设备会在几毫秒内收到大量命令，每条命令都会执行一次
+update_state和一次状态发布。启用合并后，设备收到第一条命令时开始一个时间窗口，窗口内到达的命令
+按顺序合并（同一个键以最后一次为准），窗口结束时只调用一次update_state并发布一次状态。
+
+合并在事件循环中进行；在paho网络线程中直接处理的命令（未使用命令队列时）不合并。
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from ha_mqtt_mock.models import MQTTDevice
+from ha_mqtt_mock.utils.metrics import COMMANDS_COALESCED
+from ha_mqtt_mock.utils.tracing import get_tracer
+
+logger = logging.getLogger(__name__)
+
+
+class CommandCoalescer:
+    """按设备合并时间窗口内的命令"""
+
+    def __init__(self, window: float) -> None:
+        """
+        初始化命令合并器
+
+        Args:
+            window: 合并窗口（秒），从设备收到第一条命令开始计算
+        """
+        if window <= 0:
+            raise ValueError(f"无效的命令合并窗口: {window}")
+        self.window = window
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[int] = None
+        # 设备到 [客户端, 合并后的状态更新, 定时器]
+        self._pending: Dict[MQTTDevice, List[Any]] = {}
+
+        self.commands = 0
+        self.updates = 0
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        绑定事件循环（需要在该事件循环的线程中调用）
+
+        Args:
+            loop: 事件循环
+        """
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+
+    def in_loop_thread(self) -> bool:
+        """当前线程是否为绑定的事件循环线程"""
+        return threading.get_ident() == self.loop_thread
+
+    def add(self, client, device: MQTTDevice, payload: Dict[str, Any]) -> None:
+        """
+        合并一条已解析的命令（在事件循环中调用）
+
+        Args:
+            client: 收到命令的MQTT客户端，窗口结束时用最后一条命令的客户端发布状态
+            device: 目标设备
+            payload: 状态更新
+        """
+        self.commands += 1
+        entry = self._pending.get(device)
+        if entry is None:
+            handle = self.loop.call_later(self.window, self._flush, device)
+            self._pending[device] = [client, dict(payload), handle]
+        else:
+            entry[0] = client
+            entry[1].update(payload)
+            COMMANDS_COALESCED.inc()
+
+    def _flush(self, device: MQTTDevice) -> None:
+        """窗口结束，把合并后的命令应用到设备"""
+        entry = self._pending.pop(device, None)
+        if entry is None:
+            return
+        client, payload, _ = entry
+        self.updates += 1
+        tracer = get_tracer()
+        span = tracer.pending.get(device.state_topic) if tracer is not None else None
+        try:
+            device.update_state(client, payload)
+        except Exception as e:
+            logger.exception(f"应用设备 '{device.name}' 的合并命令时发生错误: {e}")
+        if span is not None:
+            # 合并后的命令没有引起状态发布时丢弃窗口中最后一个命令的追踪
+            tracer.settle(device.state_topic, span)
+
+    def discard(self, device: Optional[MQTTDevice] = None) -> None:
+        """
+        丢弃等待中的命令（设备被移除时调用）
+
+        Args:
+            device: 设备，为None时丢弃所有设备的命令
+        """
+        devices = list(self._pending) if device is None else [device]
+        for pending_device in devices:
+            entry = self._pending.pop(pending_device, None)
+            if entry is not None:
+                entry[2].cancel()
+
+    def flush_all(self) -> None:
+        """立即应用所有等待中的命令（停止时调用）"""
+        for device in list(self._pending):
+            self._pending[device][2].cancel()
+            self._flush(device)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取合并统计
+
+        Returns:
+            Dict[str, Any]: 窗口、收到的命令数、实际执行的状态更新数、等待中的设备数和合并比例
+        """
+        return {
+            "window_ms": round(self.window * 1000, 3),
+            "commands": self.commands,
+            "updates": self.updates,
+            "pending": len(self._pending),
+            # 平均每次状态更新合并的命令数
+            "ratio": round(self.commands / self.updates, 3) if self.updates else None,
+        }
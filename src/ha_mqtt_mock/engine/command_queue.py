@@ -0,0 +1,158 @@
+"""命令队列模块
+
+paho的网络线程收到命令后不直接修改设备状态（模拟循环和API处理器在事件循环中访问同一个状态），
+而是放入有界队列，由事件循环分批应用：
+    - 队列按到达顺序处理，同一设备的命令保持顺序（连接池中一个设备固定使用一个连接）
+    - 每次事件循环迭代最多处理batch_size条命令，其余的留到下一次迭代，模拟循环和API请求可以穿插执行
+    - 队列满时按策略丢弃最旧（drop_oldest）或最新（drop_newest）的命令
+
+在事件循环线程中收到的命令（asyncio或inprocess传输）不经过队列，直接处理。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from ha_mqtt_mock.utils.metrics import COMMAND_BATCH_SIZE, COMMAND_QUEUE_DROPPED, COMMAND_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+class CommandQueue:
+    """线程安全的有界命令队列，在事件循环中分批处理"""
+
+    POLICIES = ("drop_oldest", "drop_newest")
+    DEFAULT_MAXSIZE = 10000
+    DEFAULT_BATCH_SIZE = 500
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, batch_size: int = DEFAULT_BATCH_SIZE,
+                 policy: str = "drop_oldest") -> None:
+        """
+        初始化命令队列
+
+        Args:
+            maxsize: 队列容量
+            batch_size: 每次事件循环迭代最多处理的命令数
+            policy: 队列满时的策略，drop_oldest丢弃最旧的命令，drop_newest丢弃新到达的命令
+        """
+        if maxsize < 1:
+            raise ValueError(f"无效的命令队列容量: {maxsize}")
+        if batch_size < 1:
+            raise ValueError(f"无效的命令批大小: {batch_size}")
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的命令队列策略: {policy}")
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.policy = policy
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[int] = None
+        self._handler: Optional[Callable[..., Any]] = None
+        # (客户端, 设备, 消息, 入队时间)
+        self._items: Deque[Tuple[Any, Any, Any, float]] = deque()
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def attach(self, loop: asyncio.AbstractEventLoop, handler: Callable[[Any, Any, Any], Any]) -> None:
+        """
+        绑定处理命令的事件循环（需要在该事件循环的线程中调用）
+
+        Args:
+            loop: 事件循环
+            handler: 命令处理函数，参数为 (客户端, 设备, 消息)
+        """
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self._handler = handler
+
+    def in_loop_thread(self) -> bool:
+        """当前线程是否为处理命令的事件循环线程"""
+        return threading.get_ident() == self.loop_thread
+
+    def put(self, client, device, message) -> bool:
+        """
+        放入一条命令（可以在任意线程中调用）
+
+        Args:
+            client: 收到命令的MQTT客户端
+            device: 命令的目标设备
+            message: MQTT消息
+
+        Returns:
+            bool: 命令是否入队（drop_newest策略下队列满时为False）
+        """
+        with self._lock:
+            if len(self._items) >= self.maxsize:
+                self.dropped += 1
+                COMMAND_QUEUE_DROPPED.inc()
+                if self.policy == "drop_newest":
+                    return False
+                self._items.popleft()
+            self._items.append((client, device, message, time.monotonic()))
+            self.enqueued += 1
+            depth = len(self._items)
+            if depth > self.max_depth:
+                self.max_depth = depth
+            schedule = not self._scheduled
+            self._scheduled = True
+        if schedule:
+            try:
+                self.loop.call_soon_threadsafe(self._drain)
+            except RuntimeError:
+                # 事件循环已经关闭
+                with self._lock:
+                    self._scheduled = False
+        return True
+
+    def _drain(self) -> None:
+        """在事件循环中处理一批命令，队列中还有命令时在下一次迭代继续"""
+        with self._lock:
+            count = min(len(self._items), self.batch_size)
+            batch = [self._items.popleft() for _ in range(count)]
+        if batch:
+            self.batches += 1
+            COMMAND_BATCH_SIZE.observe(count)
+            now = time.monotonic()
+            for client, device, message, enqueued in batch:
+                COMMAND_QUEUE_WAIT.observe(now - enqueued)
+                try:
+                    self._handler(client, device, message)
+                except Exception as e:
+                    logger.exception(f"处理设备 '{device.name}' 的命令时发生错误: {e}")
+            self.processed += count
+        with self._lock:
+            if not self._items:
+                self._scheduled = False
+                return
+        self.loop.call_soon(self._drain)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取队列统计
+
+        Returns:
+            Dict[str, Any]: 当前和最大深度、入队/处理/丢弃的命令数、批次数和平均批大小
+        """
+        return {
+            "depth": len(self._items),
+            "max_depth": self.max_depth,
+            "maxsize": self.maxsize,
+            "policy": self.policy,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "avg_batch": round(self.processed / self.batches, 2) if self.batches else None,
+        }
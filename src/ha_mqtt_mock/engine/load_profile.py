@@ -0,0 +1,432 @@
+"""负载曲线模块
+
+按时间改变目标发布速率和活跃设备比例，用于对Broker做爬坡、尖峰、浸泡和昼夜曲线等负载测试。
+负载曲线在JSON文件中定义，每条曲线由若干段组成：
+
+    {
+        "ramp": {"segments": [{"type": "ramp", "duration": 600, "from": 100, "to": 50000}]},
+        "soak": {"segments": [{"type": "constant", "duration": 86400, "rate": 2000}]}
+    }
+
+段类型：
+    constant: rate
+    ramp: from, to（线性变化）
+    spike: base, peak, period, width, offset（每个周期内有width秒处于峰值）
+    diurnal: min, max, period, peak_at（余弦曲线，peak_at为峰值在周期中的位置，0~1）
+
+每段可以设置active（活跃设备比例），为数值或 {"from": a, "to": b}，默认为1。
+曲线结束后保持最后的速率，设置 "repeat": true 时从头循环。
+"""
+
+import json
+import logging
+import math
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LoadSegment:
+    """负载曲线中的一段"""
+
+    TYPES = ("constant", "ramp", "spike", "diurnal")
+
+    # 各类型中表示速率的参数，缩放曲线时一起缩放
+    RATE_KEYS = {
+        "constant": ("rate",),
+        "ramp": ("from", "to"),
+        "spike": ("base", "peak"),
+        "diurnal": ("min", "max"),
+    }
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        """
+        初始化负载段
+
+        Args:
+            data: 段定义
+        """
+        self.type = data.get("type", "constant")
+        if self.type not in self.TYPES:
+            raise ValueError(f"未知的负载段类型: {self.type}")
+        self.duration = float(data.get("duration", 0))
+        if self.duration <= 0:
+            raise ValueError(f"负载段的duration必须大于0: {data}")
+        missing = [key for key in self.RATE_KEYS[self.type] if key not in data]
+        if missing:
+            raise ValueError(f"{self.type}负载段缺少参数: {', '.join(missing)}")
+        self.params = {key: float(value) for key, value in data.items()
+                       if key not in ("type", "duration", "active")}
+        if self.params.get("period", self.duration) <= 0:
+            raise ValueError(f"负载段的period必须大于0: {data}")
+        if self.params.get("width", 0.0) < 0:
+            raise ValueError(f"负载段的width不能为负数: {data}")
+
+        active = data.get("active", 1.0)
+        if isinstance(active, dict):
+            self.active = (float(active.get("from", 1.0)), float(active.get("to", 1.0)))
+        else:
+            self.active = (float(active), float(active))
+        if not all(0 <= value <= 1 for value in self.active):
+            raise ValueError(f"活跃设备比例必须在0到1之间: {active}")
+
+    def rate(self, t: float) -> float:
+        """
+        计算段内t秒处的目标速率（消息/秒）
+
+        Args:
+            t: 段内时间（秒）
+
+        Returns:
+            float: 目标速率
+        """
+        p = self.params
+        if self.type == "constant":
+            return p["rate"]
+        if self.type == "ramp":
+            return p["from"] + (p["to"] - p["from"]) * min(t / self.duration, 1.0)
+        if self.type == "spike":
+            period = p.get("period", self.duration)
+            phase = (t - p.get("offset", 0.0)) % period
+            return p["peak"] if phase < p.get("width", 1.0) else p["base"]
+        # diurnal
+        period = p.get("period", self.duration)
+        phase = t / period - p.get("peak_at", 0.5)
+        return p["min"] + (p["max"] - p["min"]) * (1 + math.cos(2 * math.pi * phase)) / 2
+
+    def active_fraction(self, t: float) -> float:
+        """
+        计算段内t秒处的活跃设备比例
+
+        Args:
+            t: 段内时间（秒）
+
+        Returns:
+            float: 活跃设备比例
+        """
+        start, end = self.active
+        return start + (end - start) * min(t / self.duration, 1.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为段定义"""
+        data = {"type": self.type, "duration": self.duration, **self.params}
+        start, end = self.active
+        data["active"] = start if start == end else {"from": start, "to": end}
+        return data
+
+
+class LoadProfile:
+    """由若干段组成的负载曲线"""
+
+    def __init__(self, name: str, segments: List[LoadSegment], repeat: bool = False,
+                 force_publish: bool = True) -> None:
+        """
+        初始化负载曲线
+
+        Args:
+            name: 曲线名称
+            segments: 负载段列表
+            repeat: 结束后是否从头循环
+            force_publish: 每次更新都发布状态（忽略变化检测和上报策略），使发布速率等于目标速率
+        """
+        if not segments:
+            raise ValueError(f"负载曲线 '{name}' 没有定义任何段")
+        self.name = name
+        self.segments = segments
+        self.repeat = repeat
+        self.force_publish = force_publish
+        self.duration = sum(segment.duration for segment in segments)
+
+    @classmethod
+    def from_dict(cls, name: str, data: Dict[str, Any]) -> "LoadProfile":
+        """
+        从曲线定义创建负载曲线
+
+        Args:
+            name: 曲线名称
+            data: 曲线定义
+
+        Returns:
+            LoadProfile: 负载曲线
+        """
+        return cls(
+            name,
+            [LoadSegment(segment) for segment in data.get("segments", [])],
+            repeat=bool(data.get("repeat", False)),
+            force_publish=bool(data.get("force_publish", True)),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为曲线定义"""
+        return {
+            "segments": [segment.to_dict() for segment in self.segments],
+            "repeat": self.repeat,
+            "force_publish": self.force_publish,
+        }
+
+    def scaled(self, factor: float) -> "LoadProfile":
+        """
+        按比例缩放所有速率，用于把负载平分到多个工作进程
+
+        Args:
+            factor: 缩放比例
+
+        Returns:
+            LoadProfile: 新的负载曲线
+        """
+        data = self.to_dict()
+        for segment in data["segments"]:
+            for key in LoadSegment.RATE_KEYS[segment["type"]]:
+                segment[key] *= factor
+        return LoadProfile.from_dict(self.name, data)
+
+    def at(self, elapsed: float) -> Tuple[float, float]:
+        """
+        计算曲线在elapsed秒处的目标速率和活跃设备比例
+
+        Args:
+            elapsed: 曲线开始后的时间（秒）
+
+        Returns:
+            Tuple[float, float]: (目标速率, 活跃设备比例)
+        """
+        if self.repeat:
+            elapsed %= self.duration
+        for segment in self.segments:
+            if elapsed < segment.duration:
+                return segment.rate(elapsed), segment.active_fraction(elapsed)
+            elapsed -= segment.duration
+        # 曲线结束后保持最后一段的结束值
+        last = self.segments[-1]
+        return last.rate(last.duration), last.active_fraction(last.duration)
+
+
+def load_profiles(path: str) -> Dict[str, LoadProfile]:
+    """
+    从JSON文件加载负载曲线
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        Dict[str, LoadProfile]: 以名称为键的负载曲线
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {name: LoadProfile.from_dict(name, definition) for name, definition in data.items()}
+
+
+class LoadDriver:
+    """
+    按负载曲线驱动设备更新
+
+    活跃设备按object_id的哈希排序后取前面的一部分，因此活跃比例变化时设备集合稳定地增减；
+    更新速率由令牌累积控制，在活跃设备之间轮转。
+    """
+
+    # 事件循环停顿后最多追赶的时间（秒）
+    MAX_CATCH_UP = 1.0
+
+    def __init__(self, profile: LoadProfile, report_file: Optional[str] = None,
+                 report_interval: float = 10.0, shard: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        初始化负载驱动器
+
+        Args:
+            profile: 负载曲线
+            report_file: 速率报告文件（JSON Lines），为None时只写日志
+            report_interval: 报告间隔（秒）
+            shard: 分片编号，写入报告便于区分工作进程
+            clock: 单调时钟
+        """
+        self.profile = profile
+        self.report_file = report_file
+        self.report_interval = report_interval
+        self.shard = shard
+        self.clock = clock
+        self._order: Optional[List] = None
+        self._cursor = 0
+        self._credit = 0.0
+        self.started: Optional[float] = None
+        self._last: Optional[float] = None
+        self.updates = 0
+        self.published = 0
+        self._window_start = 0.0
+        self._window_updates = 0
+        self._window_published = 0
+        self._window_target = 0.0
+        self.target_rate = 0.0
+        self.active_fraction = 0.0
+        self.active_devices = 0
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._finished = False
+
+    def reset_devices(self) -> None:
+        """设备列表变化后重新排序"""
+        self._order = None
+
+    @staticmethod
+    def _rank(device) -> int:
+        return zlib.crc32(device.object_id.encode("utf-8"))
+
+    def start(self, now: Optional[float] = None) -> None:
+        """开始执行负载曲线"""
+        now = self.clock() if now is None else now
+        self.started = self._last = self._window_start = now
+        self._credit = 0.0
+        self._finished = False
+        logger.info(f"开始执行负载曲线 '{self.profile.name}'，时长 {self.profile.duration:.0f} 秒")
+
+    def due(self, devices: List, now: Optional[float] = None) -> List:
+        """
+        获取当前应该更新的设备
+
+        Args:
+            devices: 所有设备
+            now: 当前单调时间
+
+        Returns:
+            List: 本批次要更新的设备（高速率时同一设备可能出现多次）
+        """
+        now = self.clock() if now is None else now
+        if self._order is None or len(self._order) != len(devices):
+            self._order = sorted(devices, key=self._rank)
+            self._cursor = 0
+
+        elapsed = now - self.started
+        self.target_rate, self.active_fraction = self.profile.at(elapsed)
+        if not self._finished and not self.profile.repeat and elapsed >= self.profile.duration:
+            self._finished = True
+            logger.info(f"负载曲线 '{self.profile.name}' 已结束，保持最后的速率 {self.target_rate:.1f} 消息/秒")
+        self.active_devices = math.ceil(self.active_fraction * len(self._order))
+
+        self._window_target += self.target_rate * (now - self._last)
+        self._credit = min(
+            self._credit + self.target_rate * (now - self._last),
+            self.target_rate * self.MAX_CATCH_UP + 1,
+        )
+        self._last = now
+        count = int(self._credit)
+        if count <= 0 or self.active_devices == 0:
+            return []
+        self._credit -= count
+
+        batch = []
+        cursor = self._cursor % self.active_devices
+        for _ in range(count):
+            batch.append(self._order[cursor])
+            cursor += 1
+            if cursor >= self.active_devices:
+                cursor = 0
+        self._cursor = cursor
+        return batch
+
+    def next_delay(self) -> float:
+        """距离下一批设备到期的时间（秒），限制在1ms到100ms之间"""
+        if self.target_rate <= 0:
+            return 0.1
+        return min(max((1.0 - self._credit) / self.target_rate, 0.001), 0.1)
+
+    def record(self, updates: int, published: int, now: Optional[float] = None) -> None:
+        """
+        记录一批更新结果，到达报告间隔时输出实际速率
+
+        Args:
+            updates: 更新的设备数
+            published: 发布的消息数
+            now: 当前单调时间
+        """
+        self.updates += updates
+        self.published += published
+        self._window_updates += updates
+        self._window_published += published
+        now = self.clock() if now is None else now
+        if now - self._window_start >= self.report_interval:
+            self.report(now)
+
+    def report(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        输出上一个报告周期的实际速率
+
+        Args:
+            now: 当前单调时间
+
+        Returns:
+            Dict[str, Any]: 报告内容
+        """
+        now = self.clock() if now is None else now
+        window = now - self._window_start
+        report = {
+            # 墙上时间，便于与Broker的监控数据对齐
+            "timestamp": round(time.time(), 3),
+            "profile": self.profile.name,
+            "elapsed": round(now - self.started, 3),
+            # 报告周期内的平均目标速率，与实际速率在同一时间窗口上比较
+            "target_rate": round(self._window_target / window, 2) if window > 0 else round(self.target_rate, 2),
+            "achieved_rate": round(self._window_published / window, 2) if window > 0 else 0.0,
+            "update_rate": round(self._window_updates / window, 2) if window > 0 else 0.0,
+            "active_fraction": round(self.active_fraction, 4),
+            "active_devices": self.active_devices,
+        }
+        if self.shard is not None:
+            report["shard"] = self.shard
+        self.last_report = report
+        self._window_start = now
+        self._window_updates = 0
+        self._window_published = 0
+        self._window_target = 0.0
+
+        logger.info(
+            f"负载 '{report['profile']}' {report['elapsed']:.0f}s: 目标 {report['target_rate']:.1f} 消息/秒，"
+            f"实际 {report['achieved_rate']:.1f} 消息/秒，活跃设备 {report['active_devices']}"
+        )
+        if self.report_file:
+            try:
+                # 追加模式下单行写入是原子的，多个工作进程可以写入同一个文件
+                with open(self.report_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(report, ensure_ascii=False) + "\n")
+            except OSError as e:
+                logger.warning(f"写入负载报告失败: {e}")
+        return report
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取负载执行状态
+
+        Returns:
+            Dict[str, Any]: 当前目标、累计计数和最近一次报告
+        """
+        return {
+            "profile": self.profile.name,
+            "elapsed": round(self.clock() - self.started, 3) if self.started is not None else None,
+            "duration": self.profile.duration,
+            "target_rate": round(self.target_rate, 2),
+            "active_fraction": round(self.active_fraction, 4),
+            "active_devices": self.active_devices,
+            "updates": self.updates,
+            "published": self.published,
+            "last_report": self.last_report,
+        }
+
+
+def resolve_profile(name: str, path: str) -> LoadProfile:
+    """
+    从曲线文件中查找指定名称的负载曲线
+
+    Args:
+        name: 曲线名称
+        path: 曲线文件路径
+
+    Returns:
+        LoadProfile: 负载曲线
+    """
+    if not Path(path).exists():
+        raise ValueError(f"负载曲线文件不存在: {path}")
+    profiles = load_profiles(path)
+    if name not in profiles:
+        raise ValueError(f"负载曲线文件 {path} 中没有 '{name}'，可用: {', '.join(profiles)}")
+    return profiles[name]
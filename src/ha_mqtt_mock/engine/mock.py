@@ -2,21 +2,109 @@
 
 import asyncio
 import logging
+import time
 from typing import Dict, List, Optional
 
+from ha_mqtt_mock.config import MQTTConfig
 from ha_mqtt_mock.models import MQTTDevice
+from ha_mqtt_mock.utils.metrics import COMMANDS, TICK_DURATION, TICK_OVERRUN, UNKNOWN_COMMANDS
+from ha_mqtt_mock.utils.stochastic import EventSampler
+from ha_mqtt_mock.utils.tracing import get_tracer
+from ha_mqtt_mock.utils.transitions import TransitionScheduler
+from .coalesce import CommandCoalescer
+from .command_queue import CommandQueue
+from .load_profile import LoadDriver
+from .resync import BirthResync
+from .scheduler import DeviceScheduler
+from .startup import StartupPublisher
+from .timeslice import LoopLagProbe, TimeSlicer
+from .vectorized import VectorizedSimulator
 
 logger = logging.getLogger(__name__)
 
+def _raw_topic(message) -> bytes:
+    """
+    获取消息主题的原始字节
+
+    paho消息的topic属性每次都会解码主题字节，命令直接用原始字节查找。原始字节保存在paho的私有属性_topic中，
+    该属性不存在（paho改名或其他消息对象）时退回到编码topic属性。
+
+    Args:
+        message: MQTT消息
+
+    Returns:
+        bytes: 主题的UTF-8字节
+    """
+    raw_topic = getattr(message, "_topic", None)
+    if type(raw_topic) is bytes:
+        return raw_topic
+    return message.topic.encode("utf-8")
+
+
 class MockDeviceManager:
     """MQTT设备模拟器管理类"""
     
-    def __init__(self) -> None:
-        """初始化设备模拟器管理器"""
+    ENGINES = ("object", "vectorized")
+    COMMAND_SUBSCRIPTIONS = ("wildcard", "device")
+    
+    def __init__(self, heartbeat_interval: Optional[float] = None, engine: str = "object",
+                 load_driver: Optional[LoadDriver] = None, birth_resync: Optional[BirthResync] = None,
+                 command_subscription: str = "wildcard", partial: bool = False,
+                 command_queue: Optional[CommandQueue] = None,
+                 coalescer: Optional[CommandCoalescer] = None,
+                 transitions: Optional[TransitionScheduler] = None,
+                 events: Optional[EventSampler] = None,
+                 max_slice: Optional[float] = TimeSlicer.DEFAULT_MAX_SLICE) -> None:
+        """
+        初始化设备模拟器管理器
+        
+        Args:
+            heartbeat_interval: 心跳间隔（秒），状态未变化的设备每隔该时间重新发布一次，为None时只发布变化
+            engine: 模拟引擎，object为逐设备对象模拟，vectorized为NumPy按列模拟数值设备
+            load_driver: 负载曲线驱动器，设置后按负载曲线的速率更新设备，代替按设备周期调度
+            birth_resync: Home Assistant重启后的重新同步，设置后订阅Home Assistant的状态主题
+            command_subscription: 命令订阅方式，wildcard为一个 {root_prefix}/+/+/set 通配符订阅，
+                device为每个设备订阅自己的命令主题
+            partial: 是否只负责设备群的一部分（分片），通配符订阅收到的其他分片的设备命令不计为未知消息
+            command_queue: 命令队列，设置后paho网络线程收到的命令在事件循环中分批处理，为None时在网络线程中直接处理
+            coalescer: 命令合并器，设置后同一设备在合并窗口内的命令只执行一次状态更新和发布
+            transitions: 定时状态转换调度器（设备模型通过get_transition_scheduler()使用），在模拟循环的事件循环中执行
+            events: 随机状态转换的事件采样器，设置后按周期调度的设备不再每个周期掷骰子，由采样器抽取下一次事件的时间
+            max_slice: 模拟循环不让出事件循环的最长连续执行时间（秒），一轮工作超过时分成多个时间片，
+                为None或0时一轮工作一次完成
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"未知的模拟引擎: {engine}")
+        if command_subscription not in self.COMMAND_SUBSCRIPTIONS:
+            raise ValueError(f"未知的命令订阅方式: {command_subscription}")
+        self.heartbeat_interval = heartbeat_interval
+        self.engine = engine
+        # 向量化引擎（需要numpy），接管数值传感器和电量模拟
+        self.vector_engine: Optional[VectorizedSimulator] = VectorizedSimulator() if engine == "vectorized" else None
         self.devices: List[MQTTDevice] = []
         self.command_device_mapping: Dict[str, MQTTDevice] = {}
+        # 以命令主题的原始字节为键的索引，paho消息不需要解码主题即可查找设备
+        self._command_index: Dict[bytes, MQTTDevice] = {}
+        self.command_subscription = command_subscription
+        self.partial = partial
+        self.command_queue = command_queue
+        self.coalescer = coalescer
+        self.transitions = transitions
+        self.events = events
+        self.slicer = TimeSlicer(max_slice)
+        self.lag_probe = LoopLagProbe()
+        self._lag_task: Optional[asyncio.Task] = None
         self.is_running = False
         self.mock_task = None  # 用于存储模拟任务的引用
+        self.scheduler = DeviceScheduler()
+        self.load_driver = load_driver
+        self.startup: Optional[StartupPublisher] = None
+        self.birth_resync = birth_resync
+        self._wakeup: Optional[asyncio.Event] = None
+        # 启动发布开始后的事件循环，birth消息可能在paho网络线程中收到
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._resync_task: Optional[asyncio.Task] = None
+        self._resync_requested = False
     
     def add_device(self, device: MQTTDevice) -> None:
         """
@@ -27,6 +115,15 @@ class MockDeviceManager:
         """
         self.devices.append(device)
         self.command_device_mapping[device.command_topic] = device
+        self._command_index[device.command_topic.encode("utf-8")] = device
+        if self.load_driver is not None:
+            self.load_driver.reset_devices()
+        elif self.is_running:
+            if not (self.vector_engine is not None and self.vector_engine.add(device)):
+                self.scheduler.add(device)
+                if self.events is not None:
+                    self.events.add(device, self.scheduler.get_interval(device))
+            self._wake()
         logger.info(f"添加设备 '{device.name}' (ID: {device.object_id})")
     
     def add_devices(self, devices: List[MQTTDevice]) -> None:
@@ -68,6 +165,17 @@ class MockDeviceManager:
         if device:
             self.devices.remove(device)
             self.command_device_mapping.pop(device.command_topic, None)
+            self._command_index.pop(device.command_topic.encode("utf-8"), None)
+            if self.coalescer is not None:
+                self.coalescer.discard(device)
+            if self.transitions is not None:
+                self.transitions.cancel(device)
+            if self.events is not None:
+                self.events.remove(device)
+            if self.load_driver is not None:
+                self.load_driver.reset_devices()
+            elif not (self.vector_engine is not None and self.vector_engine.remove(device)):
+                self.scheduler.remove(device)
             logger.info(f"移除设备 '{device.name}' (ID: {device.object_id})")
             return True
         return False
@@ -90,20 +198,167 @@ class MockDeviceManager:
         Args:
             client: MQTT客户端实例
         """
+        if self.vector_engine is not None:
+            self.vector_engine.sync()
         for device in self.devices:
             device.publish_state(client)
             logger.debug(f"已发布设备 '{device.name}' 的状态信息")
     
+    async def publish_startup(self, client, startup: Optional[StartupPublisher] = None) -> None:
+        """
+        分批发布所有设备的发现信息和初始状态（代替publish_all_discoveries和publish_all_states）
+        
+        Args:
+            client: MQTT客户端实例
+            startup: 启动发布器，默认使用默认参数创建
+        """
+        self.attach_loop()
+        self.startup = startup if startup is not None else StartupPublisher()
+        if self.vector_engine is not None:
+            self.vector_engine.sync()
+        await self.startup.run(client, self.devices)
+        if self._resync_requested:
+            # 启动发布期间Home Assistant重启，之前发布的状态已经丢失
+            self._start_resync(client)
+    
+    def get_startup_stats(self) -> Optional[Dict]:
+        """
+        获取启动发布的进度
+        
+        Returns:
+            Optional[Dict]: 进度，未使用启动发布器时为None
+        """
+        return self.startup.get_stats() if self.startup is not None else None
+    
+    def attach_loop(self) -> None:
+        """
+        绑定当前运行的事件循环（启动发布和模拟循环开始时调用）
+        
+        之后在其他线程（paho网络线程）中收到的命令放入命令队列，由这个事件循环处理
+        """
+        self._loop = asyncio.get_running_loop()
+        if self.command_queue is not None and self.command_queue.loop is not self._loop:
+            self.command_queue.attach(self._loop, self._apply_command)
+        if self.coalescer is not None:
+            self.coalescer.attach(self._loop)
+        if self.transitions is not None:
+            self.transitions.attach(self._loop)
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.create_task(self.lag_probe.run())
+    
+    def get_command_queue_stats(self) -> Optional[Dict]:
+        """
+        获取命令队列的统计
+        
+        Returns:
+            Optional[Dict]: 统计，未使用命令队列时为None
+        """
+        return self.command_queue.get_stats() if self.command_queue is not None else None
+    
+    def get_coalescing_stats(self) -> Optional[Dict]:
+        """
+        获取命令合并的统计
+        
+        Returns:
+            Optional[Dict]: 统计，未启用命令合并时为None
+        """
+        return self.coalescer.get_stats() if self.coalescer is not None else None
+    
+    def get_transition_stats(self) -> Optional[Dict]:
+        """
+        获取定时状态转换的统计
+        
+        Returns:
+            Optional[Dict]: 统计，未启用转换调度器时为None
+        """
+        return self.transitions.get_stats() if self.transitions is not None else None
+    
+    def get_event_stats(self) -> Optional[Dict]:
+        """
+        获取随机状态转换的采样统计
+        
+        Returns:
+            Optional[Dict]: 统计，未使用事件采样器（每个周期掷骰子）时为None
+        """
+        return self.events.get_stats() if self.events is not None else None
+    
+    def get_slice_stats(self) -> Dict:
+        """
+        获取模拟循环的时间片统计和事件循环延迟
+        
+        Returns:
+            Dict: 时间片上限、时间片数、让出次数、最长的时间片和事件循环延迟
+        """
+        return {**self.slicer.get_stats(), "loop_lag": self.lag_probe.get_stats()}
+    
+    def get_resync_stats(self) -> Optional[Dict]:
+        """
+        获取Home Assistant重启后重新同步的状态
+        
+        Returns:
+            Optional[Dict]: 状态，未启用重新同步时为None
+        """
+        return self.birth_resync.get_stats() if self.birth_resync is not None else None
+    
     def subscribe_all_commands(self, client) -> None:
         """
-        订阅所有设备的命令主题
+        订阅所有设备的命令主题，启用重新同步时同时订阅Home Assistant的状态主题
+        
+        默认只发送一个通配符订阅（之后添加的设备无需再订阅）；device方式为每个设备发送一个订阅，
+        设备数量很大时需要很长时间，并且会使Broker的订阅树膨胀
         
         Args:
             client: MQTT客户端实例
         """
-        for device in self.devices:
-            client.subscribe(device.command_topic)
-            logger.debug(f"已订阅设备 '{device.name}' 的命令主题")
+        if self.command_subscription == "wildcard":
+            command_filter = f"{MQTTConfig.get_instance().root_prefix}/+/+/set"
+            client.subscribe(command_filter)
+            logger.debug(f"已订阅命令主题: {command_filter}")
+        else:
+            for device in self.devices:
+                client.subscribe(device.command_topic)
+                logger.debug(f"已订阅设备 '{device.name}' 的命令主题")
+        if self.birth_resync is not None:
+            client.subscribe(self.birth_resync.status_topic)
+            logger.debug(f"已订阅Home Assistant状态主题: {self.birth_resync.status_topic}")
+    
+    def _request_resync(self, client) -> None:
+        """收到birth消息后在事件循环中开始重新同步（可能在paho网络线程中调用）"""
+        if self._loop is None:
+            # 还没有开始启动发布，之后会发布所有设备
+            return
+        self._loop.call_soon_threadsafe(self._start_resync, client)
+    
+    def _start_resync(self, client) -> None:
+        """
+        开始重新同步；启动发布或上一次重新同步还在进行时，等它完成后再执行
+        
+        Args:
+            client: MQTT客户端实例
+        """
+        if (self.startup is not None and not self.startup.done) or \
+                (self._resync_task is not None and not self._resync_task.done()):
+            self._resync_requested = True
+            return
+        self._resync_task = asyncio.create_task(self._run_resync(client))
+    
+    async def _run_resync(self, client) -> None:
+        """
+        重新发布发现信息和所有设备的当前状态，期间再次收到birth消息时重复一次
+        
+        Args:
+            client: MQTT客户端实例
+        """
+        try:
+            while True:
+                self._resync_requested = False
+                if self.vector_engine is not None:
+                    self.vector_engine.sync()
+                await self.birth_resync.run(client, self.devices)
+                if not self._resync_requested:
+                    return
+        except Exception as e:
+            logger.exception(f"重新同步时发生错误: {e}")
     
     def on_message(self, client, userdata, message) -> None:
         """
@@ -114,37 +369,307 @@ class MockDeviceManager:
             userdata: 用户数据
             message: MQTT消息
         """
-        topic = message.topic
-        payload = message.payload
+        device = self._command_index.get(_raw_topic(message))
         
-        device = self.command_device_mapping.get(topic)
-        if device:
-            logger.debug(f"接收到设备 '{device.name}' 的命令: {payload}")
-            device.on_command(client, payload)
+        if device is not None:
+            queue = self.command_queue
+            if queue is not None and queue.loop is not None and not queue.in_loop_thread():
+                # 设备状态只在事件循环中修改
+                queue.put(client, device, message)
+            else:
+                self._apply_command(client, device, message)
+            return
+        
+        topic = message.topic
+        if self.birth_resync is not None and self.birth_resync.handles(topic):
+            if self.birth_resync.on_message(message):
+                self._request_resync(client)
+        elif self.partial and self.command_subscription == "wildcard" and topic.endswith("/set"):
+            # 通配符订阅也会收到其他分片的设备命令
+            logger.debug(f"忽略其他分片的设备命令: {topic}")
         else:
+            UNKNOWN_COMMANDS.inc()
             logger.warning(f"收到未知主题的消息: {topic}")
 
+    def _apply_command(self, client, device: MQTTDevice, message) -> None:
+        """
+        把命令应用到设备（事件循环中，或未使用命令队列时在网络线程中调用）
+        
+        Args:
+            client: 收到命令的MQTT客户端
+            device: 目标设备
+            message: MQTT消息
+        """
+        COMMANDS.inc()
+        tracer = get_tracer()
+        span = None
+        if tracer is not None:
+            # paho消息的timestamp是读出报文的单调时间，排队时间计入queue阶段
+            span = tracer.begin(device, getattr(message, "timestamp", None))
+        payload = message.payload
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"接收到设备 '{device.name}' 的命令: {payload}")
+        coalescer = self.coalescer
+        if coalescer is not None and coalescer.in_loop_thread():
+            parsed = device.parse_command(payload)
+            if parsed is not None:
+                # 追踪在合并窗口结束、应用命令之后结算
+                coalescer.add(client, device, parsed)
+            elif span is not None:
+                tracer.settle(device.state_topic, span)
+            return
+        device.on_command(client, payload)
+        if span is not None:
+            tracer.settle(device.state_topic, span)
+
+    def clear_devices(self) -> None:
+        """清除所有设备"""
+        self.devices.clear()
+        self.command_device_mapping.clear()
+        self._command_index.clear()
+        if self.coalescer is not None:
+            self.coalescer.discard()
+        if self.transitions is not None:
+            self.transitions.clear()
+        if self.events is not None:
+            self.events.clear()
+        self.scheduler.clear()
+        if self.vector_engine is not None:
+            self.vector_engine.clear()
+        if self.load_driver is not None:
+            self.load_driver.reset_devices()
+    
+    def get_device_state(self, object_id: str) -> Optional[Dict]:
+        """
+        获取设备当前状态
+        
+        Args:
+            object_id: 设备对象ID
+            
+        Returns:
+            Optional[Dict]: 设备状态，如果设备不存在则返回None
+        """
+        device = self.get_device(object_id)
+        if device is None:
+            return None
+        if self.vector_engine is not None:
+            self.vector_engine.sync_device(device)
+        return device.state
+    
+    def get_all_states(self) -> Dict[str, Dict]:
+        """
+        获取所有设备的当前状态
+        
+        Returns:
+            Dict[str, Dict]: 以设备对象ID为键的状态字典
+        """
+        if self.vector_engine is not None:
+            self.vector_engine.sync()
+        return {device.object_id: device.state for device in self.devices}
+    
+    def update_device_state(self, object_id: str, state: Dict) -> Optional[Dict]:
+        """
+        更新设备状态，变化将在设备下一次调度时发布
+        
+        Args:
+            object_id: 设备对象ID
+            state: 要合并的状态
+            
+        Returns:
+            Optional[Dict]: 更新后的状态，如果设备不存在则返回None
+        """
+        device = self.get_device(object_id)
+        if device is None:
+            return None
+        if self.vector_engine is not None:
+            # 先写回列中的最新数值，避免下面重新读取时用旧值覆盖列
+            self.vector_engine.sync_device(device)
+        device.state.update(state)
+        device.mark_dirty()
+        device.plan_events()
+        if self.vector_engine is not None:
+            self.vector_engine.refresh_device(device)
+        return device.state
+    
+    def _wake(self) -> None:
+        """唤醒正在等待下一个到期时间的模拟循环"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    def _is_current(self, device: MQTTDevice) -> bool:
+        """设备是否仍在模拟器中（让出事件循环期间可能被移除或替换）"""
+        return self.command_device_mapping.get(device.command_topic) is device
+    
+    def mock_device(self, client, device: MQTTDevice, now: Optional[float] = None, force: bool = False) -> bool:
+        """
+        模拟单个设备的状态变化，只在状态变化或心跳到期时发布
+        
+        Args:
+            client: MQTT客户端实例
+            device: MQTT设备实例
+            now: 当前单调时间，默认读取时钟
+            force: 是否无论状态是否变化都发布
+            
+        Returns:
+            bool: 是否发布了状态
+        """
+        device.step_mock()
+        if force or device.needs_publish(time.monotonic() if now is None else now, self.heartbeat_interval):
+            logger.debug(f"已更新并发布设备 '{device.name}' 的模拟状态")
+            return device.publish_state(client)
+        return False
+    
+    def get_load_stats(self) -> Optional[Dict]:
+        """
+        获取负载曲线的执行状态
+        
+        Returns:
+            Optional[Dict]: 执行状态，未使用负载曲线时为None
+        """
+        return self.load_driver.get_stats() if self.load_driver is not None else None
+    
+    async def _run_load_profile(self, client) -> None:
+        """
+        按负载曲线更新设备：速率和活跃设备比例随时间变化
+        
+        Args:
+            client: MQTT客户端实例
+        """
+        driver = self.load_driver
+        force = driver.profile.force_publish
+        wait_writable = getattr(client, "wait_writable", None)
+        driver.start()
+        planned = None
+        slicer = self.slicer
+        while self.is_running:
+            started = time.perf_counter()
+            if planned is not None:
+                TICK_OVERRUN.observe(max(started - planned, 0.0))
+            now = driver.clock()
+            batch = driver.due(self.devices, now)
+            published = 0
+            slicer.start()
+            resumed = False
+            for device in batch:
+                if slicer.expired():
+                    await slicer.pause()
+                    if not self.is_running:
+                        break
+                    resumed = True
+                if resumed and not self._is_current(device):
+                    continue
+                try:
+                    if self.mock_device(client, device, now, force=force):
+                        published += 1
+                except Exception as e:
+                    logger.exception(f"模拟设备 '{device.name}' 时发生错误: {e}")
+            driver.record(len(batch), published)
+            TICK_DURATION.observe(slicer.finish())
+            if wait_writable is not None:
+                await wait_writable()
+            delay = driver.next_delay()
+            planned = time.perf_counter() + delay
+            await asyncio.sleep(delay)
+    
     async def mock_devices(self, client, interval: int = 10) -> None:
         """
         模拟设备状态变化
         
+        每个设备按照自己的周期（mock_interval）更新，首次更新时间在周期内随机分布，
+        从而把发布均匀分散到整个周期内，而不是每个间隔集中发布一次
+        
         Args:
             client: MQTT客户端实例
-            interval: 模拟间隔（秒）
+            interval: 默认模拟间隔（秒），用于未配置mock_interval的设备
         """
         self.is_running = True
-        logger.info(f"开始模拟 {len(self.devices)} 个设备的状态变化，间隔 {interval} 秒")
+        self._wakeup = asyncio.Event()
+        self.attach_loop()
+        
+        if self.load_driver is not None:
+            # 负载曲线模式下所有设备都由曲线驱动，不使用周期调度和向量化引擎
+            logger.info(f"按负载曲线 '{self.load_driver.profile.name}' 模拟 {len(self.devices)} 个设备")
+            try:
+                await self._run_load_profile(client)
+            except asyncio.CancelledError:
+                logger.info("设备模拟任务已取消")
+                self.is_running = False
+                raise
+            return
+        
+        self.scheduler.default_interval = interval
+        self.scheduler.clear()
+        
+        # 向量化引擎接管的设备按子节拍整列推进，其余设备由调度器逐个调度
+        devices = self.devices
+        vector_tick = None
+        if self.vector_engine is not None:
+            self.vector_engine.clear()
+            devices = self.vector_engine.add_devices(self.devices)
+            vector_tick = interval * self.vector_engine.tick_interval_factor
         
+        now = self.scheduler.clock()
+        for device in devices:
+            self.scheduler.add(device, now)
+        if self.events is not None:
+            # 随机状态转换由采样器在事件发生时发布，模拟周期只负责其余的模拟和心跳
+            self.events.clear()
+            self.events.start(self._loop, client)
+            for device in devices:
+                self.events.add(device, self.scheduler.get_interval(device))
+        next_vector_tick = now
+        # asyncio传输提供背压：发送队列积压时暂停模拟，而不是无限堆积报文
+        wait_writable = getattr(client, "wait_writable", None)
+        logger.info(f"开始模拟 {len(self.devices)} 个设备的状态变化，默认间隔 {interval} 秒，引擎 {self.engine}")
+        
+        # 本轮计划开始的时间（调度器时钟），用于统计超时
+        planned = None
+        slicer = self.slicer
         try:
             while self.is_running:
-                for device in self.devices:
-                    # 检查设备是否有模拟方法
-                    if hasattr(device, "update_state_mock"):
-                        device.update_state_mock()
-                        device.publish_state(client)
-                        logger.debug(f"已更新并发布设备 '{device.name}' 的模拟状态")
+                if planned is not None:
+                    TICK_OVERRUN.observe(max(self.scheduler.clock() - planned, 0.0))
+                # 到期设备很多时分成多个时间片，时间片之间让出事件循环处理API请求和命令
+                slicer.start()
+                resumed = False
+                for device in self.scheduler.pop_due():
+                    if slicer.expired():
+                        await slicer.pause()
+                        if not self.is_running:
+                            break
+                        resumed = True
+                    if resumed and not self._is_current(device):
+                        continue
+                    try:
+                        self.mock_device(client, device)
+                    except Exception as e:
+                        logger.exception(f"模拟设备 '{device.name}' 时发生错误: {e}")
+                
+                deadline = self.scheduler.next_deadline()
+                if vector_tick is not None:
+                    now = self.scheduler.clock()
+                    if now >= next_vector_tick:
+                        self.vector_engine.tick(client, now, self.heartbeat_interval)
+                        # 落后太多时不追赶，从当前时间重新开始
+                        next_vector_tick = max(next_vector_tick + vector_tick, now)
+                    deadline = next_vector_tick if deadline is None else min(deadline, next_vector_tick)
+                TICK_DURATION.observe(slicer.finish())
+                
+                if wait_writable is not None:
+                    await wait_writable()
                 
-                await asyncio.sleep(interval)
+                # 等待到下一个设备到期，或者有新设备加入
+                timeout = interval if deadline is None else deadline - self.scheduler.clock()
+                # 被新设备提前唤醒时超时记为0
+                planned = deadline
+                if timeout <= 0:
+                    await asyncio.sleep(0)
+                    continue
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
         except asyncio.CancelledError:
             logger.info("设备模拟任务已取消")
             self.is_running = False
@@ -159,4 +684,16 @@ class MockDeviceManager:
     def stop_mock(self) -> None:
         """停止模拟设备状态变化"""
         self.is_running = False
+        if self._resync_task is not None and not self._resync_task.done():
+            self._resync_task.cancel()
+        if self._lag_task is not None and not self._lag_task.done():
+            self._lag_task.cancel()
+        if self.coalescer is not None:
+            self.coalescer.flush_all()
+        if self.transitions is not None:
+            self.transitions.clear()
+        if self.events is not None:
+            self.events.clear()
+        self.scheduler.clear()
+        self._wake()
         logger.info("已停止设备模拟") 
\ No newline at end of file
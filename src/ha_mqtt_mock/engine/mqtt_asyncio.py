@@ -0,0 +1,197 @@
+"""asyncio原生MQTT传输模块
+
+paho默认通过loop_start()在独立线程中处理网络I/O，每次发布都要跨线程，命令回调也在paho线程中修改设备状态。
+这里的客户端把paho的套接字注册到asyncio事件循环的读写回调上，网络I/O、消息回调和模拟循环都运行在同一个线程，
+并提供可等待的发布和基于发送队列长度的背压。可选使用uvloop作为事件循环实现。
+"""
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional
+
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger(__name__)
+
+try:
+    import uvloop
+except ImportError:  # pragma: no cover - 取决于运行环境
+    uvloop = None
+
+
+def uvloop_available() -> bool:
+    """是否安装了uvloop"""
+    return uvloop is not None
+
+
+def get_loop_factory(use_uvloop: bool = False) -> Optional[Callable[[], asyncio.AbstractEventLoop]]:
+    """
+    获取事件循环工厂，用于asyncio.run(loop_factory=...)
+
+    Args:
+        use_uvloop: 是否使用uvloop
+
+    Returns:
+        Optional[Callable]: 事件循环工厂，为None时使用asyncio默认实现
+    """
+    if not use_uvloop:
+        return None
+    if uvloop is None:
+        logger.warning("未安装uvloop，使用asyncio默认事件循环（pip install ha-mqtt-mock[uvloop]）")
+        return None
+    return uvloop.new_event_loop
+
+
+class AsyncioMQTTClient(mqtt.Client):
+    """
+    在asyncio事件循环上运行网络I/O的paho客户端
+
+    接口与paho客户端一致：connect()必须在事件循环中调用，loop_start()/loop_stop()启动和停止
+    保活与重连任务而不是网络线程，因此可以直接替换setup_mqtt_client和连接池中的paho客户端。
+    """
+
+    # 重连间隔（秒）
+    RECONNECT_DELAY = 1.0
+    RECONNECT_MAX_DELAY = 30.0
+
+    def __init__(self, *args: Any, max_pending: int = 1000, **kwargs: Any) -> None:
+        """
+        初始化客户端
+
+        Args:
+            max_pending: 发送队列中允许积压的最大报文数，超过后wait_writable()和publish_async()会等待
+            其余参数与paho.mqtt.client.Client相同
+        """
+        super().__init__(*args, **kwargs)
+        self.max_pending = max_pending
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._misc_task: Optional[asyncio.Task] = None
+        self._writable: Optional[asyncio.Event] = None
+        self._publish_waiters: Dict[int, asyncio.Future] = {}
+        self.on_socket_open = self._handle_socket_open
+        self.on_socket_close = self._handle_socket_close
+        self.on_socket_register_write = self._handle_socket_register_write
+        self.on_socket_unregister_write = self._handle_socket_unregister_write
+        self.on_publish = self._notify_published
+
+    def _handle_socket_open(self, client, userdata, sock) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(sock, self.loop_read)
+
+    def _handle_socket_close(self, client, userdata, sock) -> None:
+        if self._loop is not None:
+            self._loop.remove_reader(sock)
+            self._loop.remove_writer(sock)
+        self._set_writable()
+        # 连接断开后，QoS>0的消息在重连后由paho重发，这里只唤醒等待者
+        for future in self._publish_waiters.values():
+            if not future.done():
+                future.set_exception(ConnectionError("MQTT连接已断开"))
+        self._publish_waiters.clear()
+
+    def _handle_socket_register_write(self, client, userdata, sock) -> None:
+        self._loop.add_writer(sock, self._write)
+
+    def _handle_socket_unregister_write(self, client, userdata, sock) -> None:
+        self._loop.remove_writer(sock)
+        self._set_writable()
+
+    def _write(self) -> None:
+        self.loop_write()
+        if len(self._out_packet) < self.max_pending:
+            self._set_writable()
+
+    def _set_writable(self) -> None:
+        if self._writable is not None:
+            self._writable.set()
+
+    def _notify_published(self, client, userdata, mid, *args) -> None:
+        # QoS 0在写入套接字后回调，QoS 1/2在收到PUBACK/PUBCOMP后回调
+        future = self._publish_waiters.pop(mid, None)
+        if future is not None and not future.done():
+            future.set_result(mid)
+
+    @property
+    def pending(self) -> int:
+        """发送队列中尚未写出的报文数"""
+        return len(self._out_packet)
+
+    async def wait_writable(self) -> None:
+        """发送队列积压超过max_pending时等待其排空到阈值以下"""
+        while len(self._out_packet) >= self.max_pending and self._sock is not None:
+            if self._writable is None:
+                self._writable = asyncio.Event()
+            self._writable.clear()
+            await self._writable.wait()
+
+    async def publish_async(self, topic: str, payload: Any = None, qos: int = 0,
+                            retain: bool = False, properties=None) -> mqtt.MQTTMessageInfo:
+        """
+        发布消息并等待完成
+
+        发送队列积压时先等待（背压），QoS 0等待报文写入套接字，QoS 1/2等待Broker确认
+
+        Args:
+            topic: MQTT主题
+            payload: 消息负载
+            qos: 服务质量等级
+            retain: 是否保留消息
+            properties: MQTT v5属性
+
+        Returns:
+            mqtt.MQTTMessageInfo: 发布结果
+        """
+        await self.wait_writable()
+        future = asyncio.get_running_loop().create_future()
+        info = self.publish(topic, payload, qos=qos, retain=retain, properties=properties)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            return info
+        if info.is_published():
+            return info
+        self._publish_waiters[info.mid] = future
+        await future
+        return info
+
+    async def _misc_loop(self) -> None:
+        """处理保活，连接断开时按退避间隔重连"""
+        delay = self.RECONNECT_DELAY
+        while True:
+            if self.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+                delay = self.RECONNECT_DELAY
+                await asyncio.sleep(1)
+                continue
+            await asyncio.sleep(delay)
+            if self._state in (mqtt._ConnectionState.MQTT_CS_DISCONNECTING,
+                               mqtt._ConnectionState.MQTT_CS_DISCONNECTED):
+                continue
+            try:
+                logger.info(f"正在重新连接MQTT Broker: {self._host}:{self._port}")
+                self.reconnect()
+            except OSError as e:
+                logger.warning(f"重新连接MQTT Broker失败: {e}")
+                delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+
+    def disconnect(self, *args: Any, **kwargs: Any) -> mqtt.MQTTErrorCode:
+        """断开连接，并立即写出DISCONNECT报文（关闭流程中事件循环可能不会再处理写回调）"""
+        rc = super().disconnect(*args, **kwargs)
+        if self._sock is not None:
+            self.loop_write()
+        return rc
+
+    def loop_start(self) -> mqtt.MQTTErrorCode:
+        """在当前事件循环中启动保活和重连任务（不创建网络线程）"""
+        if self._misc_task is not None:
+            return mqtt.MQTT_ERR_INVAL
+        self._thread_terminate = False
+        self._writable = asyncio.Event()
+        self._misc_task = asyncio.get_running_loop().create_task(self._misc_loop())
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_stop(self) -> mqtt.MQTTErrorCode:
+        """停止保活和重连任务"""
+        if self._misc_task is None:
+            return mqtt.MQTT_ERR_INVAL
+        self._thread_terminate = True
+        self._misc_task.cancel()
+        self._misc_task = None
+        return mqtt.MQTT_ERR_SUCCESS
@@ -1,26 +1,39 @@
 """MQTT客户端相关功能模块"""
 
 import logging
-from typing import Callable
+from typing import Callable, Union
 
 import paho.mqtt.client as mqtt
 
 from ha_mqtt_mock.config import MQTTConfig
+from .broker import get_embedded_broker
+from .mqtt_asyncio import AsyncioMQTTClient
+from .mqtt_pool import MQTTClientPool
 
 logger = logging.getLogger(__name__)
 
-def create_mqtt_client(mqtt_config: MQTTConfig) -> mqtt.Client:
+def _create_client(mqtt_config: MQTTConfig, client_id: str) -> mqtt.Client:
     """
-    创建MQTT客户端
+    创建单个paho客户端
     
     Args:
         mqtt_config: MQTT配置
+        client_id: 客户端ID
         
     Returns:
         mqtt.Client: MQTT客户端实例
     """
-    # 创建客户端
-    client = mqtt.Client(client_id=mqtt_config.client_id)
+    # 创建客户端，asyncio传输在事件循环中处理网络I/O，不启动paho网络线程；
+    # 进程内传输直接连接本进程的内嵌Broker，不经过套接字
+    if mqtt_config.transport == "inprocess":
+        broker = get_embedded_broker()
+        if broker is None:
+            raise ValueError("进程内传输需要先启动内嵌MQTT Broker")
+        client = broker.client(client_id)
+    elif mqtt_config.transport == "asyncio":
+        client = AsyncioMQTTClient(client_id=client_id)
+    else:
+        client = mqtt.Client(client_id=client_id)
     
     # 设置用户名和密码（如果提供）
     if mqtt_config.username:
@@ -29,7 +42,7 @@ def create_mqtt_client(mqtt_config: MQTTConfig) -> mqtt.Client:
     # 连接回调
     def on_connect(client, userdata, flags, rc):
         if rc == 0:
-            logger.info(f"已连接到MQTT Broker: {mqtt_config.broker_address}:{mqtt_config.broker_port}")
+            logger.info(f"已连接到MQTT Broker: {mqtt_config.broker_address}:{mqtt_config.broker_port} (客户端: {client_id})")
         else:
             logger.error(f"连接MQTT Broker失败，返回码: {rc}")
     
@@ -37,6 +50,27 @@ def create_mqtt_client(mqtt_config: MQTTConfig) -> mqtt.Client:
     
     return client
 
+def create_mqtt_client(mqtt_config: MQTTConfig) -> Union[mqtt.Client, MQTTClientPool]:
+    """
+    创建MQTT客户端
+    
+    配置的连接数大于1时返回连接池，每个连接的客户端ID为 {client_id}_{序号}（进程内传输没有
+    网络连接，始终使用单个客户端）。
+    传输方式为asyncio时，客户端必须在运行中的事件循环内连接（setup_mqtt_client）
+    
+    Args:
+        mqtt_config: MQTT配置
+        
+    Returns:
+        Union[mqtt.Client, MQTTClientPool]: MQTT客户端实例或连接池
+    """
+    if mqtt_config.connections > 1 and mqtt_config.transport != "inprocess":
+        return MQTTClientPool([
+            _create_client(mqtt_config, f"{mqtt_config.client_id}_{index}")
+            for index in range(mqtt_config.connections)
+        ])
+    return _create_client(mqtt_config, mqtt_config.client_id)
+
 def setup_mqtt_client(mqtt_client: mqtt.Client, mqtt_config: MQTTConfig, 
                     on_message_callback: Callable) -> None:
     """
@@ -47,13 +81,18 @@ def setup_mqtt_client(mqtt_client: mqtt.Client, mqtt_config: MQTTConfig,
         mqtt_config: MQTT配置
         on_message_callback: 消息回调函数
     """
+    # 连接池自行管理每个连接的回调、连接和网络循环
+    if isinstance(mqtt_client, MQTTClientPool):
+        mqtt_client.setup(mqtt_config.broker_address, mqtt_config.broker_port, on_message_callback)
+        return
+    
     # 设置消息回调
     mqtt_client.on_message = on_message_callback
     
     # 连接MQTT代理
     mqtt_client.connect(mqtt_config.broker_address, mqtt_config.broker_port)
     
-    # 启动MQTT循环
+    # 启动MQTT循环（asyncio传输只启动事件循环中的保活任务）
     mqtt_client.loop_start()
 
 def disconnect_mqtt_client(mqtt_client: mqtt.Client) -> None:
@@ -63,6 +102,11 @@ def disconnect_mqtt_client(mqtt_client: mqtt.Client) -> None:
     Args:
         mqtt_client: MQTT客户端实例
     """
+    if isinstance(mqtt_client, MQTTClientPool):
+        logger.debug("正在断开MQTT连接池...")
+        mqtt_client.disconnect()
+        return
+    
     if mqtt_client._thread_terminate:
         return
         
@@ -0,0 +1,289 @@
+"""MQTT连接池模块
+
+把设备确定性地分配到多个MQTT客户端连接上，分散单个连接的发送窗口和TCP阻塞的影响。
+连接池提供与paho客户端一致的publish/subscribe接口，设备无需感知连接池的存在。
+"""
+
+import logging
+import time
+import zlib
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger(__name__)
+
+
+def payload_size(payload: Any) -> int:
+    """
+    计算负载编码后的字节数（与paho发送的内容一致：字符串按UTF-8编码，数字转换为字符串）
+
+    Args:
+        payload: 发布的负载
+
+    Returns:
+        int: 字节数
+    """
+    if payload is None:
+        return 0
+    if isinstance(payload, (bytes, bytearray)):
+        return len(payload)
+    if not isinstance(payload, str):
+        payload = str(payload)
+    return len(payload.encode("utf-8"))
+
+
+class ConnectionStats:
+    """单个连接的发布统计（只有计数，读取不会改变统计）"""
+
+    __slots__ = ("published", "failed", "bytes", "received")
+
+    def __init__(self) -> None:
+        self.published = 0
+        self.failed = 0
+        self.bytes = 0
+        self.received = 0
+
+    def snapshot(self, client: mqtt.Client) -> Dict[str, Any]:
+        """
+        获取统计快照（吞吐量由读取方用ThroughputSampler按自己的上一次读数计算）
+
+        Args:
+            client: 该连接的paho客户端
+
+        Returns:
+            Dict[str, Any]: 统计数据
+        """
+        return {
+            "client_id": client._client_id.decode("utf-8", "replace"),
+            "connected": client.is_connected(),
+            "published": self.published,
+            "failed": self.failed,
+            "bytes": self.bytes,
+            "received": self.received,
+            "out_packet_queue": len(client._out_packet),
+            "queued_messages": len(client._out_messages),
+            "inflight_messages": client._inflight_messages,
+        }
+
+
+class MQTTClientPool:
+    """MQTT客户端连接池，按设备object_id把发布和订阅路由到固定的连接"""
+
+    def __init__(self, clients: List[mqtt.Client]) -> None:
+        """
+        初始化连接池
+
+        Args:
+            clients: 已创建的paho客户端列表
+        """
+        if not clients:
+            raise ValueError("连接池至少需要一个客户端")
+        self.clients = clients
+        self.stats = [ConnectionStats() for _ in clients]
+        self._topic_index: Dict[str, int] = {}
+        self.on_message: Optional[Callable] = None
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def connection_index(self, object_id: str) -> int:
+        """
+        获取设备分配到的连接编号（与进程无关的确定性哈希）
+
+        Args:
+            object_id: 设备对象ID
+
+        Returns:
+            int: 连接编号
+        """
+        return zlib.crc32(object_id.encode("utf-8")) % len(self.clients)
+
+    def _index_for_topic(self, topic: str) -> int:
+        """根据主题中的object_id（{root_prefix}/{component}/{object_id}/...）选择连接"""
+        index = self._topic_index.get(topic)
+        if index is None:
+            parts = topic.split("/")
+            if len(parts) < 4 or "+" in parts or "#" in parts:
+                # 通配符或非设备主题统一走第一个连接（命令通配符订阅因此只在第一个连接上收到命令，
+                # 在每个连接上都订阅会使每条命令重复收到）
+                index = 0
+            else:
+                index = self.connection_index(parts[2])
+            self._topic_index[topic] = index
+        return index
+
+    def client_for(self, topic: str) -> mqtt.Client:
+        """
+        获取负责指定主题的客户端
+
+        Args:
+            topic: MQTT主题
+
+        Returns:
+            mqtt.Client: paho客户端
+        """
+        return self.clients[self._index_for_topic(topic)]
+
+    def publish(self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False, properties=None):
+        """发布消息，接口与paho.mqtt.client.Client.publish一致"""
+        index = self._index_for_topic(topic)
+        result = self.clients[index].publish(topic, payload, qos=qos, retain=retain, properties=properties)
+        stats = self.stats[index]
+        if result.rc == 0:
+            stats.published += 1
+            stats.bytes += payload_size(payload)
+        else:
+            stats.failed += 1
+        return result
+
+    def subscribe(self, topic, qos: int = 0, options=None, properties=None):
+        """订阅主题，设备命令主题在设备所属的连接上订阅"""
+        if isinstance(topic, str):
+            return self.client_for(topic).subscribe(topic, qos=qos, options=options, properties=properties)
+        return self.clients[0].subscribe(topic, qos=qos, options=options, properties=properties)
+
+    def unsubscribe(self, topic, properties=None):
+        """取消订阅，路由规则与subscribe一致"""
+        if isinstance(topic, str):
+            return self.client_for(topic).unsubscribe(topic, properties=properties)
+        return self.clients[0].unsubscribe(topic, properties=properties)
+
+    def _make_on_message(self, index: int, callback: Callable) -> Callable:
+        """包装消息回调，使命令处理发布状态时仍通过连接池路由"""
+        stats = self.stats[index]
+
+        def on_message(client, userdata, message):
+            stats.received += 1
+            callback(self, userdata, message)
+
+        return on_message
+
+    def setup(self, host: str, port: int, on_message_callback: Callable) -> None:
+        """
+        连接所有客户端并启动网络循环
+
+        Args:
+            host: Broker地址
+            port: Broker端口
+            on_message_callback: 消息回调函数
+        """
+        self.on_message = on_message_callback
+        for index, client in enumerate(self.clients):
+            client.on_message = self._make_on_message(index, on_message_callback)
+            client.connect(host, port)
+            client.loop_start()
+
+    def disconnect(self) -> None:
+        """断开所有客户端连接并停止网络循环"""
+        for client in self.clients:
+            if client._thread_terminate:
+                continue
+            client.disconnect()
+            client.loop_stop()
+
+    async def wait_writable(self) -> None:
+        """等待所有支持背压的连接（asyncio传输）的发送队列排空到阈值以下"""
+        for client in self.clients:
+            wait_writable = getattr(client, "wait_writable", None)
+            if wait_writable is not None:
+                await wait_writable()
+
+    def is_connected(self) -> bool:
+        """所有连接是否都已连接"""
+        return all(client.is_connected() for client in self.clients)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """
+        获取每个连接的吞吐量和队列统计
+
+        Returns:
+            List[Dict[str, Any]]: 每个连接的统计数据
+        """
+        return [
+            {"connection": index, **stats.snapshot(client)}
+            for index, (client, stats) in enumerate(zip(self.clients, self.stats))
+        ]
+
+
+class ThroughputSampler:
+    """
+    按连接计算发布吞吐量
+
+    每个读取方持有自己的采样器，吞吐量按该读取方上一次读到的发布计数计算，
+    多个读取方（如/metrics和连接统计接口）互不影响。
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        初始化采样器
+
+        Args:
+            clock: 单调时钟
+        """
+        self.clock = clock
+        self._last: Dict[Hashable, Tuple[float, int]] = {}
+
+    def rate(self, key: Hashable, published: int) -> float:
+        """
+        记录连接的发布计数并返回距离上一次读数的吞吐量
+
+        Args:
+            key: 连接的标识（如分片编号和连接编号）
+            published: 连接累计的发布数
+
+        Returns:
+            float: 每秒发布的消息数，第一次读数或计数重置时为0
+        """
+        now = self.clock()
+        last = self._last.get(key)
+        self._last[key] = (now, published)
+        if last is None:
+            return 0.0
+        elapsed = now - last[0]
+        if elapsed <= 0 or published < last[1]:
+            return 0.0
+        return round((published - last[1]) / elapsed, 2)
+
+    def annotate(self, connections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        为有发布计数的连接统计添加messages_per_second
+
+        Args:
+            connections: get_connection_stats()的结果（分片模式下带shard字段）
+
+        Returns:
+            List[Dict[str, Any]]: 同一列表
+        """
+        for connection in connections:
+            if "published" in connection:
+                key = (connection.get("shard"), connection["connection"], connection["client_id"])
+                connection["messages_per_second"] = self.rate(key, connection["published"])
+        return connections
+
+
+def get_connection_stats(client) -> List[Dict[str, Any]]:
+    """
+    获取客户端或连接池的连接统计
+
+    Args:
+        client: paho客户端、进程内客户端或MQTTClientPool
+
+    Returns:
+        List[Dict[str, Any]]: 每个连接的统计数据
+    """
+    if client is None:
+        return []
+    if isinstance(client, MQTTClientPool):
+        return client.get_stats()
+    if hasattr(client, "connection_stats"):
+        # 进程内客户端没有发送队列
+        return [{"connection": 0, **client.connection_stats()}]
+    return [{
+        "connection": 0,
+        "client_id": client._client_id.decode("utf-8", "replace"),
+        "connected": client.is_connected(),
+        "out_packet_queue": len(client._out_packet),
+        "queued_messages": len(client._out_messages),
+        "inflight_messages": client._inflight_messages,
+    }]
@@ -0,0 +1,173 @@
+"""Home Assistant重启后的重新同步模块
+
+Home Assistant启动时在状态主题（默认 {root_prefix}/status）上发布 online（birth消息），
+之后重新读取Broker保留的发现信息，但设备的状态不是保留消息，需要重新发布。收到birth消息后：
+    - 临时订阅 {root_prefix}/+/+/config，收集Broker当前保留的发现信息
+    - 保留的配置与设备缓存的发现信息相同时跳过该设备的发现信息，否则重新发布
+    - 按启动发布的批大小和速率发布所有设备的当前状态
+
+不需要为了Home Assistant升级测试而重启模拟器。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Sequence, Set
+
+from ha_mqtt_mock.config import MQTTConfig
+from ha_mqtt_mock.models import MQTTDevice
+from .startup import StartupPublisher
+
+logger = logging.getLogger(__name__)
+
+
+class BirthResync:
+    """收到Home Assistant的birth消息后重新发布发现信息和当前状态"""
+
+    DEFAULT_SETTLE = 1.0
+
+    def __init__(self, status_topic: Optional[str] = None, birth_payload: str = "online",
+                 settle: float = DEFAULT_SETTLE, poll_interval: float = 0.05, **startup: Any) -> None:
+        """
+        初始化重新同步
+
+        Args:
+            status_topic: Home Assistant的状态主题，默认为 {root_prefix}/status
+            birth_payload: birth消息的负载
+            settle: 等待Broker发送保留的发现信息的最长时间（秒），收到所有设备的配置后提前结束
+            poll_interval: 检查保留配置是否收齐的间隔（秒）
+            startup: 发布时使用的StartupPublisher参数（批大小、速率、PUBACK超时）
+        """
+        if settle < 0:
+            raise ValueError(f"无效的保留配置等待时间: {settle}")
+        root_prefix = MQTTConfig.get_instance().root_prefix
+        self.status_topic = status_topic or f"{root_prefix}/status"
+        self.config_filter = f"{root_prefix}/+/+/config"
+        self.birth_payload = birth_payload.encode("utf-8")
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.startup_options = startup
+
+        self.phase = "idle"
+        self.births = 0
+        self.resyncs = 0
+        self.last_birth: Optional[float] = None
+        # 收集期间收到的保留配置（发现主题到负载）
+        self.retained: Dict[str, bytes] = {}
+        self.publisher: Optional[StartupPublisher] = None
+        self._expected: Set[str] = set()
+        self._matched = 0
+        self._collecting = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def handles(self, topic: str) -> bool:
+        """
+        消息是否由重新同步处理（状态主题或发现主题，收集结束后迟到的发现信息直接忽略）
+
+        Args:
+            topic: 消息主题
+
+        Returns:
+            bool: 是否处理
+        """
+        return topic == self.status_topic or topic.endswith("/config")
+
+    def on_message(self, message) -> bool:
+        """
+        处理状态主题或保留配置消息（可能在paho网络线程中调用）
+
+        Args:
+            message: MQTT消息
+
+        Returns:
+            bool: 是否为birth消息，需要开始重新同步
+        """
+        topic = message.topic
+        if topic == self.status_topic:
+            payload = message.payload.strip()
+            if payload == self.birth_payload:
+                self.births += 1
+                self.last_birth = time.time()
+                logger.info("收到Home Assistant的birth消息，准备重新同步发现信息和状态")
+                return True
+            logger.info(f"Home Assistant状态: {payload.decode('utf-8', 'replace')}")
+            return False
+        # 只统计Broker在订阅时发送的保留消息，其他客户端实时发布的配置不代表保留的内容
+        loop = self._loop
+        if loop is not None and getattr(message, "retain", False):
+            # 保留配置只在事件循环中读写，网络线程通过call_soon_threadsafe交给事件循环
+            try:
+                loop.call_soon_threadsafe(self._store_retained, topic, message.payload)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+        return False
+
+    def _store_retained(self, topic: str, payload: bytes) -> None:
+        """在事件循环中记录收集期间收到的保留配置，收集结束后到达的消息直接忽略"""
+        if not self._collecting:
+            return
+        if topic in self._expected and topic not in self.retained:
+            self._matched += 1
+        self.retained[topic] = payload
+
+    async def run(self, client, devices: Sequence[MQTTDevice]) -> None:
+        """
+        收集保留的发现信息，再分批发布缺失或过期的发现信息和所有设备的当前状态
+
+        Args:
+            client: MQTT客户端实例
+            devices: 设备列表
+        """
+        devices = list(devices)
+        self.resyncs += 1
+        await self._collect_retained(client, devices)
+        intact = {
+            device.discovery_topic for device in devices
+            if self.retained.get(device.discovery_topic) == device.discovery_data
+        }
+        self.retained = {}
+        logger.info(f"Broker保留了 {len(intact)}/{len(devices)} 个设备的有效发现信息，重新发布其余设备的发现信息")
+
+        self.phase = "publishing"
+        self.publisher = StartupPublisher(**self.startup_options)
+        try:
+            await self.publisher.run(client, devices, skip_discovery=intact)
+        finally:
+            self.phase = "idle"
+
+    async def _collect_retained(self, client, devices: Sequence[MQTTDevice]) -> None:
+        """临时订阅发现主题，等待Broker发送保留的配置"""
+        self.phase = "collecting"
+        self.retained = {}
+        self._expected = {device.discovery_topic for device in devices}
+        self._matched = 0
+        self._collecting = True
+        self._loop = asyncio.get_running_loop()
+        client.subscribe(self.config_filter)
+        try:
+            deadline = time.monotonic() + self.settle
+            while self._matched < len(self._expected) and time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            # 先取消订阅，之后交给事件循环的迟到消息被_store_retained忽略
+            client.unsubscribe(self.config_filter)
+            self._loop = None
+            self._collecting = False
+            self._expected = set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取重新同步的状态
+
+        Returns:
+            Dict[str, Any]: 状态主题、阶段、birth消息次数、重新同步次数和最近一次的发布进度
+        """
+        return {
+            "status_topic": self.status_topic,
+            "phase": self.phase,
+            "births": self.births,
+            "resyncs": self.resyncs,
+            "last_birth": self.last_birth,
+            "last": self.publisher.get_stats() if self.publisher is not None else None,
+        }
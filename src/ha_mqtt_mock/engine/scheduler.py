@@ -0,0 +1,126 @@
+"""定时器堆调度模块
+
+使用最小堆管理大量设备的下一次更新时间，使每个设备按照自己的周期更新，
+并通过初始相位偏移把发布均匀分散到整个周期内，避免整批设备同时发布。
+"""
+
+import random
+import time
+from typing import Any, Callable, List, Optional
+
+from ha_mqtt_mock.utils.timer_heap import TimerHandle, TimerHeap
+
+
+class DeviceScheduler:
+    """按设备周期调度模拟更新的调度器"""
+
+    def __init__(self, default_interval: float = 10, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        初始化设备调度器
+
+        Args:
+            default_interval: 设备未配置周期时使用的默认周期（秒）
+            clock: 时钟函数
+        """
+        self.default_interval = default_interval
+        self.timers = TimerHeap(clock)
+        self._handles: dict = {}
+
+    @property
+    def clock(self) -> Callable[[], float]:
+        return self.timers.clock
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    def __contains__(self, device) -> bool:
+        return device.object_id in self._handles
+
+    def get_interval(self, device) -> float:
+        """
+        获取设备的更新周期
+
+        优先使用设备自身的mock_interval，其次是设备类型的默认周期，最后是全局默认周期
+
+        Args:
+            device: MQTT设备实例
+
+        Returns:
+            float: 更新周期（秒）
+        """
+        interval = getattr(device, "mock_interval", None)
+        if not interval:
+            interval = getattr(type(device), "DEFAULT_MOCK_INTERVAL", None)
+        return interval or self.default_interval
+
+    def _next_time(self, device, base: float) -> float:
+        interval = self.get_interval(device)
+        jitter = getattr(device, "mock_jitter", 0) or 0
+        if jitter:
+            interval *= 1 + random.uniform(-jitter, jitter)
+        return base + interval
+
+    def add(self, device, now: Optional[float] = None) -> None:
+        """
+        添加设备，首次到期时间在一个周期内随机分布
+
+        Args:
+            device: MQTT设备实例
+            now: 当前时间
+        """
+        if now is None:
+            now = self.clock()
+        self.remove(device)
+        phase = random.uniform(0, self.get_interval(device))
+        self._handles[device.object_id] = self.timers.schedule(now + phase, device)
+
+    def remove(self, device) -> bool:
+        """
+        移除设备
+
+        Args:
+            device: MQTT设备实例
+
+        Returns:
+            bool: 设备是否在调度器中
+        """
+        handle = self._handles.pop(device.object_id, None)
+        if handle is None:
+            return False
+        self.timers.cancel(handle)
+        return True
+
+    def pop_due(self, now: Optional[float] = None) -> List[Any]:
+        """
+        弹出所有到期设备并自动调度它们的下一次更新
+
+        Args:
+            now: 当前时间
+
+        Returns:
+            List[MQTTDevice]: 到期的设备列表
+        """
+        if now is None:
+            now = self.clock()
+        devices = []
+        for handle in self.timers.pop_due(now):
+            device = handle.item
+            # 以原定到期时间为基准推进，保持相位稳定；落后太多时从当前时间重新开始
+            base = handle.when if now - handle.when < self.get_interval(device) else now
+            self._handles[device.object_id] = self.timers.schedule(self._next_time(device, base), device)
+            devices.append(device)
+        return devices
+
+    def next_deadline(self) -> Optional[float]:
+        """
+        获取最近的到期时间
+
+        Returns:
+            Optional[float]: 最近的到期时间
+        """
+        return self.timers.next_deadline()
+
+    def clear(self) -> None:
+        """清空调度器"""
+        self.timers.clear()
+        self._handles.clear()
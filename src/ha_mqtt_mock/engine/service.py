@@ -3,6 +3,7 @@
 import asyncio
 import logging
 import signal
+from typing import Any, Dict, Optional
 
 import uvicorn
 
@@ -10,9 +11,21 @@ from ha_mqtt_mock import __version__
 from ha_mqtt_mock.api import create_app
 from ha_mqtt_mock.config import MQTTConfig
 from ha_mqtt_mock.engine import DeviceConfig
+from ha_mqtt_mock.engine.broker import Broker, get_embedded_broker, set_embedded_broker
 from ha_mqtt_mock.engine import MockDeviceManager
+from ha_mqtt_mock.engine.coalesce import CommandCoalescer
+from ha_mqtt_mock.engine.command_queue import CommandQueue
+from ha_mqtt_mock.engine.load_profile import LoadDriver, LoadProfile
+from ha_mqtt_mock.engine.resync import BirthResync
 from ha_mqtt_mock.engine import create_mqtt_client, setup_mqtt_client, disconnect_mqtt_client
+from ha_mqtt_mock.engine.sharding import ShardedDeviceManager
+from ha_mqtt_mock.engine.startup import StartupPublisher
 from ha_mqtt_mock.models import create_sample_devices
+from ha_mqtt_mock.utils.rate_limit import PublishRateLimiter, set_rate_limiter
+from ha_mqtt_mock.utils.serializer import create_serializer, set_serializer
+from ha_mqtt_mock.utils.stochastic import EventSampler, set_event_sampler
+from ha_mqtt_mock.utils.tracing import CommandTracer, set_tracer
+from ha_mqtt_mock.utils.transitions import TransitionScheduler, set_transition_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +36,25 @@ class AppService:
                  mqtt_config: MQTTConfig,
                  config_file: str,
                  mock_interval: int = 10,
+                 heartbeat_interval: float = 60,
+                 engine: str = "object",
+                 workers: int = 1,
+                 use_uvloop: bool = False,
+                 embedded_broker: bool = False,
+                 rate_limits: Optional[Dict[str, Any]] = None,
+                 load_profile: Optional[LoadProfile] = None,
+                 load_report: Optional[str] = None,
+                 load_report_interval: float = 10.0,
+                 trace_spans: Optional[str] = None,
+                 serializer: str = "json",
+                 startup: Optional[Dict[str, Any]] = None,
+                 ha_resync: Optional[Dict[str, Any]] = None,
+                 command_subscription: str = "wildcard",
+                 command_queue: Optional[Dict[str, Any]] = None,
+                 coalesce_window: float = 0,
+                 transitions: bool = True,
+                 stochastic: str = "geometric",
+                 max_slice: float = 0.01,
                  api_host: str = "127.0.0.1",
                  api_port: int = 8080,
                  enable_api: bool = True):
@@ -33,6 +65,27 @@ class AppService:
             mqtt_config: MQTT配置
             config_file: 设备配置文件路径
             mock_interval: 模拟更新间隔（秒）
+            heartbeat_interval: 状态心跳间隔（秒），0表示只发布变化的状态
+            engine: 模拟引擎（object或vectorized）
+            workers: 工作进程数量，大于1时按object_id分片到多个进程运行
+            use_uvloop: 是否使用uvloop事件循环（分片模式下传递给工作进程）
+            embedded_broker: 是否在本进程中运行内嵌MQTT Broker（进程内传输时总是启用）
+            rate_limits: 发布限速配置（PublishRateLimiter的参数），None表示不限速
+            load_profile: 负载曲线，设置后按曲线的速率更新设备
+            load_report: 负载曲线实际速率报告文件（JSON Lines）
+            load_report_interval: 负载曲线报告间隔（秒）
+            trace_spans: 命令往返延迟分段记录文件（JSON Lines），None表示只统计直方图
+            serializer: JSON序列化后端（json、json-compact、orjson或auto）
+            startup: 启动时分批发布发现信息的配置（StartupPublisher的参数），None表示使用默认值
+            ha_resync: 收到Home Assistant的birth消息后重新同步的配置（BirthResync的参数，发布参数与startup相同），
+                None表示不订阅Home Assistant的状态主题
+            command_subscription: 命令订阅方式，wildcard为一个通配符订阅，device为每个设备一个订阅
+            command_queue: 命令队列配置（CommandQueue的参数），None表示在paho网络线程中直接处理命令
+            coalesce_window: 同一设备的命令合并窗口（秒），0表示不合并
+            transitions: 是否启用定时状态转换（布防延迟、窗帘行程、灯光渐变等），False时设备立即给出最终状态
+            stochastic: 随机状态转换的方式，tick为每个模拟周期掷骰子，geometric（与tick同分布）或exponential
+                为按分布抽取下一次事件的时间
+            max_slice: 模拟循环不让出事件循环的最长连续执行时间（秒），0表示每轮工作一次完成
             api_host: API服务器主机地址
             api_port: API服务器端口
             enable_api: 是否启用API服务器
@@ -40,6 +93,25 @@ class AppService:
         self.mqtt_config = mqtt_config
         self.config_file = config_file
         self.mock_interval = mock_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.engine = engine
+        self.workers = workers
+        self.use_uvloop = use_uvloop
+        self.embedded_broker = embedded_broker or mqtt_config.transport == "inprocess"
+        self.rate_limits = rate_limits
+        self.load_profile = load_profile
+        self.load_report = load_report
+        self.load_report_interval = load_report_interval
+        self.trace_spans = trace_spans
+        self.serializer = serializer
+        self.startup = startup or {}
+        self.ha_resync = ha_resync
+        self.command_subscription = command_subscription
+        self.command_queue = command_queue
+        self.coalesce_window = coalesce_window
+        self.transitions = transitions
+        self.stochastic = stochastic
+        self.max_slice = max_slice
         self.api_host = api_host
         self.api_port = api_port
         self.enable_api = enable_api
@@ -53,6 +125,14 @@ class AppService:
         self.shutdown_event = None
         self.mock_task = None
         self.api_task = None
+        self.rate_limiter = None
+        self.rate_limit_task = None
+        self.tracer = None
+        self.transition_scheduler = None
+        self.event_sampler = None
+        self.broker = None
+        self._owns_broker = False
+        self._shutdown_task = None
 
     async def initialize(self) -> bool:
         """
@@ -62,6 +142,9 @@ class AppService:
             bool: 初始化是否成功
         """
         try:
+            # 序列化后端需要在生成发现信息之前选定
+            set_serializer(create_serializer(self.serializer))
+            
             # 创建设备配置管理器
             self.device_config = DeviceConfig(config_file=self.config_file)
             
@@ -77,37 +160,45 @@ class AppService:
             # 创建设备实例
             device_instances = self.device_config.create_devices()
             
-            # 创建设备管理器
-            self.device_manager = MockDeviceManager()
-            
-            # 添加设备到管理器
-            self.device_manager.add_devices(device_instances)
-            
-            # 创建MQTT客户端
-            self.mqtt_client = create_mqtt_client(self.mqtt_config)
-            
-            # 设置MQTT客户端
-            setup_mqtt_client(
-                self.mqtt_client, 
-                self.mqtt_config, 
-                self.device_manager.on_message
-            )
+            # 内嵌Broker需要在创建MQTT客户端之前启动
+            if self.embedded_broker:
+                await self._start_broker()
             
-            # 发布设备发现信息
-            self.device_manager.publish_all_discoveries(self.mqtt_client)
-            
-            # 发布初始状态
-            self.device_manager.publish_all_states(self.mqtt_client)
-            
-            # 订阅命令主题
-            self.device_manager.subscribe_all_commands(self.mqtt_client)
+            # 多进程分片模式：每个工作进程拥有自己的MQTT客户端和模拟循环
+            if self.workers > 1:
+                self.device_manager = ShardedDeviceManager(
+                    workers=self.workers,
+                    mqtt_config=self.mqtt_config,
+                    mock_interval=self.mock_interval,
+                    heartbeat_interval=self.heartbeat_interval or None,
+                    engine=self.engine,
+                    log_level=logging.getLevelName(logging.getLogger().getEffectiveLevel()),
+                    use_uvloop=self.use_uvloop,
+                    rate_limits=self.rate_limits,
+                    load_profile=self.load_profile,
+                    load_report=self.load_report,
+                    load_report_interval=self.load_report_interval,
+                    trace_spans=self.trace_spans,
+                    serializer=self.serializer,
+                    startup=self.startup,
+                    ha_resync=self.ha_resync,
+                    command_subscription=self.command_subscription,
+                    command_queue=self.command_queue,
+                    coalesce_window=self.coalesce_window,
+                    transitions=self.transitions,
+                    stochastic=self.stochastic,
+                    max_slice=self.max_slice,
+                )
+                await self.device_manager.start(device_instances)
+            else:
+                self._setup_local_manager(device_instances)
             
             # 创建关闭事件
             self.shutdown_event = asyncio.Event()
             
             # 如果启用API服务器，创建FastAPI应用
             if self.enable_api:
-                self.api_app = create_app(self.device_config, self.device_manager)
+                self.api_app = create_app(self.device_config, self.device_manager, self.mqtt_client)
                 
                 # 配置Uvicorn服务器
                 uvicorn_config = uvicorn.Config(
@@ -127,15 +218,97 @@ class AppService:
             logger.exception(f"初始化服务失败: {e}")
             return False
 
+    async def _start_broker(self) -> None:
+        """启动内嵌MQTT Broker（复用本进程已设置的Broker），进程内传输时不监听TCP端口"""
+        if self.mqtt_config.transport == "inprocess" and self.workers > 1:
+            raise ValueError("进程内传输不支持多进程分片，请使用thread或asyncio传输")
+        self.broker = get_embedded_broker()
+        self._owns_broker = self.broker is None
+        if self._owns_broker:
+            self.broker = Broker()
+            set_embedded_broker(self.broker)
+        if self.mqtt_config.transport != "inprocess" and self.broker.server is None:
+            await self.broker.start(self.mqtt_config.broker_address, self.mqtt_config.broker_port)
+
+    def _setup_local_manager(self, device_instances) -> None:
+        """
+        在当前进程中创建设备管理器和MQTT客户端并订阅命令，发现信息和初始状态在start()中分批发布
+        
+        Args:
+            device_instances: 设备实例列表
+        """
+        # 发布限速器需要在发布发现信息之前安装
+        if self.rate_limits:
+            self.rate_limiter = PublishRateLimiter(**self.rate_limits)
+            set_rate_limiter(self.rate_limiter)
+        
+        # 命令往返延迟追踪
+        self.tracer = CommandTracer(self.trace_spans)
+        set_tracer(self.tracer)
+        
+        # 定时状态转换，设备模型处理命令时使用
+        if self.transitions:
+            self.transition_scheduler = TransitionScheduler()
+            set_transition_scheduler(self.transition_scheduler)
+        if self.stochastic != "tick":
+            self.event_sampler = EventSampler(self.stochastic)
+            set_event_sampler(self.event_sampler)
+        
+        # 创建设备管理器
+        load_driver = None
+        if self.load_profile is not None:
+            load_driver = LoadDriver(self.load_profile, self.load_report, self.load_report_interval)
+        birth_resync = None
+        if self.ha_resync is not None:
+            birth_resync = BirthResync(**self.ha_resync, **self.startup)
+        self.device_manager = MockDeviceManager(
+            heartbeat_interval=self.heartbeat_interval or None,
+            engine=self.engine,
+            load_driver=load_driver,
+            birth_resync=birth_resync,
+            command_subscription=self.command_subscription,
+            command_queue=CommandQueue(**self.command_queue) if self.command_queue is not None else None,
+            coalescer=CommandCoalescer(self.coalesce_window) if self.coalesce_window > 0 else None,
+            transitions=self.transition_scheduler,
+            events=self.event_sampler,
+            max_slice=self.max_slice,
+        )
+        
+        # 添加设备到管理器
+        self.device_manager.add_devices(device_instances)
+        
+        # 创建MQTT客户端
+        self.mqtt_client = create_mqtt_client(self.mqtt_config)
+        
+        # 设置MQTT客户端
+        setup_mqtt_client(
+            self.mqtt_client, 
+            self.mqtt_config, 
+            self.device_manager.on_message
+        )
+        
+        # 订阅命令主题
+        self.device_manager.subscribe_all_commands(self.mqtt_client)
+
+    @property
+    def is_sharded(self) -> bool:
+        """是否运行在多进程分片模式"""
+        return isinstance(self.device_manager, ShardedDeviceManager)
+
     async def start(self) -> None:
         """启动服务"""
         logger.info(f"HA-MQTT-mock v{__version__} 已启动")
         logger.info(f"已添加 {len(self.device_manager.devices)} 个设备")
         
-        # 创建并跟踪模拟任务
-        self.mock_task = asyncio.create_task(
-            self.device_manager.mock_devices(self.mqtt_client, interval=self.mock_interval)
-        )
+        # 创建并跟踪模拟任务（分片模式下监视工作进程）
+        if self.is_sharded:
+            self.mock_task = asyncio.create_task(self.device_manager.run())
+        else:
+            self.mock_task = asyncio.create_task(self._run_devices())
+        
+        # 发出因限速排队的消息
+        if self.rate_limiter is not None:
+            self.rate_limit_task = asyncio.create_task(self.rate_limiter.run())
         
         # 如果启用API服务器，创建API服务器任务
         if self.api_server:
@@ -153,9 +326,17 @@ class AppService:
             return_when=asyncio.FIRST_COMPLETED
         )
 
+    async def _run_devices(self) -> None:
+        """分批发布发现信息和初始状态，完成后开始模拟设备"""
+        await self.device_manager.publish_startup(self.mqtt_client, StartupPublisher(**self.startup))
+        await self.device_manager.mock_devices(self.mqtt_client, interval=self.mock_interval)
+    
     async def shutdown(self) -> None:
         """关闭服务"""
         if self.shutdown_event.is_set():
+            # 等待正在进行的关闭流程（例如由信号处理器触发）完成
+            if self._shutdown_task and self._shutdown_task is not asyncio.current_task():
+                await asyncio.shield(self._shutdown_task)
             return
             
         logger.info("正在优雅关闭...")
@@ -183,11 +364,36 @@ class AppService:
             except asyncio.CancelledError:
                 pass
         
-        # 停止设备模拟
-        self.device_manager.stop_mock()
+        if self.is_sharded:
+            # 停止所有工作进程
+            await self.device_manager.stop()
+        elif self.device_manager:
+            # 停止设备模拟
+            self.device_manager.stop_mock()
+            
+            # 停止限速队列
+            if self.rate_limit_task and not self.rate_limit_task.done():
+                self.rate_limit_task.cancel()
+                try:
+                    await self.rate_limit_task
+                except asyncio.CancelledError:
+                    pass
+            set_rate_limiter(None)
+            
+            # 断开MQTT连接
+            disconnect_mqtt_client(self.mqtt_client)
+            
+            # 写出剩余的命令延迟记录
+            if self.tracer is not None:
+                self.tracer.flush()
+                set_tracer(None)
+            set_transition_scheduler(None)
+            set_event_sampler(None)
         
-        # 断开MQTT连接
-        disconnect_mqtt_client(self.mqtt_client)
+        # 最后停止本服务创建的内嵌Broker
+        if self.broker is not None and self._owns_broker:
+            await self.broker.stop()
+            set_embedded_broker(None)
         
         logger.info("服务已完全关闭")
 
@@ -202,7 +408,7 @@ class AppService:
             """处理中断信号的回调函数"""
             if not self.shutdown_event.is_set():  # 防止重复触发
                 # 创建一个关闭任务，不阻塞信号处理器
-                asyncio.create_task(self.shutdown())
+                self._shutdown_task = asyncio.create_task(self.shutdown())
         
         # 注册信号处理器
         for sig in (signal.SIGINT, signal.SIGTERM):
@@ -0,0 +1,523 @@
+"""多进程分片模拟模块
+
+按object_id的一致性哈希把设备划分到多个工作进程，每个工作进程拥有独立的MQTT客户端和模拟循环，
+父进程保留API服务，并把状态读写请求路由到设备所在的分片。
+"""
+
+import asyncio
+import bisect
+import hashlib
+import itertools
+import logging
+import multiprocessing
+from dataclasses import asdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from ha_mqtt_mock.config import MQTTConfig
+from ha_mqtt_mock.models import MQTTDevice
+from .load_profile import LoadDriver, LoadProfile
+from .coalesce import CommandCoalescer
+from .command_queue import CommandQueue
+from .resync import BirthResync
+from .startup import StartupPublisher
+
+logger = logging.getLogger(__name__)
+
+
+class HashRing:
+    """带虚拟节点的一致性哈希环"""
+
+    def __init__(self, nodes: Iterable[int], replicas: int = 64) -> None:
+        """
+        初始化哈希环
+
+        Args:
+            nodes: 节点列表
+            replicas: 每个节点的虚拟节点数量
+        """
+        self.replicas = replicas
+        self._ring: List[int] = []
+        self._nodes: Dict[int, int] = {}
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def add_node(self, node: int) -> None:
+        """
+        添加节点
+
+        Args:
+            node: 节点编号
+        """
+        for i in range(self.replicas):
+            point = self._hash(f"{node}#{i}")
+            bisect.insort(self._ring, point)
+            self._nodes[point] = node
+
+    def get_node(self, key: str) -> int:
+        """
+        获取键所属的节点
+
+        Args:
+            key: 键（设备object_id）
+
+        Returns:
+            int: 节点编号
+        """
+        if not self._ring:
+            raise ValueError("哈希环中没有节点")
+        index = bisect.bisect(self._ring, self._hash(key)) % len(self._ring)
+        return self._nodes[self._ring[index]]
+
+
+def _worker_main(shard_id: int, config_values: Dict[str, Any], devices: List[MQTTDevice],
+                 options: Dict[str, Any], conn) -> None:
+    """工作进程入口"""
+    from ha_mqtt_mock.utils.logging import setup_logging
+    from .mqtt_asyncio import get_loop_factory
+
+    setup_logging(log_level=options.get("log_level", "INFO"), enable_rich=False)
+    try:
+        asyncio.run(
+            _run_worker(shard_id, config_values, devices, options, conn),
+            loop_factory=get_loop_factory(options.get("uvloop", False)),
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_worker(shard_id: int, config_values: Dict[str, Any], devices: List[MQTTDevice],
+                      options: Dict[str, Any], conn) -> None:
+    """
+    在工作进程中运行一个分片：创建MQTT客户端，订阅命令，分批发布发现信息和初始状态后运行模拟循环
+    """
+    from .mock import MockDeviceManager
+    from .mqtt_client import create_mqtt_client, disconnect_mqtt_client, setup_mqtt_client
+    from .mqtt_pool import get_connection_stats
+    from ha_mqtt_mock.utils.metrics import registry as metrics_registry
+    from ha_mqtt_mock.utils.rate_limit import PublishRateLimiter, set_rate_limiter
+    from ha_mqtt_mock.utils.serializer import create_serializer, set_serializer
+    from ha_mqtt_mock.utils.stochastic import EventSampler, set_event_sampler
+    from ha_mqtt_mock.utils.tracing import CommandTracer, set_tracer
+    from ha_mqtt_mock.utils.transitions import TransitionScheduler, set_transition_scheduler
+
+    # 每个分片使用派生的客户端ID，避免互相踢下线
+    mqtt_config = MQTTConfig.get_instance()
+    mqtt_config.update(**{**config_values, "client_id": f"{config_values['client_id']}_shard{shard_id}"})
+
+    load_driver = None
+    if options.get("load_profile") is not None:
+        load_driver = LoadDriver(options["load_profile"], options.get("load_report"),
+                                 options.get("load_report_interval", 10.0), shard=shard_id)
+
+    rate_limiter = None
+    if options.get("rate_limits"):
+        rate_limiter = PublishRateLimiter(**options["rate_limits"])
+        set_rate_limiter(rate_limiter)
+
+    set_serializer(create_serializer(options.get("serializer", "json")))
+    tracer = CommandTracer(options.get("trace_spans"), shard=shard_id)
+    set_tracer(tracer)
+    transitions = TransitionScheduler() if options.get("transitions", True) else None
+    set_transition_scheduler(transitions)
+    stochastic = options.get("stochastic", "geometric")
+    events = EventSampler(stochastic) if stochastic != "tick" else None
+    set_event_sampler(events)
+
+    try:
+        birth_resync = None
+        if options.get("ha_resync") is not None:
+            birth_resync = BirthResync(**options["ha_resync"], **options.get("startup", {}))
+        command_queue = None
+        if options.get("command_queue") is not None:
+            command_queue = CommandQueue(**options["command_queue"])
+        manager = MockDeviceManager(
+            heartbeat_interval=options.get("heartbeat_interval"),
+            engine=options.get("engine", "object"),
+            load_driver=load_driver,
+            birth_resync=birth_resync,
+            command_subscription=options.get("command_subscription", "wildcard"),
+            partial=True,
+            command_queue=command_queue,
+            coalescer=CommandCoalescer(options["coalesce_window"]) if options.get("coalesce_window") else None,
+            transitions=transitions,
+            events=events,
+            max_slice=options.get("max_slice", 0.01),
+        )
+        manager.add_devices(devices)
+
+        client = create_mqtt_client(mqtt_config)
+        setup_mqtt_client(client, mqtt_config, manager.on_message)
+        manager.subscribe_all_commands(client)
+    except Exception as e:
+        logger.exception(f"分片 {shard_id} 初始化失败: {e}")
+        conn.send((0, False, repr(e)))
+        return
+
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    handlers = {
+        "get_device_state": manager.get_device_state,
+        "get_all_states": manager.get_all_states,
+        "update_device_state": manager.update_device_state,
+        "add_device": manager.add_device,
+        "add_devices": manager.add_devices,
+        "remove_device": manager.remove_device,
+        "clear_devices": manager.clear_devices,
+        "stats": lambda: {
+            "shard": shard_id,
+            "devices": len(manager.devices),
+            "connections": get_connection_stats(client),
+            "rate_limit": rate_limiter.get_stats() if rate_limiter is not None else None,
+            "load": manager.get_load_stats(),
+            "metrics": metrics_registry.snapshot(),
+            "latency": tracer.snapshot(),
+            "startup": manager.get_startup_stats(),
+            "resync": manager.get_resync_stats(),
+            "command_queue": manager.get_command_queue_stats(),
+            "coalescing": manager.get_coalescing_stats(),
+            "transitions": manager.get_transition_stats(),
+            "stochastic": manager.get_event_stats(),
+            "slicing": manager.get_slice_stats(),
+        },
+    }
+
+    def on_request() -> None:
+        while conn.poll():
+            try:
+                request_id, method, args = conn.recv()
+            except EOFError:
+                stop_event.set()
+                return
+            if method == "stop":
+                stop_event.set()
+                conn.send((request_id, True, None))
+                continue
+            try:
+                conn.send((request_id, True, handlers[method](*args)))
+            except Exception as e:
+                logger.exception(f"分片 {shard_id} 处理请求 {method} 时发生错误: {e}")
+                conn.send((request_id, False, repr(e)))
+
+    async def run_devices() -> None:
+        await manager.publish_startup(client, StartupPublisher(**options.get("startup", {})))
+        await manager.mock_devices(client, interval=options.get("mock_interval", 10))
+
+    loop.add_reader(conn.fileno(), on_request)
+    mock_task = asyncio.create_task(run_devices())
+    rate_limit_task = asyncio.create_task(rate_limiter.run()) if rate_limiter is not None else None
+    conn.send((0, True, "ready"))
+    logger.info(f"分片 {shard_id} 已启动，负责 {len(devices)} 个设备")
+
+    try:
+        await asyncio.wait([mock_task, asyncio.create_task(stop_event.wait())], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        loop.remove_reader(conn.fileno())
+        manager.stop_mock()
+        if rate_limit_task is not None:
+            rate_limit_task.cancel()
+        if not mock_task.done():
+            mock_task.cancel()
+            try:
+                await mock_task
+            except asyncio.CancelledError:
+                pass
+        disconnect_mqtt_client(client)
+        tracer.flush()
+
+
+class _Shard:
+    """父进程中的分片句柄"""
+
+    def __init__(self, shard_id: int, process, conn) -> None:
+        self.shard_id = shard_id
+        self.process = process
+        self.conn = conn
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.ids = itertools.count(1)
+
+
+class ShardedDeviceManager:
+    """多进程分片设备管理器，提供与MockDeviceManager一致的状态读写接口（异步）"""
+
+    def __init__(self, workers: int, mqtt_config: MQTTConfig, mock_interval: int = 10,
+                 heartbeat_interval: Optional[float] = None, engine: str = "object",
+                 log_level: str = "INFO", request_timeout: float = 10.0, use_uvloop: bool = False,
+                 rate_limits: Optional[Dict[str, Any]] = None, load_profile: Optional[LoadProfile] = None,
+                 load_report: Optional[str] = None, load_report_interval: float = 10.0,
+                 trace_spans: Optional[str] = None, serializer: str = "json",
+                 startup: Optional[Dict[str, Any]] = None, ha_resync: Optional[Dict[str, Any]] = None,
+                 command_subscription: str = "wildcard", command_queue: Optional[Dict[str, Any]] = None,
+                 coalesce_window: float = 0, transitions: bool = True, stochastic: str = "geometric",
+                 max_slice: float = 0.01) -> None:
+        """
+        初始化分片设备管理器
+
+        Args:
+            workers: 工作进程数量
+            mqtt_config: MQTT配置
+            mock_interval: 模拟更新间隔（秒）
+            heartbeat_interval: 状态心跳间隔（秒）
+            engine: 工作进程使用的模拟引擎
+            log_level: 工作进程日志级别
+            request_timeout: 等待工作进程响应的超时时间（秒）
+            use_uvloop: 工作进程是否使用uvloop事件循环
+            rate_limits: 发布限速配置，全局和按组件的速率在工作进程之间平分
+            load_profile: 负载曲线，速率在工作进程之间平分
+            load_report: 负载曲线实际速率报告文件，所有工作进程追加写入同一个文件
+            load_report_interval: 负载曲线报告间隔（秒）
+            trace_spans: 命令延迟分段记录文件，所有工作进程追加写入同一个文件
+            serializer: 工作进程使用的JSON序列化后端
+            startup: 启动时分批发布的配置，发布速率在工作进程之间平分
+            ha_resync: Home Assistant重启后重新同步的配置，每个工作进程重新同步自己的设备
+            command_subscription: 命令订阅方式，wildcard时每个工作进程都会收到所有设备的命令并忽略其他分片的命令
+            command_queue: 命令队列配置，每个工作进程使用自己的队列
+            coalesce_window: 同一设备的命令合并窗口（秒），0表示不合并
+            transitions: 是否启用定时状态转换，每个工作进程在自己的事件循环中执行自己设备的转换
+            stochastic: 随机状态转换的方式（tick、geometric或exponential）
+            max_slice: 工作进程的模拟循环不让出事件循环的最长连续执行时间（秒），决定请求在工作进程中最多等待多久
+        """
+        if workers < 1:
+            raise ValueError(f"无效的工作进程数量: {workers}")
+        self.workers = workers
+        self.mqtt_config = mqtt_config
+        self.options = {
+            "mock_interval": mock_interval,
+            "heartbeat_interval": heartbeat_interval,
+            "engine": engine,
+            "log_level": log_level,
+            "uvloop": use_uvloop,
+            "rate_limits": self._share_rate_limits(rate_limits, workers),
+            "load_profile": load_profile.scaled(1 / workers) if load_profile is not None else None,
+            "load_report": load_report,
+            "load_report_interval": load_report_interval,
+            "trace_spans": trace_spans,
+            "serializer": serializer,
+            "startup": self._share_startup(startup, workers),
+            "ha_resync": ha_resync,
+            "command_subscription": command_subscription,
+            "command_queue": command_queue,
+            "coalesce_window": coalesce_window,
+            "transitions": transitions,
+            "stochastic": stochastic,
+            "max_slice": max_slice,
+        }
+        self.request_timeout = request_timeout
+        self.ring = HashRing(range(workers))
+        self.shards: List[_Shard] = []
+        self.devices: List[MQTTDevice] = []
+        self.is_running = False
+
+    @staticmethod
+    def _share_rate_limits(rate_limits: Optional[Dict[str, Any]], workers: int) -> Optional[Dict[str, Any]]:
+        """把全局和按组件的速率平分到每个工作进程，按设备的速率不变（每个设备只属于一个分片）"""
+        if not rate_limits:
+            return None
+        shared = dict(rate_limits)
+        if shared.get("global_rate"):
+            shared["global_rate"] = shared["global_rate"] / workers
+        if shared.get("component_rates"):
+            shared["component_rates"] = {
+                component: rate / workers for component, rate in shared["component_rates"].items()
+            }
+        return shared
+
+    @staticmethod
+    def _share_startup(startup: Optional[Dict[str, Any]], workers: int) -> Dict[str, Any]:
+        """把启动发布速率平分到每个工作进程，总速率与单进程相同"""
+        shared = dict(startup or {})
+        rate = shared.get("rate", StartupPublisher.DEFAULT_RATE)
+        if rate:
+            shared["rate"] = rate / workers
+        return shared
+
+    def shard_of(self, object_id: str) -> int:
+        """
+        获取设备所在的分片编号
+
+        Args:
+            object_id: 设备对象ID
+
+        Returns:
+            int: 分片编号
+        """
+        return self.ring.get_node(object_id)
+
+    def partition(self, devices: Iterable[MQTTDevice]) -> List[List[MQTTDevice]]:
+        """
+        按一致性哈希把设备划分到各个分片
+
+        Args:
+            devices: MQTT设备实例列表
+
+        Returns:
+            List[List[MQTTDevice]]: 每个分片的设备列表
+        """
+        shards: List[List[MQTTDevice]] = [[] for _ in range(self.workers)]
+        for device in devices:
+            shards[self.shard_of(device.object_id)].append(device)
+        return shards
+
+    async def start(self, devices: List[MQTTDevice]) -> None:
+        """
+        启动所有工作进程并等待它们就绪
+
+        Args:
+            devices: MQTT设备实例列表
+        """
+        loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context("spawn")
+        config_values = asdict(self.mqtt_config)
+        self.devices = list(devices)
+
+        for shard_id, shard_devices in enumerate(self.partition(devices)):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                args=(shard_id, config_values, shard_devices, self.options, child_conn),
+                name=f"ha-mqtt-mock-shard-{shard_id}",
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            shard = _Shard(shard_id, process, parent_conn)
+            shard.pending[0] = loop.create_future()
+            loop.add_reader(parent_conn.fileno(), self._on_response, shard)
+            self.shards.append(shard)
+            logger.info(f"已启动分片 {shard_id} (PID: {process.pid})，负责 {len(shard_devices)} 个设备")
+
+        # 等待所有分片完成初始化
+        await asyncio.wait_for(
+            asyncio.gather(*(shard.pending[0] for shard in self.shards)),
+            timeout=max(self.request_timeout, 60),
+        )
+        self.is_running = True
+
+    def _on_response(self, shard: _Shard) -> None:
+        """读取工作进程的响应并完成对应的Future"""
+        try:
+            while shard.conn.poll():
+                request_id, ok, result = shard.conn.recv()
+                future = shard.pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(RuntimeError(f"分片 {shard.shard_id} 返回错误: {result}"))
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(shard.conn.fileno())
+            for future in shard.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"分片 {shard.shard_id} 已断开"))
+            shard.pending.clear()
+
+    async def _call(self, shard: _Shard, method: str, *args) -> Any:
+        """
+        调用工作进程中设备管理器的方法
+
+        Args:
+            shard: 分片句柄
+            method: 方法名
+            *args: 方法参数
+
+        Returns:
+            Any: 方法返回值
+        """
+        request_id = next(shard.ids)
+        future = asyncio.get_running_loop().create_future()
+        shard.pending[request_id] = future
+        shard.conn.send((request_id, method, args))
+        try:
+            return await asyncio.wait_for(future, timeout=self.request_timeout)
+        finally:
+            shard.pending.pop(request_id, None)
+
+    def _shard_for(self, object_id: str) -> _Shard:
+        return self.shards[self.shard_of(object_id)]
+
+    async def get_device_state(self, object_id: str) -> Optional[Dict]:
+        """获取设备当前状态"""
+        return await self._call(self._shard_for(object_id), "get_device_state", object_id)
+
+    async def get_all_states(self) -> Dict[str, Dict]:
+        """获取所有设备的当前状态"""
+        states: Dict[str, Dict] = {}
+        for result in await asyncio.gather(*(self._call(shard, "get_all_states") for shard in self.shards)):
+            states.update(result)
+        return states
+
+    async def update_device_state(self, object_id: str, state: Dict) -> Optional[Dict]:
+        """更新设备状态"""
+        return await self._call(self._shard_for(object_id), "update_device_state", object_id, state)
+
+    async def add_device(self, device: MQTTDevice) -> None:
+        """添加设备到所属分片"""
+        await self._call(self._shard_for(device.object_id), "add_device", device)
+        self.devices.append(device)
+
+    async def add_devices(self, devices: List[MQTTDevice]) -> None:
+        """批量添加设备到所属分片"""
+        partitions = self.partition(devices)
+        await asyncio.gather(*(
+            self._call(shard, "add_devices", partitions[shard.shard_id])
+            for shard in self.shards if partitions[shard.shard_id]
+        ))
+        self.devices.extend(devices)
+
+    async def remove_device(self, object_id: str) -> bool:
+        """从所属分片移除设备"""
+        removed = await self._call(self._shard_for(object_id), "remove_device", object_id)
+        if removed:
+            self.devices = [d for d in self.devices if d.object_id != object_id]
+        return removed
+
+    async def clear_devices(self) -> None:
+        """清除所有分片中的设备"""
+        await asyncio.gather(*(self._call(shard, "clear_devices") for shard in self.shards))
+        self.devices.clear()
+
+    async def get_stats(self) -> List[Dict[str, Any]]:
+        """获取各分片的统计信息"""
+        return list(await asyncio.gather(*(self._call(shard, "stats") for shard in self.shards)))
+
+    async def run(self) -> None:
+        """监视工作进程，任何一个工作进程意外退出时返回"""
+        while self.is_running:
+            for shard in self.shards:
+                if not shard.process.is_alive():
+                    logger.error(f"分片 {shard.shard_id} 意外退出，退出码: {shard.process.exitcode}")
+                    self.is_running = False
+                    return
+            await asyncio.sleep(1)
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """
+        停止所有工作进程
+
+        Args:
+            timeout: 等待工作进程退出的超时时间（秒）
+        """
+        self.is_running = False
+        loop = asyncio.get_running_loop()
+        for shard in self.shards:
+            if shard.process.is_alive():
+                try:
+                    await asyncio.wait_for(self._call(shard, "stop"), timeout=timeout)
+                except Exception as e:
+                    logger.warning(f"通知分片 {shard.shard_id} 停止失败: {e}")
+        for shard in self.shards:
+            await loop.run_in_executor(None, shard.process.join, timeout)
+            if shard.process.is_alive():
+                logger.warning(f"分片 {shard.shard_id} 未能在超时时间内退出，强制终止")
+                shard.process.terminate()
+            try:
+                loop.remove_reader(shard.conn.fileno())
+            except (OSError, ValueError):
+                pass
+            shard.conn.close()
+        self.shards.clear()
+        logger.info("所有分片已停止")
@@ -0,0 +1,247 @@
+"""启动发布模块
+
+启动时按批发布设备的发现信息，而不是在一个循环中一次性发出整个设备群（大量发现信息在一秒内
+到达时Home Assistant可能丢弃实体）：
+    - 每批发现信息使用QoS 1发布，等待本批的PUBACK后再继续
+    - 本批设备的初始状态紧跟在它们的发现信息之后发布，不需要等待整个设备群；
+      只有发现信息已经确认（或由限速器发出）的设备才发布初始状态，避免状态先于发现信息到达Home Assistant
+    - 批之间按配置的速率暂停
+
+进度可以通过 get_stats() 查询（API: GET /api/startup）。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Container, Dict, List, Optional, Sequence
+
+from ha_mqtt_mock.models import MQTTDevice
+from ha_mqtt_mock.utils.rate_limit import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+class StartupPublisher:
+    """分批发布发现信息和初始状态"""
+
+    DEFAULT_BATCH_SIZE = 100
+    DEFAULT_RATE = 2000.0
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, rate: float = DEFAULT_RATE, qos: int = 1,
+                 ack_timeout: float = 10.0, poll_interval: float = 0.005) -> None:
+        """
+        初始化启动发布器
+
+        Args:
+            batch_size: 每批的设备数量
+            rate: 发现信息的最大发布速率（条/秒），0表示不限速
+            qos: 发现信息的QoS，大于0时等待每批的PUBACK
+            ack_timeout: 等待一批PUBACK的最长时间（秒），超时后继续发布下一批
+            poll_interval: 检查PUBACK的间隔（秒）
+        """
+        if batch_size < 1:
+            raise ValueError(f"无效的启动批大小: {batch_size}")
+        if rate < 0:
+            raise ValueError(f"无效的启动发布速率: {rate}")
+        self.batch_size = batch_size
+        self.rate = rate
+        self.qos = qos
+        self.ack_timeout = ack_timeout
+        self.poll_interval = poll_interval
+
+        self.phase = "pending"
+        self.devices = 0
+        self.discoveries_sent = 0
+        self.discoveries_acked = 0
+        self.discoveries_queued = 0
+        self.discoveries_released = 0
+        self.discoveries_failed = 0
+        self.discoveries_skipped = 0
+        self.ack_timeouts = 0
+        self.states_published = 0
+        self.batches = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        """启动发布是否已经完成"""
+        return self.phase == "done"
+
+    async def run(self, client, devices: Sequence[MQTTDevice], skip_discovery: Container[str] = ()) -> None:
+        """
+        分批发布设备的发现信息和初始状态
+
+        Args:
+            client: MQTT客户端实例
+            devices: 设备列表（开始时复制，启动期间新增的设备自行发布）
+            skip_discovery: 不需要重新发布发现信息的发现主题（Broker保留的配置仍然有效），只发布状态
+        """
+        devices = list(devices)
+        loop = asyncio.get_running_loop()
+        wait_writable = getattr(client, "wait_writable", None)
+        self.phase = "discovery"
+        self.devices = len(devices)
+        self.started = time.monotonic()
+        logger.info(f"开始分批发布 {len(devices)} 个设备的发现信息，每批 {self.batch_size} 个")
+
+        for start in range(0, len(devices), self.batch_size):
+            batch_started = loop.time()
+            batch = devices[start:start + self.batch_size]
+
+            # 发现信息已送达、可以发布初始状态的设备
+            ready = []
+            pending = []
+            unsent = []
+            for device in batch:
+                if device.discovery_topic in skip_discovery:
+                    self.discoveries_skipped += 1
+                    ready.append(device)
+                    continue
+                result = device.publish_discovery(client, qos=self.qos)
+                self.discoveries_sent += 1
+                if result is None:
+                    unsent.append(device)
+                elif result.rc != 0:
+                    self.discoveries_failed += 1
+                elif self.qos > 0:
+                    pending.append((device, result))
+                else:
+                    self.discoveries_acked += 1
+                    ready.append(device)
+
+            # 没有发布结果的发现信息在限速器中排队，或者发布时发生了错误
+            limiter = get_rate_limiter()
+            queued_topics = limiter.queued_topics() if limiter is not None and unsent else set()
+            queued = []
+            for device in unsent:
+                if device.discovery_topic in queued_topics:
+                    self.discoveries_queued += 1
+                    queued.append(device)
+                else:
+                    self.discoveries_failed += 1
+            ready.extend(await self._wait_delivery(pending, queued))
+
+            # 只发布发现信息已送达的设备的初始状态，其余设备的状态留给模拟循环
+            for device in ready:
+                if device.publish_state(client):
+                    self.states_published += 1
+            self.batches += 1
+
+            if wait_writable is not None:
+                await wait_writable()
+            delay = len(batch) / self.rate - (loop.time() - batch_started) if self.rate else 0
+            await asyncio.sleep(max(delay, 0))
+
+        self.phase = "done"
+        self.finished = time.monotonic()
+        logger.info(
+            f"已发布 {self.discoveries_sent} 个设备的发现信息和 {self.states_published} 个初始状态，"
+            f"耗时 {self.finished - self.started:.2f} 秒"
+        )
+
+    async def _wait_delivery(self, pending: List[Any], queued: List[MQTTDevice]) -> List[MQTTDevice]:
+        """
+        等待一批发现信息的PUBACK，以及在限速器中排队的发现信息被发出
+
+        Args:
+            pending: (设备, 发布结果) 列表，发布结果为paho的MQTTMessageInfo或兼容对象
+            queued: 发现信息在限速器中排队的设备
+
+        Returns:
+            List[MQTTDevice]: 发现信息在超时前已送达的设备
+        """
+        delivered = []
+        limiter = get_rate_limiter()
+        deadline = time.monotonic() + self.ack_timeout
+        while pending or queued:
+            still_pending = []
+            for device, info in pending:
+                if info.is_published():
+                    self.discoveries_acked += 1
+                    delivered.append(device)
+                else:
+                    still_pending.append((device, info))
+            pending = still_pending
+            if queued:
+                queued_topics = limiter.queued_topics() if limiter is not None else set()
+                still_queued = []
+                for device in queued:
+                    if device.discovery_topic in queued_topics:
+                        still_queued.append(device)
+                    else:
+                        self.discoveries_released += 1
+                        delivered.append(device)
+                queued = still_queued
+            if not pending and not queued:
+                break
+            if time.monotonic() >= deadline:
+                waiting = len(pending) + len(queued)
+                self.ack_timeouts += waiting
+                logger.warning(f"等待发现信息送达超时，{waiting} 条未确认，这些设备的初始状态留给模拟循环发布")
+                break
+            await asyncio.sleep(self.poll_interval)
+        return delivered
+
+    def _finished(self) -> int:
+        """已确认、由限速器发出、发布失败、等待超时或跳过的发现信息数量"""
+        return (self.discoveries_acked + self.discoveries_released + self.discoveries_failed
+                + self.ack_timeouts + self.discoveries_skipped)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取启动发布的进度
+
+        Returns:
+            Dict[str, Any]: 阶段、设备数、已发送/已确认/排队/失败/跳过的发现信息数、初始状态数和耗时
+        """
+        if self.started is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished if self.finished is not None else time.monotonic()) - self.started
+        return {
+            "phase": self.phase,
+            "devices": self.devices,
+            "discoveries_sent": self.discoveries_sent,
+            "discoveries_acked": self.discoveries_acked,
+            # 在限速器中排队的发现信息数，以及其中已经由限速器发出的数量
+            "discoveries_queued": self.discoveries_queued,
+            "discoveries_released": self.discoveries_released,
+            "discoveries_failed": self.discoveries_failed,
+            "discoveries_skipped": self.discoveries_skipped,
+            "ack_timeouts": self.ack_timeouts,
+            "states_published": self.states_published,
+            "batches": self.batches,
+            # 已确认、由限速器发出、失败、等待超时或跳过的发现信息比例
+            "progress": round(self._finished() / self.devices, 4) if self.devices else None,
+            "elapsed_seconds": round(elapsed, 3),
+            "discovery_rate": round(self.discoveries_sent / elapsed, 1) if elapsed > 0 else None,
+        }
+
+
+def merge_startup_stats(shards: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    汇总多个分片的启动进度
+
+    Args:
+        shards: 各分片的 get_stats() 结果
+
+    Returns:
+        Dict[str, Any]: 汇总的进度，所有分片完成时阶段为done
+    """
+    if not shards:
+        return {"phase": "pending", "devices": 0}
+    phases = {shard["phase"] for shard in shards}
+    merged: Dict[str, Any] = {
+        "phase": "done" if phases == {"done"} else "pending" if phases == {"pending"} else "discovery",
+    }
+    for key in ("devices", "discoveries_sent", "discoveries_acked", "discoveries_queued", "discoveries_released",
+                "discoveries_failed", "discoveries_skipped", "ack_timeouts", "states_published", "batches"):
+        merged[key] = sum(shard.get(key, 0) for shard in shards)
+    finished = (merged["discoveries_acked"] + merged["discoveries_released"] + merged["discoveries_failed"]
+                + merged["discoveries_skipped"] + merged["ack_timeouts"])
+    merged["progress"] = round(finished / merged["devices"], 4) if merged["devices"] else None
+    merged["elapsed_seconds"] = max(shard["elapsed_seconds"] for shard in shards)
+    elapsed = merged["elapsed_seconds"]
+    merged["discovery_rate"] = round(merged["discoveries_sent"] / elapsed, 1) if elapsed > 0 else None
+    return merged
@@ -0,0 +1,144 @@
+"""模拟循环时间片模块
+
+模拟循环与API服务器（以及分片模式下工作进程的请求处理）运行在同一个事件循环中。
+一轮到期设备很多时，逐个模拟并发布会长时间不让出事件循环，期间到达的API请求只能等待。
+TimeSlicer把一轮的工作切成不超过max_slice的时间片，时间片之间让出事件循环：
+    - 每个时间片的连续执行时间记录在 ha_mqtt_mock_tick_slice_seconds 中
+    - LoopLagProbe定期测量定时回调的实际延迟（ha_mqtt_mock_event_loop_lag_seconds），
+      即就绪的回调（如刚到达的API请求）排在模拟工作后面等待的时间
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from ha_mqtt_mock.utils.metrics import EVENT_LOOP_LAG, TICK_SLICE
+
+logger = logging.getLogger(__name__)
+
+
+class TimeSlicer:
+    """把一轮模拟工作切成有时间上限的时间片"""
+
+    DEFAULT_MAX_SLICE = 0.01
+
+    def __init__(self, max_slice: Optional[float] = DEFAULT_MAX_SLICE) -> None:
+        """
+        初始化时间片
+
+        Args:
+            max_slice: 时间片的最长连续执行时间（秒），为None或0时一轮工作不让出事件循环
+        """
+        if max_slice is not None and max_slice < 0:
+            raise ValueError(f"无效的时间片长度: {max_slice}")
+        self.max_slice = max_slice or None
+        self._slice_started = 0.0
+        self._work = 0.0
+
+        self.slices = 0
+        self.yields = 0
+        self.longest = 0.0
+
+    def start(self) -> None:
+        """开始一轮工作"""
+        self._work = 0.0
+        self._slice_started = time.perf_counter()
+
+    def expired(self) -> bool:
+        """
+        当前时间片是否已经用完
+
+        Returns:
+            bool: 是否应该让出事件循环
+        """
+        return self.max_slice is not None and time.perf_counter() - self._slice_started >= self.max_slice
+
+    def _end_slice(self) -> None:
+        """记录当前时间片"""
+        elapsed = time.perf_counter() - self._slice_started
+        TICK_SLICE.observe(elapsed)
+        self._work += elapsed
+        self.slices += 1
+        if elapsed > self.longest:
+            self.longest = elapsed
+
+    async def pause(self) -> None:
+        """结束当前时间片，让出事件循环，然后开始下一个时间片"""
+        self._end_slice()
+        self.yields += 1
+        await asyncio.sleep(0)
+        self._slice_started = time.perf_counter()
+
+    def finish(self) -> float:
+        """
+        结束一轮工作
+
+        Returns:
+            float: 本轮所有时间片的执行时间之和（秒），不含让出事件循环的时间
+        """
+        self._end_slice()
+        return self._work
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取时间片统计
+
+        Returns:
+            Dict[str, Any]: 时间片上限、时间片数、让出次数和最长的时间片（毫秒）
+        """
+        return {
+            "max_slice_ms": round(self.max_slice * 1000, 3) if self.max_slice is not None else None,
+            "slices": self.slices,
+            "yields": self.yields,
+            "longest_slice_ms": round(self.longest * 1000, 3),
+        }
+
+
+class LoopLagProbe:
+    """定期测量事件循环中定时回调的实际延迟"""
+
+    DEFAULT_INTERVAL = 0.1
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL) -> None:
+        """
+        初始化延迟探针
+
+        Args:
+            interval: 测量间隔（秒）
+        """
+        if interval <= 0:
+            raise ValueError(f"无效的事件循环延迟测量间隔: {interval}")
+        self.interval = interval
+        self.samples = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    async def run(self) -> None:
+        """持续测量，直到任务被取消"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - expected, 0.0)
+            EVENT_LOOP_LAG.observe(lag)
+            self.samples += 1
+            self.total += lag
+            self.last = lag
+            if lag > self.max:
+                self.max = lag
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取延迟统计
+
+        Returns:
+            Dict[str, Any]: 测量次数和最近、平均、最大延迟（毫秒）
+        """
+        return {
+            "samples": self.samples,
+            "last_ms": round(self.last * 1000, 3),
+            "mean_ms": round(self.total / self.samples * 1000, 3) if self.samples else None,
+            "max_ms": round(self.max * 1000, 3),
+        }
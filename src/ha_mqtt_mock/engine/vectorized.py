@@ -0,0 +1,439 @@
+"""NumPy向量化模拟引擎
+
+对大规模数值设备（传感器数值、吸尘器和割草机电量）使用按类型分组的列式数组，
+每次更新整列推进，只把需要上报的行写回设备状态并序列化发布。
+
+numpy为可选依赖，未安装时无法启用该引擎。
+"""
+
+import logging
+import random
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy为可选依赖
+    np = None
+
+from ha_mqtt_mock.models import LawnMower, MQTTDevice, Sensor, Vacuum
+
+logger = logging.getLogger(__name__)
+
+
+def numpy_available() -> bool:
+    """
+    检查numpy是否可用
+
+    Returns:
+        bool: numpy是否已安装
+    """
+    return np is not None
+
+
+class _Column(ABC):
+    """一组同类设备的列式状态"""
+
+    def __init__(self, devices: List[MQTTDevice], buckets: int, rng) -> None:
+        self.devices = devices
+        self.rng = rng
+        # 每行随机分配到一个相位桶，每个子节拍只推进一个桶，使发布分散在整个间隔内
+        bucket_of = rng.integers(0, buckets, size=len(devices))
+        self.bucket_rows = [np.flatnonzero(bucket_of == b) for b in range(buckets)]
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def tick(self, client, bucket: Optional[int], now: float, heartbeat: Optional[float]) -> int:
+        """
+        推进一个相位桶（为None时推进整列）并发布需要上报的行
+
+        Returns:
+            int: 发布的消息数量
+        """
+        rows = np.arange(len(self.devices)) if bucket is None else self.bucket_rows[bucket]
+        if len(rows) == 0:
+            return 0
+        return self.advance(client, rows, now, heartbeat)
+
+    @abstractmethod
+    def advance(self, client, rows, now: float, heartbeat: Optional[float]) -> int:
+        """
+        推进指定的行并发布需要上报的行
+
+        Returns:
+            int: 发布的消息数量
+        """
+        pass
+
+    def sync(self) -> None:
+        """把列中的数值写回设备状态"""
+
+    def sync_device(self, row: int) -> None:
+        """把单行数值写回设备状态"""
+
+    def refresh_device(self, row: int) -> None:
+        """从设备状态重新读取单行数值（外部修改状态后调用）"""
+
+
+class SensorColumn(_Column):
+    """同一传感器类型的数值列"""
+
+    def __init__(self, sensor_type: str, devices: List[Sensor], buckets: int, rng) -> None:
+        super().__init__(devices, buckets, rng)
+        config = Sensor.SENSOR_TYPES[sensor_type]
+        self.key = sensor_type
+        self.step = config["mock_step"]
+        self.min_value = config["mock_min"]
+        self.max_value = config["mock_max"]
+
+        n = len(devices)
+        self.values = np.array([d.state.get(sensor_type, self.min_value) for d in devices], dtype=np.float64)
+        self.last_reported = np.array(
+            [np.nan if d.last_reported_value is None else d.last_reported_value for d in devices], dtype=np.float64
+        )
+        self.last_published = np.array(
+            [-np.inf if d.last_published is None else d.last_published for d in devices], dtype=np.float64
+        )
+        self.force = np.zeros(n, dtype=bool)
+        self.deadband = np.array([d.report_policy["report_deadband"] for d in devices], dtype=np.float64)
+        self.deadband_relative = np.array([d.report_policy["report_deadband_relative"] for d in devices], dtype=np.float64)
+        self.min_interval = np.array([d.report_policy["min_report_interval"] for d in devices], dtype=np.float64)
+        self.max_interval = np.array([d.report_policy["max_report_interval"] for d in devices], dtype=np.float64)
+
+    def step_values(self, rows) -> None:
+        """
+        推进指定行的数值：80%概率小步（±1步），20%概率大步（±5步），并限制在范围内
+        """
+        n = len(rows)
+        scale = np.where(self.rng.random(n) < 0.8, self.step, 5 * self.step)
+        change = self.rng.uniform(-1.0, 1.0, n) * scale
+        self.values[rows] = np.round(np.clip(self.values[rows] + change, self.min_value, self.max_value), 2)
+
+    def report_mask(self, rows, now: float):
+        """
+        按照上报策略计算需要上报的行
+
+        Returns:
+            ndarray: 与rows等长的布尔掩码
+        """
+        values = self.values[rows]
+        last = self.last_reported[rows]
+        elapsed = now - self.last_published[rows]
+        threshold = np.maximum(self.deadband[rows], self.deadband_relative[rows] * np.abs(last))
+        with np.errstate(invalid="ignore"):
+            moved = np.abs(values - last) >= threshold
+        due = self.force[rows] | (elapsed >= self.max_interval[rows]) | moved
+        return np.isnan(last) | ((elapsed >= self.min_interval[rows]) & due)
+
+    def advance(self, client, rows, now: float, heartbeat: Optional[float]) -> int:
+        self.step_values(rows)
+        report_rows = rows[self.report_mask(rows, now)]
+
+        key = self.key
+        devices = self.devices
+        published = []
+        # 只有需要上报的行才写回字典并序列化
+        for row, value in zip(report_rows.tolist(), self.values[report_rows].tolist()):
+            device = devices[row]
+            device.state[key] = value
+            if device.publish_state(client):
+                published.append(row)
+        if published:
+            self.last_reported[published] = self.values[published]
+            self.last_published[published] = now
+            self.force[published] = False
+        return len(published)
+
+    def sync(self) -> None:
+        for device, value in zip(self.devices, self.values.tolist()):
+            device.state[self.key] = value
+
+    def sync_device(self, row: int) -> None:
+        self.devices[row].state[self.key] = float(self.values[row])
+
+    def refresh_device(self, row: int) -> None:
+        value = self.devices[row].state.get(self.key)
+        if value is not None:
+            self.values[row] = value
+        self.force[row] = True
+
+
+class BatteryColumn(_Column):
+    """吸尘器或割草机的电量列，电量变化直接写回设备状态"""
+
+    def __init__(self, devices: List[MQTTDevice], buckets: int, rng) -> None:
+        super().__init__(devices, buckets, rng)
+        self.battery = np.array([d.state.get("battery_level", 100) for d in devices], dtype=np.int64)
+
+    def _gather(self, rows):
+        """读取指定行的当前状态字符串，外部修改过的行重新读取电量"""
+        devices = self.devices
+        states = []
+        for row in rows.tolist():
+            device = devices[row]
+            if device.dirty:
+                self.battery[row] = device.state.get("battery_level", self.battery[row])
+            states.append(device.state.get("state"))
+        return np.array(states, dtype=object)
+
+    def _publish(self, client, rows, changed, now: float, heartbeat: Optional[float]) -> int:
+        published = 0
+        devices = self.devices
+        battery = self.battery
+        for row in rows[changed].tolist():
+            device = devices[row]
+            device.state["battery_level"] = int(battery[row])
+            device.mark_dirty()
+        for row in rows.tolist():
+            device = devices[row]
+            if device.needs_publish(now, heartbeat) and device.publish_state(client):
+                published += 1
+        return published
+
+    def refresh_device(self, row: int) -> None:
+        self.battery[row] = self.devices[row].state.get("battery_level", self.battery[row])
+
+
+class VacuumBatteryColumn(BatteryColumn):
+    """吸尘器电量列，语义与Vacuum.update_state_mock一致"""
+
+    def advance(self, client, rows, now: float, heartbeat: Optional[float]) -> int:
+        states = self._gather(rows)
+        battery = self.battery[rows]
+        active = (states != "docked") & (states != "returning")
+        draining = active & (battery > 10)
+        drop = self.rng.integers(1, 4, size=len(rows))
+        self.battery[rows] = np.where(draining, battery - drop, battery)
+
+        # 电量低时自动返回充电
+        for row in rows[active & ~draining].tolist():
+            self.devices[row].state["state"] = "returning"
+            self.devices[row].mark_dirty()
+        return self._publish(client, rows, draining, now, heartbeat)
+
+
+class LawnMowerBatteryColumn(BatteryColumn):
+    """割草机电量列，语义与LawnMower.update_state_mock一致"""
+
+    def advance(self, client, rows, now: float, heartbeat: Optional[float]) -> int:
+        states = self._gather(rows)
+        battery = self.battery[rows]
+        n = len(rows)
+        mowing = states == "mowing"
+        docked = states == "docked"
+        draining = mowing & (battery > 10)
+        charging = docked & (battery < 100)
+        new_battery = np.where(draining, battery - self.rng.integers(1, 4, size=n), battery)
+        new_battery = np.where(charging, np.minimum(battery + self.rng.integers(1, 6, size=n), 100), new_battery)
+        self.battery[rows] = new_battery
+
+        # 电量低时自动返回充电站
+        returning = mowing & ~draining
+        for row in rows[returning].tolist():
+            self.devices[row].state["state"] = "docked"
+            self.devices[row].mark_dirty()
+
+        # 随机出现错误
+        current = np.where(returning, "docked", states)
+        errors = (current != "error") & (current != "docked") & (self.rng.random(n) < 0.02)
+        for row in rows[errors].tolist():
+            device = self.devices[row]
+            device.state["state"] = "error"
+            device.state["error"] = random.choice(LawnMower.ERRORS)
+            device.mark_dirty()
+        return self._publish(client, rows, draining | charging, now, heartbeat)
+
+
+class VectorizedSimulator:
+    """向量化模拟引擎，管理所有可以按列推进的设备"""
+
+    def __init__(self, buckets: int = 10, seed: Optional[int] = None) -> None:
+        """
+        初始化向量化模拟引擎
+
+        Args:
+            buckets: 每个模拟间隔划分的相位桶数量，发布会分散到这些子节拍上
+            seed: 随机数种子
+        """
+        if np is None:
+            raise ImportError("向量化模拟引擎需要安装numpy")
+        self.buckets = max(1, buckets)
+        self.rng = np.random.default_rng(seed)
+        self.columns: Dict[str, _Column] = {}
+        self._members: Dict[str, List[MQTTDevice]] = {}
+        self._index: Dict[str, tuple] = {}
+        self._stale = False
+        self._next_bucket = 0
+
+    @staticmethod
+    def group_key(device: MQTTDevice) -> Optional[str]:
+        """
+        获取设备所属的列分组
+
+        配置了独立mock_interval的设备仍由对象引擎按各自周期调度
+
+        Args:
+            device: MQTT设备实例
+
+        Returns:
+            Optional[str]: 分组名称，如果设备不能向量化则返回None
+        """
+        if device.mock_interval:
+            return None
+        device_type = type(device)
+        if device_type is Sensor:
+            return f"sensor:{device.sensor_type}"
+        if device_type is Vacuum:
+            return "vacuum:battery"
+        if device_type is LawnMower:
+            return "lawn_mower:battery"
+        return None
+
+    def __len__(self) -> int:
+        return sum(len(members) for members in self._members.values())
+
+    def add(self, device: MQTTDevice) -> bool:
+        """
+        添加设备
+
+        Args:
+            device: MQTT设备实例
+
+        Returns:
+            bool: 设备是否由向量化引擎接管
+        """
+        key = self.group_key(device)
+        if key is None:
+            return False
+        self.sync()
+        self._members.setdefault(key, []).append(device)
+        self._stale = True
+        return True
+
+    def add_devices(self, devices: Iterable[MQTTDevice]) -> List[MQTTDevice]:
+        """
+        批量添加设备
+
+        Args:
+            devices: MQTT设备实例列表
+
+        Returns:
+            List[MQTTDevice]: 未被接管、需要由对象引擎处理的设备
+        """
+        self.sync()
+        remaining = []
+        for device in devices:
+            key = self.group_key(device)
+            if key is None:
+                remaining.append(device)
+            else:
+                self._members.setdefault(key, []).append(device)
+        self._stale = True
+        return remaining
+
+    def remove(self, device: MQTTDevice) -> bool:
+        """
+        移除设备
+
+        Args:
+            device: MQTT设备实例
+
+        Returns:
+            bool: 设备是否由向量化引擎管理
+        """
+        key = self.group_key(device)
+        members = self._members.get(key) if key else None
+        if not members or device not in members:
+            return False
+        self.sync()
+        members.remove(device)
+        self._stale = True
+        return True
+
+    def clear(self) -> None:
+        """清空所有设备"""
+        self.columns.clear()
+        self._members.clear()
+        self._index.clear()
+        self._stale = False
+
+    def _rebuild(self) -> None:
+        """根据设备状态重建所有列"""
+        self.columns.clear()
+        self._index.clear()
+        for key, members in self._members.items():
+            if not members:
+                continue
+            if key.startswith("sensor:"):
+                column = SensorColumn(key.split(":", 1)[1], members, self.buckets, self.rng)
+            elif key == "vacuum:battery":
+                column = VacuumBatteryColumn(members, self.buckets, self.rng)
+            else:
+                column = LawnMowerBatteryColumn(members, self.buckets, self.rng)
+            self.columns[key] = column
+            for row, device in enumerate(members):
+                self._index[device.object_id] = (column, row)
+        self._stale = False
+
+    def sync(self) -> None:
+        """把所有列中的数值写回设备状态"""
+        if not self._stale:
+            for column in self.columns.values():
+                column.sync()
+
+    def sync_device(self, device: MQTTDevice) -> None:
+        """
+        把单个设备的最新数值写回设备状态
+
+        Args:
+            device: MQTT设备实例
+        """
+        entry = None if self._stale else self._index.get(device.object_id)
+        if entry is not None:
+            entry[0].sync_device(entry[1])
+
+    def refresh_device(self, device: MQTTDevice) -> None:
+        """
+        设备状态被外部修改后，重新读取到列中
+
+        Args:
+            device: MQTT设备实例
+        """
+        entry = None if self._stale else self._index.get(device.object_id)
+        if entry is not None:
+            entry[0].refresh_device(entry[1])
+
+    @property
+    def tick_interval_factor(self) -> float:
+        """子节拍间隔占模拟间隔的比例"""
+        return 1.0 / self.buckets
+
+    def tick(self, client, now: Optional[float] = None, heartbeat: Optional[float] = None,
+             bucket: Optional[int] = None) -> int:
+        """
+        推进一个子节拍（下一个相位桶），bucket为-1时推进所有行
+
+        Args:
+            client: MQTT客户端实例
+            now: 当前单调时间
+            heartbeat: 心跳间隔（秒）
+            bucket: 指定推进的相位桶
+
+        Returns:
+            int: 发布的消息数量
+        """
+        if self._stale:
+            self._rebuild()
+        if now is None:
+            now = time.monotonic()
+        if bucket is None:
+            bucket = self._next_bucket
+            self._next_bucket = (self._next_bucket + 1) % self.buckets
+        target = None if bucket < 0 else bucket
+
+        published = 0
+        for column in self.columns.values():
+            published += column.tick(client, target, now, heartbeat)
+        return published
@@ -5,11 +5,25 @@ from typing import Any, Dict, List, Optional
 
 from ha_mqtt_mock.utils.mqtt_helpers import generate_device_info
 from ha_mqtt_mock.models.base import MQTTDevice
+from ha_mqtt_mock.utils.stochastic import StochasticEvent
 
 
 class Alarm(MQTTDevice):
     """报警控制面板设备模型类"""
 
+    __slots__ = ("code",)
+
+    # 布防动作对应的最终状态
+    ARM_STATES = {
+        "ARM_HOME": "armed_home",
+        "ARM_AWAY": "armed_away",
+        "ARM_NIGHT": "armed_night",
+        "ARM_CUSTOM_BYPASS": "armed_custom_bypass",
+    }
+    ARMED_STATES = tuple(ARM_STATES.values())
+    # 布防延迟（秒），期间状态为arming
+    ARMING_DELAY = 5.0
+
     def __init__(
         self,
         object_id: str,
@@ -80,33 +94,22 @@ class Alarm(MQTTDevice):
             code = payload.get("code")
             
             # 处理各种警戒模式
-            if action == "ARM_HOME":
+            if action in self.ARM_STATES:
                 # 先转到准备状态
                 payload["state"] = "arming"
+                armed = {"state": self.ARM_STATES[action]}
+                # 布防延迟后设置为最终状态；未启用转换调度器时立即设置
+                if self.schedule_state(client, "arming", self.ARMING_DELAY, armed):
+                    return super().update_state(client, payload)
                 super().update_state(client, payload)
-                
-                # 延迟后设置为最终状态
-                payload["state"] = "armed_home"
-            elif action == "ARM_AWAY":
-                payload["state"] = "arming"
-                super().update_state(client, payload)
-                
-                payload["state"] = "armed_away"
-            elif action == "ARM_NIGHT":
-                payload["state"] = "arming"
-                super().update_state(client, payload)
-                
-                payload["state"] = "armed_night"
-            elif action == "ARM_CUSTOM_BYPASS":
-                payload["state"] = "arming"
-                super().update_state(client, payload)
-                
-                payload["state"] = "armed_custom_bypass"
+                payload.update(armed)
             elif action == "TRIGGER":
+                self.cancel_transition("arming")
                 payload["state"] = "triggered"
             elif action == "DISARM":
                 # 验证密码
                 if code == self.code:
+                    self.cancel_transition("arming")
                     payload["state"] = "disarmed"
                 else:
                     payload["state"] = "invalid_code"
@@ -117,30 +120,27 @@ class Alarm(MQTTDevice):
                   
         return super().update_state(client, payload)
         
-    def update_state_mock(self) -> None:
-        """模拟报警控制面板状态变化"""
-        current_state = self.state.get("state", "disarmed")
-        
-        # 如果处于警戒状态，有小概率触发报警
-        if current_state in ["armed_home", "armed_away", "armed_night", "armed_custom_bypass"]:
-            if random.random() < 0.02:  # 2%的概率触发报警
-                self.state["state"] = "triggered"
-                
-        # 如果处于触发状态，有小概率自动恢复到之前的警戒状态
-        elif current_state == "triggered":
-            if random.random() < 0.01:  # 1%的概率自动恢复
-                previous_states = {
-                    "armed_home": 0.25,
-                    "armed_away": 0.25,
-                    "armed_night": 0.25,
-                    "armed_custom_bypass": 0.25
-                }
-                
-                # 根据权重随机选择一个状态
-                r = random.random()
-                cumulative = 0
-                for state, weight in previous_states.items():
-                    cumulative += weight
-                    if r <= cumulative:
-                        self.state["state"] = state
-                        break 
\ No newline at end of file
+    def _is_armed(self) -> bool:
+        """是否处于警戒状态"""
+        return self.state.get("state") in self.ARMED_STATES
+    
+    def _is_triggered(self) -> bool:
+        """是否处于触发状态"""
+        return self.state.get("state") == "triggered"
+    
+    def _trigger(self) -> None:
+        """触发报警"""
+        self.state["state"] = "triggered"
+    
+    def _recover(self) -> None:
+        """自动恢复到随机的警戒状态"""
+        self.state["state"] = random.choice(self.ARMED_STATES)
+    
+    STOCHASTIC_EVENTS = (
+        # 处于警戒状态时，每个周期有2%的概率触发报警
+        StochasticEvent("trigger", 0.02, _is_armed, _trigger),
+        # 处于触发状态时，每个周期有1%的概率自动恢复到之前的警戒状态
+        StochasticEvent("recover", 0.01, _is_triggered, _recover),
+    )
+    # 同一个周期内触发报警后不会立即恢复
+    EXCLUSIVE_EVENTS = True
@@ -2,18 +2,51 @@
 
 import json
 import logging
+import random
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 from ha_mqtt_mock.config import MQTTConfig
 from ha_mqtt_mock.utils.mqtt_helpers import publish_discovery, publish_state
+from ha_mqtt_mock.utils.serializer import get_serializer, to_bytes
+from ha_mqtt_mock.utils.stochastic import StochasticEvent, get_event_sampler
+from ha_mqtt_mock.utils.tracing import get_tracer
+from ha_mqtt_mock.utils.transitions import get_transition_scheduler
 
 logger = logging.getLogger(__name__)
 
+# Home Assistant默认命令模板发送的纯文本命令，直接映射为状态值，跳过JSON解析和解码
+PLAIN_COMMANDS: Dict[Any, str] = {}
+for _command in ("ON", "OFF", "OPEN", "CLOSE", "STOP", "LOCK", "UNLOCK", "PRESS"):
+    PLAIN_COMMANDS[_command] = PLAIN_COMMANDS[_command.encode()] = _command
+del _command
+
 class MQTTDevice(ABC):
-    """MQTT设备基类，所有设备模型都应该继承自这个类"""
+    """
+    MQTT设备基类，所有设备模型都应该继承自这个类
+    
+    设备实例使用__slots__，子类需要在__slots__中声明新增的实例属性；
+    同类设备共用的常量应该定义为类属性
+    """
+    
+    __slots__ = (
+        "component", "object_id", "name", "state", "mock_interval", "mock_jitter",
+        "dirty", "last_published", "state_topic", "command_topic", "_discovery_data",
+    )
+    
+    # 设备类型的默认模拟周期（秒），为None时使用全局模拟间隔
+    DEFAULT_MOCK_INTERVAL: Optional[float] = None
+    
+    # 设备类型的随机状态转换，由事件采样器调度，或者在每个模拟周期按概率掷骰子
+    STOCHASTIC_EVENTS: Tuple[StochasticEvent, ...] = ()
+    
+    # 每个模拟周期最多执行一个随机状态转换（互斥的状态分支，如警戒→触发、触发→恢复），
+    # 否则后面的转换按前面转换修改后的状态判断条件
+    EXCLUSIVE_EVENTS = False
     
-    def __init__(self, component: str, object_id: str, name: Optional[str] = None, state: Optional[Dict[str, Any]] = None, *args, **kwargs) -> None:
+    def __init__(self, component: str, object_id: str, name: Optional[str] = None, state: Optional[Dict[str, Any]] = None,
+                 mock_interval: Optional[float] = None, mock_jitter: float = 0, *args, **kwargs) -> None:
         """
         初始化MQTT设备
         
@@ -21,21 +54,41 @@ class MQTTDevice(ABC):
             component: 设备组件类型（如light, sensor等）
             object_id: 设备唯一标识
             name: 设备显示名称，如果不提供则使用object_id
+            mock_interval: 设备的模拟更新周期（秒），不提供则使用类型默认值或全局间隔
+            mock_jitter: 每个周期的随机抖动比例（0~1）
         """
         self.component = component
         self.object_id = object_id
         self.name = name if name else object_id.replace("_", " ").title()
         self.state: Dict[str, Any] = state if state else {}
+        self.mock_interval = mock_interval
+        self.mock_jitter = mock_jitter
+        
+        # 脏状态跟踪：状态变化后置为True，发布成功后清除
+        self.dirty = True
+        self.last_published: Optional[float] = None
         
         # 获取配置实例
         config = MQTTConfig.get_instance()
         
-        # 设置主题
-        self.base_topic = f"{config.root_prefix}/{self.component}/{self.object_id}"
-        self.state_topic = f"{self.base_topic}/state"
-        self.command_topic = f"{self.base_topic}/set"
-        self.discovery_topic = f"{self.base_topic}/config"
+        # 设置主题：只保存热路径上使用的状态和命令主题，其余主题按需生成
+        base_topic = f"{config.root_prefix}/{self.component}/{self.object_id}"
+        self.state_topic = f"{base_topic}/state"
+        self.command_topic = f"{base_topic}/set"
+        
+        # 编码后的发现信息，首次发布时生成；配置变化时（更新设备或重新加载）会创建新的设备实例
+        self._discovery_data: Optional[bytes] = None
 
+    @property
+    def base_topic(self) -> str:
+        """设备的基础主题 {root_prefix}/{component}/{object_id}"""
+        return self.state_topic[:-len("/state")]
+    
+    @property
+    def discovery_topic(self) -> str:
+        """设备的发现主题"""
+        return f"{self.base_topic}/config"
+    
     @abstractmethod
     def _get_discovery_payload(self) -> Dict[str, Any]:
         """
@@ -46,23 +99,41 @@ class MQTTDevice(ABC):
         """
         pass
     
-    def publish_discovery(self, client) -> None:
+    @property
+    def discovery_data(self) -> bytes:
+        """编码后的发现信息负载（缓存）"""
+        if self._discovery_data is None:
+            self._discovery_data = to_bytes(get_serializer().dumps(self._get_discovery_payload()))
+        return self._discovery_data
+    
+    def invalidate_discovery(self) -> None:
+        """清除缓存的发现信息，在原地修改了影响发现信息的属性后调用"""
+        self._discovery_data = None
+    
+    def publish_discovery(self, client, qos: int = 0) -> Any:
         """
-        发布设备发现信息
+        发布设备发现信息（使用缓存的负载和主题）
         
         Args:
             client: MQTT客户端对象
+            qos: 服务质量等级
+            
+        Returns:
+            Any: 客户端返回的发布结果（可用于等待PUBACK），未发出时为None
         """
         try:
-            publish_discovery(
+            return publish_discovery(
                 client, 
                 self.component, 
                 self.object_id, 
-                self._get_discovery_payload(),
-                retain=True
+                self.discovery_data,
+                retain=True,
+                topic=self.discovery_topic,
+                qos=qos,
             )
         except Exception as e:
             logger.exception(f"发布{self.name}的发现信息时发生错误: {e}")
+            return None
     
     def publish_state(self, client) -> bool:
         """
@@ -75,11 +146,34 @@ class MQTTDevice(ABC):
             bool: 发布是否成功
         """
         try:
-            return publish_state(client, self.state_topic, self.state)
+            if publish_state(client, self.state_topic, self.state):
+                self.dirty = False
+                self.last_published = time.monotonic()
+                return True
+            return False
         except Exception as e:
             logger.exception(f"发布{self.name}的状态信息时发生错误: {e}")
             return False
     
+    def mark_dirty(self) -> None:
+        """标记设备状态已变化，需要重新发布"""
+        self.dirty = True
+    
+    def needs_publish(self, now: float, heartbeat: Optional[float] = None) -> bool:
+        """
+        判断设备状态是否需要发布
+        
+        Args:
+            now: 当前单调时间
+            heartbeat: 心跳间隔（秒），状态未变化时超过该间隔也会重新发布，为None时禁用心跳
+            
+        Returns:
+            bool: 是否需要发布
+        """
+        if self.dirty or self.last_published is None:
+            return True
+        return heartbeat is not None and now - self.last_published >= heartbeat
+    
     def update_state(self, client, payload: Dict[str, Any]) -> bool:
         """
         更新设备状态
@@ -93,37 +187,144 @@ class MQTTDevice(ABC):
         """
         try:
             self.state.update(payload)
+            self.dirty = True
+            self.plan_events()
             return self.publish_state(client)
         except Exception as e:
             logger.exception(f"更新{self.name}的状态时发生错误: {e}, payload: {payload}")
             return False
     
-    def on_command(self, client, payload: Any) -> bool:
+    def apply_transition(self, client, payload: Dict[str, Any]) -> bool:
         """
-        处理设备命令
+        应用定时转换的状态变化并发布（不经过update_state的命令处理逻辑）
         
         Args:
             client: MQTT客户端对象
-            payload: 命令负载
+            payload: 状态变化
             
         Returns:
-            bool: 处理是否成功
+            bool: 发布是否成功
+        """
+        self.state.update(payload)
+        self.dirty = True
+        self.plan_events()
+        return self.publish_state(client)
+    
+    def schedule_transition(self, key: str, delay: float, callback, *args: Any) -> bool:
+        """
+        安排delay秒后在事件循环中执行的状态转换，取代同一个键上尚未执行的转换
+        
+        Args:
+            key: 转换的种类
+            delay: 延迟（秒）
+            callback: 到期时调用的函数
+            args: 回调参数
+            
+        Returns:
+            bool: 是否已安排，未启用转换调度器时为False，调用者应立即给出最终状态
+        """
+        scheduler = get_transition_scheduler()
+        if scheduler is None:
+            return False
+        scheduler.schedule(self, key, delay, callback, *args)
+        return True
+    
+    def schedule_state(self, client, key: str, delay: float, payload: Dict[str, Any]) -> bool:
         """
-        if isinstance(payload, bytes):
-            payload = payload.decode()
+        安排delay秒后应用并发布的状态变化
         
-        # 检查payload是否是有效的JSON
-        if payload and payload[0] == "{":
+        Args:
+            client: MQTT客户端对象
+            key: 转换的种类
+            delay: 延迟（秒）
+            payload: 状态变化
+            
+        Returns:
+            bool: 是否已安排，未启用转换调度器时为False
+        """
+        return self.schedule_transition(key, delay, self.apply_transition, client, payload)
+    
+    def cancel_transition(self, key: Optional[str] = None) -> bool:
+        """
+        取消尚未执行的状态转换
+        
+        Args:
+            key: 转换的种类，为None时取消所有种类
+            
+        Returns:
+            bool: 是否取消了转换
+        """
+        scheduler = get_transition_scheduler()
+        return scheduler is not None and scheduler.cancel(self, key) > 0
+    
+    def transition_pending(self, key: Optional[str] = None) -> bool:
+        """
+        是否有尚未执行的状态转换
+        
+        Args:
+            key: 转换的种类，为None时检查所有种类
+            
+        Returns:
+            bool: 是否有尚未执行的转换
+        """
+        scheduler = get_transition_scheduler()
+        return scheduler is not None and scheduler.pending(self, key)
+    
+    def parse_command(self, payload: Any) -> Optional[Dict[str, Any]]:
+        """
+        解析命令负载为状态更新
+        
+        Args:
+            payload: 命令负载（字节或字符串）
+            
+        Returns:
+            Optional[Dict[str, Any]]: 状态更新，JSON无效时为None
+        """
+        tracer = get_tracer()
+        
+        # 常见的纯文本命令（ON、OFF、OPEN等）
+        plain = PLAIN_COMMANDS.get(payload)
+        if plain is not None:
+            if tracer is not None:
+                tracer.mark_parsed(self.state_topic)
+            return {"state": plain}
+        
+        # 检查payload是否是有效的JSON，JSON负载直接从字节解析
+        if payload[:1] in (b"{", "{"):
             try:
-                parsed_payload = json.loads(payload)
-                return self.update_state(client, parsed_payload)
+                parsed_payload = get_serializer().loads(payload)
+                if tracer is not None:
+                    tracer.mark_parsed(self.state_topic)
+                return parsed_payload
             except json.JSONDecodeError:
+                if isinstance(payload, bytes):
+                    payload = payload.decode(errors="replace")
                 logger.error(f"解析{self.name}的JSON命令失败: {payload}")
-                return False
+                return None
         else:
             # 非JSON负载，尝试作为简单字符串处理
+            if isinstance(payload, bytes):
+                payload = payload.decode()
             logger.warning(f"{self.name}收到非JSON命令: {payload}")
-            return self.update_state(client, {"state": payload})
+            if tracer is not None:
+                tracer.mark_parsed(self.state_topic)
+            return {"state": payload}
+    
+    def on_command(self, client, payload: Any) -> bool:
+        """
+        处理设备命令
+        
+        Args:
+            client: MQTT客户端对象
+            payload: 命令负载
+            
+        Returns:
+            bool: 处理是否成功
+        """
+        parsed_payload = self.parse_command(payload)
+        if parsed_payload is None:
+            return False
+        return self.update_state(client, parsed_payload)
     
     def update_state_mock(self) -> None:
         """
@@ -131,11 +332,55 @@ class MQTTDevice(ABC):
         """
         pass
     
+    @property
+    def has_mock(self) -> bool:
+        """设备类型是否重写了update_state_mock"""
+        return type(self).update_state_mock is not MQTTDevice.update_state_mock
+    
+    def roll_events(self) -> None:
+        """按每个模拟周期的概率依次掷骰子执行随机状态转换（未由事件采样器驱动时）"""
+        for event in self.STOCHASTIC_EVENTS:
+            if event.guard(self) and random.random() < event.probability:
+                event.action(self)
+                if self.EXCLUSIVE_EVENTS:
+                    break
+    
+    def plan_events(self) -> None:
+        """状态变化后让事件采样器重新规划随机状态转换"""
+        if self.STOCHASTIC_EVENTS:
+            sampler = get_event_sampler()
+            if sampler is not None:
+                sampler.plan(self)
+    
+    def step_mock(self) -> bool:
+        """
+        执行一次模拟更新，并在状态发生变化时标记为脏
+        
+        Returns:
+            bool: 设备当前是否有未发布的变化
+        """
+        roll = False
+        if self.STOCHASTIC_EVENTS:
+            sampler = get_event_sampler()
+            roll = sampler is None or not sampler.tracks(self)
+        if self.has_mock or roll:
+            before = self.state.copy()
+            if self.has_mock:
+                self.update_state_mock()
+            if roll:
+                self.roll_events()
+            if self.state != before:
+                self.dirty = True
+                if not roll:
+                    self.plan_events()
+        return self.dirty
+    
     def dump_state(self) -> str:
         """
-        获取状态的JSON字符串
+        获取状态的JSON字符串（与发布的负载相同）
         
         Returns:
             str: 状态的JSON字符串
         """
-        return json.dumps(self.state) 
\ No newline at end of file
+        data = get_serializer().dumps(self.state)
+        return data if isinstance(data, str) else data.decode("utf-8") 
\ No newline at end of file
@@ -9,6 +9,8 @@ from ha_mqtt_mock.models.base import MQTTDevice
 class Button(MQTTDevice):
     """按钮设备模型类"""
 
+    __slots__ = ()
+
     def __init__(
         self,
         object_id: str,
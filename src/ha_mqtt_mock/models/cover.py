@@ -5,11 +5,25 @@ from typing import Any, Dict, Optional
 
 from ha_mqtt_mock.utils.mqtt_helpers import generate_device_info
 from ha_mqtt_mock.models.base import MQTTDevice
+from ha_mqtt_mock.models.state import CompactState
+
+
+class CoverState(CompactState):
+    """窗帘/卷帘状态"""
+
+    __slots__ = ("state", "position", "current_position", "tilt")
 
 
 class Cover(MQTTDevice):
     """窗帘/卷帘设备模型类"""
 
+    __slots__ = ("has_tilt",)
+
+    # 从全关到全开的行程时间（秒）
+    TRAVEL_TIME = 20.0
+    # 行程中每一步移动的位置（百分比），每一步发布一次当前位置
+    TRAVEL_STEP = 10
+
     def __init__(
         self,
         object_id: str,
@@ -32,12 +46,12 @@ class Cover(MQTTDevice):
         )
 
         # 设置默认状态
-        self.state = self.state or {
+        self.state = CoverState(self.state or {
             "state": "closed",
             "position": 0,
             "current_position": 0,
             "tilt": 0
-        }
+        })
         
         self.has_tilt = has_tilt
 
@@ -125,12 +139,56 @@ class Cover(MQTTDevice):
             tilt = int(payload["tilt"])
             payload["tilt"] = max(0, min(100, tilt))  # 确保在0-100范围内
                 
-        return super().update_state(client, payload)
+        result = super().update_state(client, payload)
+        # 按行程时间移动到目标位置；停止或到达目标时取消尚未执行的移动
+        if self.state.get("state") in ("opening", "closing"):
+            self._schedule_travel(client)
+        elif "position" in payload:
+            self.cancel_transition("travel")
+        return result
+    
+    def _schedule_travel(self, client) -> bool:
+        """
+        安排行程的下一步，到下一步位置所需的时间按行程时间计算
+        
+        Args:
+            client: MQTT客户端对象
+            
+        Returns:
+            bool: 是否已安排，未启用转换调度器时由模拟节拍移动
+        """
+        remaining = abs(self.state.get("position", 0) - self.state.get("current_position", 0))
+        delay = self.TRAVEL_TIME * min(self.TRAVEL_STEP, remaining) / 100
+        return self.schedule_transition("travel", delay, self._travel_step, client)
+    
+    def _travel_step(self, client) -> None:
+        """
+        移动一步并发布当前位置，未到达目标位置时安排下一步
+        
+        Args:
+            client: MQTT客户端对象
+        """
+        state = self.state.get("state")
+        if state not in ("opening", "closing"):
+            return
+        target_position = self.state.get("position", 0)
+        current_position = self.state.get("current_position", 0)
+        if current_position < target_position:
+            current_position = min(current_position + self.TRAVEL_STEP, target_position)
+        elif current_position > target_position:
+            current_position = max(current_position - self.TRAVEL_STEP, target_position)
+        
+        update: Dict[str, Any] = {"current_position": current_position}
+        if current_position == target_position:
+            update["state"] = "open" if current_position > 0 else "closed"
+        self.apply_transition(client, update)
+        if current_position != target_position:
+            self._schedule_travel(client)
         
     def update_state_mock(self) -> None:
         """模拟窗帘/卷帘状态变化"""
-        # 模拟位置变化
-        if self.state.get("state") in ["opening", "closing"]:
+        # 模拟位置变化（由转换调度器按行程时间移动时跳过）
+        if self.state.get("state") in ["opening", "closing"] and not self.transition_pending("travel"):
             target_position = self.state.get("position", 0)
             current_position = self.state.get("current_position", 0)
             
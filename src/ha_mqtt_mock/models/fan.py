@@ -5,6 +5,8 @@ from ha_mqtt_mock.models.base import MQTTDevice
 
 
 class Fan(MQTTDevice):
+    __slots__ = ()
+
     def __init__(
         self,
         object_id: str,
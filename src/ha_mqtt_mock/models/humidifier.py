@@ -5,6 +5,8 @@ from ha_mqtt_mock.models.base import MQTTDevice
 
 
 class Humidifier(MQTTDevice):
+    __slots__ = ("device_type",)
+
     DEVICE_CLASSES = ["humidifier", "dehumidifier"]
 
     def __init__(
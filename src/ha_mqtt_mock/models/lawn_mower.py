@@ -5,11 +5,17 @@ from typing import Any, Dict, Optional
 
 from ha_mqtt_mock.utils.mqtt_helpers import generate_device_info
 from ha_mqtt_mock.models.base import MQTTDevice
+from ha_mqtt_mock.utils.stochastic import StochasticEvent
 
 
 class LawnMower(MQTTDevice):
     """割草机设备模型类"""
 
+    __slots__ = ()
+
+    # 可能出现的错误
+    ERRORS = ("卡住了", "电池过低", "刀片卡住", "无法回到充电站", "传感器故障")
+
     def __init__(
         self,
         object_id: str,
@@ -94,14 +100,7 @@ class LawnMower(MQTTDevice):
             error_rate = 0.1
             if random.random() < error_rate:
                 payload["state"] = "error"
-                errors = [
-                    "卡住了", 
-                    "电池过低", 
-                    "刀片卡住", 
-                    "无法回到充电站", 
-                    "传感器故障"
-                ]
-                payload["error"] = random.choice(errors)
+                payload["error"] = random.choice(self.ERRORS)
                 
         return super().update_state(client, payload)
         
@@ -121,15 +120,17 @@ class LawnMower(MQTTDevice):
             battery_level = self.state.get("battery_level", 0)
             if battery_level < 100:
                 self.state["battery_level"] = min(battery_level + random.randint(1, 5), 100)
-                
-        # 随机出现错误
-        if self.state["state"] not in ["error", "docked"] and random.random() < 0.02:
-            self.state["state"] = "error"
-            errors = [
-                "卡住了", 
-                "电池过低", 
-                "刀片卡住", 
-                "无法回到充电站", 
-                "传感器故障"
-            ]
-            self.state["error"] = random.choice(errors) 
\ No newline at end of file
+    
+    def _can_fail(self) -> bool:
+        """工作中（不在充电站且没有错误）时可能出现错误"""
+        return self.state["state"] not in ("error", "docked")
+    
+    def _fail(self) -> None:
+        """随机出现一种错误"""
+        self.state["state"] = "error"
+        self.state["error"] = random.choice(self.ERRORS)
+    
+    STOCHASTIC_EVENTS = (
+        # 每个周期有2%概率出现错误
+        StochasticEvent("error", 0.02, _can_fail, _fail),
+    )
@@ -5,10 +5,27 @@ from typing import Any, Dict, List, Optional
 
 from ha_mqtt_mock.utils.mqtt_helpers import generate_device_info
 from ha_mqtt_mock.models.base import MQTTDevice
+from ha_mqtt_mock.models.state import CompactState
+from ha_mqtt_mock.utils.stochastic import StochasticEvent
+
+
+class LightState(CompactState):
+    """灯光状态"""
+
+    __slots__ = ("state", "brightness", "color_mode", "color", "effect")
+
 
 class Light(MQTTDevice):
     """灯光设备模型类"""
     
+    __slots__ = ("effects",)
+    
+    # 默认效果列表（所有未指定效果的灯共用）
+    DEFAULT_EFFECTS = ("rainbow", "colorloop", "night", "relax", "concentrate")
+    # 亮度渐变中相邻两次发布的最小间隔（秒）和最多的步数
+    TRANSITION_STEP = 0.25
+    TRANSITION_MAX_STEPS = 20
+    
     def __init__(self, object_id: str, name: Optional[str] = None, 
                  effects: Optional[List[str]] = None,
                  state: dict = None, *args, **kwargs) -> None:
@@ -24,16 +41,16 @@ class Light(MQTTDevice):
         super().__init__(component="light", object_id=object_id, name=name, *args, **kwargs)
 
         # 设置默认状态
-        self.state = {
-            "state": "OFF",
-            "brightness": 255,
-            "color_mode": "rgb",
-            "color": {"r": 255, "g": 255, "b": 255},
-            "effect": "none",
-        }
+        self.state = LightState(
+            state="OFF",
+            brightness=255,
+            color_mode="rgb",
+            color={"r": 255, "g": 255, "b": 255},
+            effect="none",
+        )
 
         # 设置默认效果列表
-        self.effects = effects or ["rainbow", "colorloop", "night", "relax", "concentrate"]
+        self.effects = effects or self.DEFAULT_EFFECTS
         
     
     def _get_discovery_payload(self) -> Dict[str, Any]:
@@ -59,26 +76,130 @@ class Light(MQTTDevice):
             "device": generate_device_info(self.name)
         }
     
-    def update_state_mock(self) -> None:
-        """模拟灯光状态变化"""
-        # 随机切换状态
-        if random.random() < 0.1:
-            self.state["state"] = "ON" if self.state["state"] == "OFF" else "OFF"
+    def update_state(self, client, payload: Dict[str, Any]) -> bool:
+        """
+        更新灯光设备状态，命令带有transition（秒）时亮度逐步变化到目标值
         
-        # 如果灯是开的，随机调整亮度和颜色
-        if self.state["state"] == "ON":
-            # 30%概率改变亮度
-            if random.random() < 0.3:
-                self.state["brightness"] = random.randint(10, 255)
+        Args:
+            client: MQTT客户端对象
+            payload: 状态更新负载
             
-            # 20%概率改变颜色
-            if random.random() < 0.2:
-                self.state["color"] = {
-                    "r": random.randint(0, 255),
-                    "g": random.randint(0, 255),
-                    "b": random.randint(0, 255)
-                }
+        Returns:
+            bool: 更新是否成功
+        """
+        # 新命令中止正在进行的渐变
+        self.cancel_transition("transition")
+        transition = payload.pop("transition", None)
+        if transition:
+            try:
+                duration = float(transition)
+            except (TypeError, ValueError):
+                duration = 0.0
+            if duration > 0:
+                result = self._start_transition(client, payload, duration)
+                if result is not None:
+                    return result
+        return super().update_state(client, payload)
+    
+    def _start_transition(self, client, payload: Dict[str, Any], duration: float) -> Optional[bool]:
+        """
+        发布渐变的起点并安排之后的每一步
+        
+        Args:
+            client: MQTT客户端对象
+            payload: 状态更新负载（不含transition）
+            duration: 渐变时间（秒）
             
-            # 10%概率改变效果
-            if random.random() < 0.1 and self.effects:
-                self.state["effect"] = random.choice(self.effects) 
\ No newline at end of file
+        Returns:
+            Optional[bool]: 起点是否发布成功，不需要渐变或未启用转换调度器时为None
+        """
+        was_on = self.state["state"] == "ON"
+        start = self.state["brightness"] if was_on else 0
+        if payload.get("state") == "OFF":
+            if not was_on:
+                return None
+            # 亮度降到0后关灯，并恢复原来的亮度，下次开灯时使用
+            target = 0
+            final = {"state": "OFF", "brightness": start}
+        else:
+            target = int(payload.get("brightness", self.state["brightness"]))
+            final = {"brightness": target}
+        if start == target:
+            return None
+        
+        steps = max(1, min(self.TRANSITION_MAX_STEPS, int(duration / self.TRANSITION_STEP)))
+        delay = duration / steps
+        if not self.schedule_transition("transition", delay, self._transition_step,
+                                        client, start, target, 1, steps, delay, final):
+            return None
+        
+        # 起点：关灯时先保持开启，开灯时从最低亮度开始
+        first = dict(payload)
+        if target == 0:
+            del first["state"]
+        else:
+            first["state"] = "ON"
+        first["brightness"] = max(start, 1)
+        return super().update_state(client, first)
+    
+    def _transition_step(self, client, start: int, target: int, step: int, steps: int, delay: float,
+                         final: Dict[str, Any]) -> None:
+        """
+        发布渐变的一步，未到终点时安排下一步
+        
+        Args:
+            client: MQTT客户端对象
+            start: 起始亮度
+            target: 目标亮度
+            step: 当前步数（从1开始）
+            steps: 总步数
+            delay: 每一步的间隔（秒）
+            final: 终点的状态
+        """
+        if step >= steps:
+            self.apply_transition(client, final)
+            return
+        self.apply_transition(client, {"brightness": max(round(start + (target - start) * step / steps), 1)})
+        self.schedule_transition("transition", delay, self._transition_step,
+                                 client, start, target, step + 1, steps, delay, final)
+    
+    def _idle(self) -> bool:
+        """没有进行中的渐变（渐变期间不随机改变状态）"""
+        return not self.transition_pending("transition")
+    
+    def _idle_on(self) -> bool:
+        """灯是开的，并且没有进行中的渐变"""
+        return self.state["state"] == "ON" and self._idle()
+    
+    def _has_effects(self) -> bool:
+        """灯是开的，并且有可选的效果"""
+        return bool(self.effects) and self._idle_on()
+    
+    def _toggle(self) -> None:
+        """切换开关状态"""
+        self.state["state"] = "ON" if self.state["state"] == "OFF" else "OFF"
+    
+    def _change_brightness(self) -> None:
+        """随机调整亮度"""
+        self.state["brightness"] = random.randint(10, 255)
+    
+    def _change_color(self) -> None:
+        """随机调整颜色"""
+        self.state["color"] = {
+            "r": random.randint(0, 255),
+            "g": random.randint(0, 255),
+            "b": random.randint(0, 255)
+        }
+    
+    def _change_effect(self) -> None:
+        """随机切换效果"""
+        self.state["effect"] = random.choice(self.effects)
+    
+    STOCHASTIC_EVENTS = (
+        # 每个周期有10%概率切换状态
+        StochasticEvent("toggle", 0.1, _idle, _toggle),
+        # 灯是开的时候，30%概率改变亮度，20%概率改变颜色，10%概率改变效果
+        StochasticEvent("brightness", 0.3, _idle_on, _change_brightness),
+        StochasticEvent("color", 0.2, _idle_on, _change_color),
+        StochasticEvent("effect", 0.1, _has_effects, _change_effect),
+    )
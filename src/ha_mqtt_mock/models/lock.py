@@ -10,6 +10,15 @@ from ha_mqtt_mock.models.base import MQTTDevice
 class Lock(MQTTDevice):
     """锁设备模型类"""
 
+    __slots__ = ()
+
+    # 上锁/开锁动作的时间（秒），期间状态为LOCKING/UNLOCKING
+    ACTION_DELAY = 1.0
+    # 卡住后自动恢复并完成动作的时间（秒）
+    JAM_RECOVERY_DELAY = 30.0
+    # 动作卡住的概率
+    JAMMED_RATE = 0.1
+
     def __init__(
         self,
         object_id: str,
@@ -71,14 +80,35 @@ class Lock(MQTTDevice):
         """
         # 处理动作命令
         if "action" in payload:
+            target = None
             if payload["action"] == "LOCK":
-                payload["state"] = "LOCKED"
+                target = "LOCKED"
             elif payload["action"] == "UNLOCK":
-                payload["state"] = "UNLOCKED"
+                target = "UNLOCKED"
             
-            # 有一定概率会卡住
-            jammed_rate = 0.1
-            if payload["action"] in ["LOCK", "UNLOCK"] and random.random() < jammed_rate:
-                payload["state"] = "JAMMED"
+            if target is not None:
+                # 先进入中间状态，动作完成后再给出结果；未启用转换调度器时立即给出结果
+                if self.schedule_transition("action", self.ACTION_DELAY, self._finish_action, client, target):
+                    payload["state"] = "LOCKING" if target == "LOCKED" else "UNLOCKING"
+                    return super().update_state(client, payload)
+                payload["state"] = target
                 
-        return super().update_state(client, payload) 
\ No newline at end of file
+                # 有一定概率会卡住
+                if random.random() < self.JAMMED_RATE:
+                    payload["state"] = "JAMMED"
+                
+        return super().update_state(client, payload)
+    
+    def _finish_action(self, client, target: str) -> None:
+        """
+        完成上锁/开锁动作，卡住时安排自动恢复
+        
+        Args:
+            client: MQTT客户端对象
+            target: 动作的目标状态
+        """
+        if random.random() < self.JAMMED_RATE:
+            self.apply_transition(client, {"state": "JAMMED"})
+            self.schedule_state(client, "action", self.JAM_RECOVERY_DELAY, {"state": target})
+            return
+        self.apply_transition(client, {"state": target})
@@ -1,14 +1,28 @@
 """传感器设备模型"""
 
 import random
+import sys
 from typing import Any, Dict, Optional
 
 from ..utils.mqtt_helpers import generate_device_info
+from ..utils.stochastic import StochasticEvent, always
 from .base import MQTTDevice
 
 class Sensor(MQTTDevice):
     """传感器设备模型类"""
     
+    __slots__ = ("sensor_type", "report_policy", "last_reported_value", "force_report")
+    
+    # 默认上报策略：
+    # report_deadband 绝对死区，report_deadband_relative 相对上次上报值的死区比例，
+    # min_report_interval 两次上报之间的最小间隔（秒），max_report_interval 最长不上报的时间（秒）
+    DEFAULT_REPORT_POLICY = {
+        "report_deadband": 0,
+        "report_deadband_relative": 0,
+        "min_report_interval": 10,
+        "max_report_interval": 300,
+    }
+    
     # 传感器类型
     SENSOR_TYPES = {
         "temperature": {
@@ -19,6 +33,7 @@ class Sensor(MQTTDevice):
             "mock_min": 18,
             "mock_max": 30,
             "mock_step": 0.5,
+            "report_deadband": 1,
         },
         "humidity": {
             "device_class": "humidity",
@@ -28,6 +43,7 @@ class Sensor(MQTTDevice):
             "mock_min": 30,
             "mock_max": 90,
             "mock_step": 1,
+            "report_deadband": 5,
         },
         "pressure": {
             "device_class": "pressure",
@@ -37,6 +53,7 @@ class Sensor(MQTTDevice):
             "mock_min": 980,
             "mock_max": 1020,
             "mock_step": 0.5,
+            "report_deadband": 3,
         },
         "illuminance": {
             "device_class": "illuminance",
@@ -46,6 +63,7 @@ class Sensor(MQTTDevice):
             "mock_min": 0,
             "mock_max": 10000,
             "mock_step": 50,
+            "report_deadband_relative": 0.25,
         },
         "co2": {
             "device_class": "carbon_dioxide",
@@ -55,6 +73,7 @@ class Sensor(MQTTDevice):
             "mock_min": 400,
             "mock_max": 1500,
             "mock_step": 10,
+            "report_deadband": 100,
         },
         "pm25": {
             "device_class": "pm25",
@@ -64,6 +83,7 @@ class Sensor(MQTTDevice):
             "mock_min": 0,
             "mock_max": 100,
             "mock_step": 1,
+            "report_deadband": 5,
         },
         "pm10": {
             "device_class": "pm10",
@@ -73,12 +93,14 @@ class Sensor(MQTTDevice):
             "mock_min": 0,
             "mock_max": 150,
             "mock_step": 1,
+            "report_deadband": 5,
         },
     }
     
     def __init__(self, object_id: str, name: Optional[str] = None, 
                  sensor_type: str = "temperature",
-                 state: dict = None, *args, **kwargs) -> None:
+                 state: dict = None, report_policy: Optional[Dict[str, float]] = None,
+                 *args, **kwargs) -> None:
         """
         初始化传感器设备
         
@@ -86,6 +108,7 @@ class Sensor(MQTTDevice):
             object_id: 设备唯一标识
             name: 设备显示名称
             sensor_type: 传感器类型
+            report_policy: 覆盖传感器类型默认值的上报策略
         """
         # 设置传感器类型
         if sensor_type not in self.SENSOR_TYPES:
@@ -93,14 +116,52 @@ class Sensor(MQTTDevice):
         
         super().__init__(component="sensor", object_id=object_id, name=name, *args, **kwargs)
 
-        self.sensor_type = sensor_type
-        self.sensor_config = self.SENSOR_TYPES[sensor_type]
+        # 使用驻留的类型名，同类传感器共用同一个字符串（也是状态字典的键）
+        self.sensor_type = sys.intern(sensor_type)
+        
+        # 上报策略：默认值 < 传感器类型配置 < 设备配置；没有设备配置时同类传感器共用一个字典
+        self.report_policy = self._type_report_policy(sensor_type)
+        if report_policy:
+            unknown = set(report_policy) - set(self.DEFAULT_REPORT_POLICY)
+            if unknown:
+                raise ValueError(f"不支持的上报策略参数: {', '.join(sorted(unknown))}")
+            self.report_policy = {**self.report_policy, **report_policy}
+        self.last_reported_value: Optional[float] = None
+        self.force_report = False
         
         # 设置默认状态
         self.state = state or {
             self.sensor_type: self._get_random_value()
         }
     
+    @property
+    def sensor_config(self) -> Dict[str, Any]:
+        """传感器类型的配置"""
+        return self.SENSOR_TYPES[self.sensor_type]
+    
+    @classmethod
+    def _type_report_policy(cls, sensor_type: str) -> Dict[str, float]:
+        """
+        获取传感器类型的默认上报策略（同类型共用，不要原地修改）
+        
+        Args:
+            sensor_type: 传感器类型
+            
+        Returns:
+            Dict[str, float]: 上报策略
+        """
+        policies = cls.__dict__.get("_report_policies")
+        if policies is None:
+            policies = cls._report_policies = {}
+        policy = policies.get(sensor_type)
+        if policy is None:
+            config = cls.SENSOR_TYPES[sensor_type]
+            policy = policies[sensor_type] = {
+                key: config.get(key, default)
+                for key, default in cls.DEFAULT_REPORT_POLICY.items()
+            }
+        return policy
+    
     def _get_discovery_payload(self) -> Dict[str, Any]:
         """
         获取传感器设备的发现信息负载
@@ -135,6 +196,63 @@ class Sensor(MQTTDevice):
         steps = int((max_value - min_value) / step)
         return min_value + random.randint(0, steps) * step
     
+    def publish_state(self, client) -> bool:
+        """
+        发布传感器状态，并记录本次上报的数值
+        
+        Args:
+            client: MQTT客户端对象
+            
+        Returns:
+            bool: 发布是否成功
+        """
+        if not super().publish_state(client):
+            return False
+        self.last_reported_value = self.state.get(self.sensor_type)
+        self.force_report = False
+        return True
+    
+    def mark_dirty(self) -> None:
+        """标记状态已变化，外部修改的状态不受死区限制"""
+        super().mark_dirty()
+        self.force_report = True
+    
+    def needs_publish(self, now: float, heartbeat: Optional[float] = None) -> bool:
+        """
+        按照上报策略判断是否需要发布
+        
+        在最小上报间隔内不发布；超过最大上报间隔时总是发布；
+        其余情况下只有数值变化超过死区时才发布。传感器使用max_report_interval代替全局心跳
+        
+        Args:
+            now: 当前单调时间
+            heartbeat: 全局心跳间隔（秒），传感器忽略该参数
+            
+        Returns:
+            bool: 是否需要发布
+        """
+        if self.last_published is None or self.last_reported_value is None:
+            return True
+        
+        policy = self.report_policy
+        elapsed = now - self.last_published
+        if elapsed < policy["min_report_interval"]:
+            return False
+        if self.force_report:
+            return True
+        if elapsed >= policy["max_report_interval"]:
+            return True
+        if not self.dirty:
+            return False
+        
+        # 死区判断
+        value = self.state.get(self.sensor_type)
+        if value is None:
+            return False
+        last_value = self.last_reported_value
+        threshold = max(policy["report_deadband"], policy["report_deadband_relative"] * abs(last_value))
+        return abs(value - last_value) >= threshold
+    
     def update_state_mock(self) -> None:
         """
         模拟传感器状态变化，生成趋势性变化的数据
@@ -162,6 +280,8 @@ class Sensor(MQTTDevice):
 class BinarySensor(MQTTDevice):
     """二元传感器设备模型类"""
     
+    __slots__ = ("sensor_type",)
+    
     # 二元传感器类型
     SENSOR_TYPES = {
         "motion": {
@@ -203,14 +323,18 @@ class BinarySensor(MQTTDevice):
         
         super().__init__(component="binary_sensor", object_id=object_id, name=name, *args, **kwargs)
         
-        self.sensor_type = sensor_type
-        self.sensor_config = self.SENSOR_TYPES[sensor_type]
+        self.sensor_type = sys.intern(sensor_type)
         
         # 设置默认状态
         self.state = state or {
             "state": self.sensor_config["payload_off"]
         }
     
+    @property
+    def sensor_config(self) -> Dict[str, Any]:
+        """传感器类型的配置"""
+        return self.SENSOR_TYPES[self.sensor_type]
+    
     def _get_discovery_payload(self) -> Dict[str, Any]:
         """
         获取二元传感器设备的发现信息负载
@@ -230,12 +354,15 @@ class BinarySensor(MQTTDevice):
         }
         return payload
     
-    def update_state_mock(self) -> None:
-        """模拟二元传感器状态变化"""
-        # 有10%概率改变状态
-        if random.random() < 0.1:
-            current_state = self.state["state"]
-            if current_state == self.sensor_config["payload_off"]:
-                self.state["state"] = self.sensor_config["payload_on"]
-            else:
-                self.state["state"] = self.sensor_config["payload_off"] 
\ No newline at end of file
+    def _toggle(self) -> None:
+        """在触发和未触发之间切换"""
+        config = self.sensor_config
+        if self.state["state"] == config["payload_off"]:
+            self.state["state"] = config["payload_on"]
+        else:
+            self.state["state"] = config["payload_off"]
+    
+    STOCHASTIC_EVENTS = (
+        # 每个周期有10%概率改变状态
+        StochasticEvent("toggle", 0.1, always, _toggle),
+    )
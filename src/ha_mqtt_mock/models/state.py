@@ -0,0 +1,167 @@
+"""紧凑设备状态模块
+
+固定结构的设备状态（如灯光、窗帘、吸尘器）用__slots__保存字段，每个设备省去一个字典
+（非空字典至少占用约200字节）。状态对象实现了MutableMapping接口，可以像字典一样读写；
+字段之外的键（如命令中附带的参数）保存在按需创建的附加字典中。
+
+序列化器会把状态对象转换为字典，字段按__slots__中的顺序输出。模型的默认状态按同样的顺序声明，
+因此与原来的字典状态字节相同；配置文件提供的状态也按__slots__的顺序输出，而不是配置中键的顺序。
+"""
+
+from collections.abc import MutableMapping
+from operator import attrgetter
+from typing import Any, Callable, Dict, FrozenSet, Iterator, Mapping, Optional, Tuple
+
+
+def _make_reader(fields: Tuple[str, ...]) -> Callable[[Any], Dict[str, Any]]:
+    """
+    创建按字段顺序读取为字典的函数
+
+    Args:
+        fields: 字段名
+
+    Returns:
+        Callable[[Any], Dict[str, Any]]: 读取函数，有字段未设置时抛出AttributeError
+    """
+    if not fields:
+        return lambda self: {}
+    if len(fields) == 1:
+        field = fields[0]
+        return lambda self: {field: getattr(self, field)}
+    getter = attrgetter(*fields)
+    return lambda self: dict(zip(fields, getter(self)))
+
+
+class CompactState(MutableMapping):
+    """
+    使用__slots__保存固定字段的设备状态
+
+    子类在__slots__中列出字段（即状态的键，顺序即序列化顺序），构造时传入默认值。
+    """
+
+    __slots__ = ("_extra",)
+
+    _fields: Tuple[str, ...] = ()
+    _field_set: FrozenSet[str] = frozenset()
+    _reader: Callable[[Any], Dict[str, Any]] = staticmethod(lambda self: {})
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._fields = tuple(cls.__dict__.get("__slots__", ()))
+        cls._field_set = frozenset(cls._fields)
+        cls._reader = staticmethod(_make_reader(cls._fields))
+
+    def __init__(self, values: Optional[Mapping[str, Any]] = None, **kwargs: Any) -> None:
+        """
+        初始化状态
+
+        Args:
+            values: 初始状态
+            kwargs: 其他初始状态
+        """
+        self._extra: Optional[Dict[str, Any]] = None
+        if values:
+            self.update(values)
+        if kwargs:
+            self.update(kwargs)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in self._field_set:
+            setattr(self, key, value)
+        elif self._extra is None:
+            self._extra = {key: value}
+        else:
+            self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in self._field_set:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+            if not self._extra:
+                self._extra = None
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._field_set:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        return len(self.to_dict())
+
+    def __eq__(self, other: object) -> bool:
+        # 先检查dict，避免较慢的ABC类型检查（step_mock每次都会比较）
+        if type(other) is dict:
+            return self.to_dict() == other
+        if isinstance(other, CompactState):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return self.to_dict()
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self._extra = None
+        self.update(state)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._field_set:
+            return getattr(self, key, default)
+        return default if self._extra is None else self._extra.get(key, default)
+
+    def update(self, other: Any = (), **kwargs: Any) -> None:
+        items = other.items() if hasattr(other, "items") else other
+        for key, value in items:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为普通字典（字段在前，附加的键在后）
+
+        Returns:
+            Dict[str, Any]: 状态字典
+        """
+        try:
+            data = self._reader(self)
+        except AttributeError:
+            # 有字段被删除，逐个读取
+            data = {field: getattr(self, field) for field in self._fields if hasattr(self, field)}
+        if self._extra is not None:
+            data.update(self._extra)
+        return data
+
+    def copy(self) -> Dict[str, Any]:
+        """
+        浅拷贝为普通字典，用于比较模拟前后的状态
+
+        Returns:
+            Dict[str, Any]: 状态字典
+        """
+        return self.to_dict()
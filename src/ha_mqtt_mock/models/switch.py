@@ -5,6 +5,8 @@ from ha_mqtt_mock.models.base import MQTTDevice
 
 
 class Switch(MQTTDevice):
+    __slots__ = ()
+
     def __init__(
         self,
         object_id: str,
@@ -17,7 +19,6 @@ class Switch(MQTTDevice):
 
         self.state |= {"state": "OFF"}
         self.name = name
-        self.discovery_payload = self._get_discovery_payload()
 
     def _get_discovery_payload(self) -> Dict[str, Any]:
         payload = {
@@ -5,11 +5,20 @@ from typing import Any, Dict, Optional, List
 
 from ha_mqtt_mock.utils.mqtt_helpers import generate_device_info
 from ha_mqtt_mock.models.base import MQTTDevice
+from ha_mqtt_mock.models.state import CompactState
+
+
+class VacuumState(CompactState):
+    """吸尘器状态"""
+
+    __slots__ = ("state", "fan_speed", "battery_level")
 
 
 class Vacuum(MQTTDevice):
     """吸尘器设备模型类"""
 
+    __slots__ = ()
+
     def __init__(
         self,
         object_id: str,
@@ -30,11 +39,11 @@ class Vacuum(MQTTDevice):
         )
 
         # 设置默认状态
-        self.state = self.state or {
+        self.state = VacuumState(self.state or {
             "state": "idle", 
             "fan_speed": "medium", 
             "battery_level": 100
-        }
+        })
 
     def _get_discovery_payload(self) -> Dict[str, Any]:
         """
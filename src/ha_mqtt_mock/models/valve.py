@@ -13,6 +13,8 @@ logger = logging.getLogger(__name__)
 class Valve(MQTTDevice):
     """阀门设备模型类"""
 
+    __slots__ = ()
+
     def __init__(
         self,
         object_id: str,
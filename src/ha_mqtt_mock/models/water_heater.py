@@ -9,6 +9,11 @@ from ha_mqtt_mock.models.base import MQTTDevice
 class WaterHeater(MQTTDevice):
     """热水器设备模型类"""
 
+    __slots__ = ()
+
+    # 可用模式
+    MODES = ["eco", "performance", "away", "boost"]
+
     def __init__(
         self,
         object_id: str,
@@ -35,9 +40,6 @@ class WaterHeater(MQTTDevice):
             "temperature": 50, 
             "current_temperature": 25
         }
-        
-        # 可用模式
-        self.modes = ["eco", "performance", "away", "boost"]
 
     def _get_discovery_payload(self) -> Dict[str, Any]:
         """
@@ -62,7 +64,7 @@ class WaterHeater(MQTTDevice):
             "mode_state_template": "{{ value_json.mode }}",
             "mode_command_topic": self.command_topic,
             "mode_command_template": '{"mode": "{{ value }}"}',
-            "modes": self.modes,
+            "modes": self.MODES,
             
             # 温度设置
             "temperature_state_topic": self.state_topic,
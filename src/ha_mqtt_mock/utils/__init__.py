@@ -2,10 +2,16 @@
 
 from .mqtt_helpers import publish_discovery, publish_state, generate_device_info
 from .logging import setup_logging
+from .metrics import MetricsRegistry
+from .rate_limit import PublishRateLimiter, get_rate_limiter, set_rate_limiter
 
 __all__ = [
     'publish_discovery',
     'publish_state',
     'generate_device_info',
     'setup_logging',
+    'MetricsRegistry',
+    'PublishRateLimiter',
+    'get_rate_limiter',
+    'set_rate_limiter',
 ] 
\ No newline at end of file
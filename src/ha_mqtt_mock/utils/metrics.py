@@ -0,0 +1,247 @@
+"""运行指标模块
+
+提供Prometheus文本格式的计数器和直方图。指标对象是模块级常量，热路径上只做一次字典更新或
+二分查找，不加锁：跨线程并发递增时极少数情况下可能丢失一次计数，对运行指标来说可以接受。
+
+分片模式下每个工作进程有自己的指标，通过snapshot()导出后在主进程中合并。
+"""
+
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """带标签的单调递增计数器"""
+
+    __slots__ = ("name", "help", "labelnames", "values")
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, labels: LabelValues = (), amount: float = 1) -> None:
+        """
+        递增计数
+
+        Args:
+            labels: 标签值元组，顺序与labelnames一致
+            amount: 增量
+        """
+        values = self.values
+        values[labels] = values.get(labels, 0) + amount
+
+    def value(self, labels: LabelValues = ()) -> float:
+        return self.values.get(labels, 0)
+
+    def snapshot(self) -> Dict[LabelValues, float]:
+        return dict(self.values)
+
+    def merge(self, snapshot: Dict[LabelValues, float]) -> None:
+        for labels, value in snapshot.items():
+            self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        if not self.labelnames and not self.values:
+            lines.append(f"{self.name} 0")
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """固定分桶的直方图"""
+
+    __slots__ = ("name", "help", "buckets", "counts", "sum", "count")
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float]) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # 最后一个桶对应+Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """
+        记录一个观测值
+
+        Args:
+            value: 观测值
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        for i, count in enumerate(snapshot["counts"]):
+            self.counts[i] += count
+        self.sum += snapshot["sum"]
+        self.count += snapshot["count"]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{_format_value(float(bound))}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {_format_value(self.sum)}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Any] = {}
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = self.metrics[name] = Counter(name, help, labelnames)
+        return metric
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float]) -> Histogram:
+        metric = self.metrics[name] = Histogram(name, help, buckets)
+        return metric
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        导出所有指标的当前值（可以通过管道发送给其他进程）
+
+        Returns:
+            Dict[str, Any]: 以指标名为键的快照
+        """
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def merged(self, snapshots: Iterable[Dict[str, Any]]) -> "MetricsRegistry":
+        """
+        创建合并了多个快照的新注册表（结构与当前注册表相同）
+
+        Args:
+            snapshots: 快照列表
+
+        Returns:
+            MetricsRegistry: 合并后的注册表
+        """
+        registry = MetricsRegistry()
+        for name, metric in self.metrics.items():
+            if isinstance(metric, Histogram):
+                registry.histogram(name, metric.help, metric.buckets)
+            else:
+                registry.counter(name, metric.help, metric.labelnames)
+        for snapshot in snapshots:
+            for name, values in snapshot.items():
+                if name in registry.metrics:
+                    registry.metrics[name].merge(values)
+        return registry
+
+    def reset(self) -> None:
+        """清零所有指标"""
+        for metric in self.metrics.values():
+            if isinstance(metric, Histogram):
+                metric.counts = [0] * len(metric.counts)
+                metric.sum = 0.0
+                metric.count = 0
+            else:
+                metric.values.clear()
+
+    def render(self, gauges: Optional[List[Tuple[str, str, Sequence[str], Dict[LabelValues, float]]]] = None) -> str:
+        """
+        生成Prometheus文本格式
+
+        Args:
+            gauges: 抓取时计算的仪表值，每项为 (名称, 说明, 标签名, {标签值: 数值})
+
+        Returns:
+            str: Prometheus文本格式的指标
+        """
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        for name, help, labelnames, values in gauges or []:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(values.items()):
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+PUBLISHES = registry.counter(
+    "ha_mqtt_mock_publishes_total", "成功交给MQTT客户端的发布数", ("component", "kind"))
+PUBLISH_FAILURES = registry.counter(
+    "ha_mqtt_mock_publish_failures_total", "MQTT客户端返回错误码的发布数", ("kind",))
+COMMANDS = registry.counter(
+    "ha_mqtt_mock_commands_total", "收到的设备命令数")
+UNKNOWN_COMMANDS = registry.counter(
+    "ha_mqtt_mock_unknown_commands_total", "收到的未知主题消息数")
+COMMANDS_COALESCED = registry.counter(
+    "ha_mqtt_mock_commands_coalesced_total", "合并到同一设备前一条命令中、没有单独执行的命令数")
+COMMAND_QUEUE_DROPPED = registry.counter(
+    "ha_mqtt_mock_command_queue_dropped_total", "命令队列已满时丢弃的命令数")
+COMMAND_QUEUE_WAIT = registry.histogram(
+    "ha_mqtt_mock_command_queue_wait_seconds", "命令在队列中等待事件循环处理的时间",
+    (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+COMMAND_BATCH_SIZE = registry.histogram(
+    "ha_mqtt_mock_command_batch_size", "事件循环每次从命令队列中处理的命令数",
+    (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+TICK_DURATION = registry.histogram(
+    "ha_mqtt_mock_tick_duration_seconds", "模拟循环每轮处理到期设备的耗时（各时间片之和，不含让出事件循环的时间）",
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+TICK_OVERRUN = registry.histogram(
+    "ha_mqtt_mock_tick_overrun_seconds", "模拟循环每轮开始时间晚于计划时间的量",
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+TICK_SLICE = registry.histogram(
+    "ha_mqtt_mock_tick_slice_seconds", "模拟循环一个时间片内不让出事件循环的连续执行时间",
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+EVENT_LOOP_LAG = registry.histogram(
+    "ha_mqtt_mock_event_loop_lag_seconds", "事件循环中就绪的回调（如API请求）排在模拟工作后面等待的时间",
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+
+
+# 主题到组件类型的缓存，主题数量与设备数量相同
+_components: Dict[str, str] = {}
+
+
+def component_of(topic: str) -> str:
+    """
+    从主题 {root_prefix}/{component}/{object_id}/{suffix} 中取出组件类型
+
+    Args:
+        topic: MQTT主题
+
+    Returns:
+        str: 组件类型，无法解析时为unknown
+    """
+    component = _components.get(topic)
+    if component is None:
+        parts = topic.rsplit("/", 3)
+        component = _components[topic] = parts[1] if len(parts) == 4 else "unknown"
+    return component
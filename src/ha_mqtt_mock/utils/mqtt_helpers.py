@@ -1,14 +1,18 @@
-import json
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Union
 
 from ..config import MQTTConfig
+from .metrics import PUBLISH_FAILURES, PUBLISHES, component_of
+from .rate_limit import PublishRateLimiter, get_rate_limiter
+from .serializer import get_serializer
+from .tracing import get_tracer
 import paho.mqtt.client as mqtt
 
 config = MQTTConfig.get_instance()
 logger = logging.getLogger(__name__)
 
-def publish_discovery(client: mqtt.Client, component: str, object_id: str, payload: Dict[str, Any], retain: bool = True) -> None:
+def publish_discovery(client: mqtt.Client, component: str, object_id: str, payload: Union[Dict[str, Any], bytes],
+                      retain: bool = True, topic: Optional[str] = None, qos: int = 0) -> Optional[mqtt.MQTTMessageInfo]:
     """
     发布MQTT设备发现信息到Home Assistant
     
@@ -16,22 +20,46 @@ def publish_discovery(client: mqtt.Client, component: str, object_id: str, paylo
         client: MQTT客户端对象
         component: 组件类型（如light, sensor等）
         object_id: 设备唯一标识
-        payload: 发现信息负载
+        payload: 发现信息负载，可以是已编码的JSON
         retain: 是否保留消息
+        topic: 发现主题，默认按 {root_prefix}/{component}/{object_id}/config 生成
+        qos: 服务质量等级
+        
+    Returns:
+        Optional[mqtt.MQTTMessageInfo]: 客户端返回的发布结果，排队等待限速或发生异常时为None
     """
-    topic = f"{config.root_prefix}/{component}/{object_id}/config"
+    if topic is None:
+        topic = f"{config.root_prefix}/{component}/{object_id}/config"
     try:
-        result = client.publish(
-            topic,
-            json.dumps(payload),
-            retain=retain,
-        )
+        data = payload if isinstance(payload, bytes) else get_serializer().dumps(payload)
+        # 发现信息不会因限速被丢弃，超出预算时排队发布
+        limiter = get_rate_limiter()
+        if limiter is not None:
+            decision = limiter.acquire(client, topic, data, retain, component, object_id, droppable=False)
+            if decision != PublishRateLimiter.ALLOW:
+                logger.debug(f"发现信息已排队等待限速: {topic}")
+                return None
+        try:
+            result = client.publish(
+                topic,
+                data,
+                qos=qos,
+                retain=retain,
+            )
+        except Exception:
+            # 客户端抛出异常同样计为发布失败
+            PUBLISH_FAILURES.inc(("discovery",))
+            raise
         if result.rc != 0:
+            PUBLISH_FAILURES.inc(("discovery",))
             logger.error(f"发布发现信息失败: {result.rc}，主题: {topic}")
         else:
+            PUBLISHES.inc((component, "discovery"))
             logger.debug(f"成功发布发现信息到主题: {topic}")
+        return result
     except Exception as e:
         logger.exception(f"发布发现信息时发生错误: {e}")
+        return None
 
 def publish_state(client: mqtt.Client, topic: str, state: Dict[str, Any], retain: bool = False) -> bool:
     """
@@ -47,15 +75,43 @@ def publish_state(client: mqtt.Client, topic: str, state: Dict[str, Any], retain
         bool: 发布是否成功
     """
     try:
-        result = client.publish(
-            topic,
-            json.dumps(state),
-            retain=retain,
-        )
+        # 该主题上有等待状态发布的命令时记录序列化耗时
+        tracer = get_tracer()
+        span = tracer.pending.get(topic) if tracer is not None else None
+        if span is not None:
+            span.serialize_start = tracer.clock()
+        data = get_serializer().dumps(state)
+        if span is not None:
+            span.serialized = tracer.clock()
+        limiter = get_rate_limiter()
+        if limiter is not None:
+            decision = limiter.acquire(client, topic, data, retain)
+            if decision == PublishRateLimiter.DROPPED:
+                # 设备保持待发布状态，下次模拟时重新尝试
+                logger.debug(f"状态信息因限速被丢弃: {topic}")
+                return False
+            if decision == PublishRateLimiter.QUEUED:
+                if span is not None:
+                    span.queued = True
+                return True
+        try:
+            result = client.publish(
+                topic,
+                data,
+                retain=retain,
+            )
+        except Exception:
+            # 客户端抛出异常同样计为发布失败
+            PUBLISH_FAILURES.inc(("state",))
+            raise
         if result.rc != 0:
+            PUBLISH_FAILURES.inc(("state",))
             logger.error(f"发布状态信息失败: {result.rc}，主题: {topic}")
             return False
         else:
+            PUBLISHES.inc((component_of(topic), "state"))
+            if span is not None:
+                tracer.finish(topic)
             logger.debug(f"成功发布状态到主题: {topic}")
             return True
     except Exception as e:
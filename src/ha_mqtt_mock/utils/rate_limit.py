@@ -0,0 +1,386 @@
+"""发布限速模块
+
+使用令牌桶限制发往Broker的消息速率，支持全局、按组件类型和按设备三级预算。
+超出预算的消息按策略处理：delay排队等待令牌，drop直接丢弃，latest每个主题只保留最新的一条。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .metrics import PUBLISH_FAILURES, PUBLISHES, component_of
+from .tracing import get_tracer
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """令牌桶"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "clock")
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        初始化令牌桶，初始为满
+
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量（允许的突发消息数）
+            clock: 单调时钟
+        """
+        if rate <= 0:
+            raise ValueError(f"无效的限速速率: {rate}")
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def refill(self, now: Optional[float] = None) -> float:
+        """
+        按经过的时间补充令牌
+
+        Args:
+            now: 当前时间，默认读取时钟
+
+        Returns:
+            float: 当前令牌数
+        """
+        now = self.clock() if now is None else now
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+        return self.tokens
+
+    def time_until(self, tokens: float = 1.0) -> float:
+        """
+        获取令牌足够前需要等待的时间（秒），需先调用refill
+
+        Args:
+            tokens: 需要的令牌数
+
+        Returns:
+            float: 等待时间，令牌足够时为0
+        """
+        missing = tokens - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        获取令牌桶状态
+
+        Returns:
+            Dict[str, float]: 速率、容量、当前令牌数和填充比例
+        """
+        tokens = self.refill()
+        return {
+            "rate": self.rate,
+            "capacity": self.capacity,
+            "tokens": round(tokens, 3),
+            "fill": round(tokens / self.capacity, 3),
+        }
+
+
+class PublishRateLimiter:
+    """
+    发布限速器
+
+    每条消息需要同时从全局桶、所属组件的桶和所属设备的桶中各取一个令牌，未配置的级别不限制。
+    排队的消息由run()任务在令牌补充后发出；发现信息（保留的config消息）不会被丢弃，总是排队。
+    """
+
+    POLICIES = ("delay", "drop", "latest")
+
+    # acquire()的结果
+    ALLOW = "allow"
+    QUEUED = "queued"
+    DROPPED = "dropped"
+
+    def __init__(self,
+                 global_rate: Optional[float] = None,
+                 component_rates: Optional[Dict[str, float]] = None,
+                 device_rate: Optional[float] = None,
+                 policy: str = "delay",
+                 burst: float = 1.0,
+                 max_queue: int = 100000,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        初始化发布限速器
+
+        Args:
+            global_rate: 全局速率（消息/秒），None表示不限制
+            component_rates: 按组件类型的速率，如 {"light": 5, "sensor": 100}
+            device_rate: 每个设备的速率（消息/秒），None表示不限制
+            policy: 超出预算时的策略（delay、drop或latest）
+            burst: 突发容量，以秒计（桶容量 = 速率 × burst，至少为1）
+            max_queue: 排队消息上限，超出时丢弃最早的可丢弃消息
+            clock: 单调时钟
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的限速策略: {policy}")
+        self.policy = policy
+        self.burst = burst
+        self.max_queue = max_queue
+        self.clock = clock
+        self.global_bucket = TokenBucket(global_rate, global_rate * burst, clock) if global_rate else None
+        self.component_buckets = {
+            component: TokenBucket(rate, rate * burst, clock)
+            for component, rate in (component_rates or {}).items()
+        }
+        self.device_rate = device_rate
+        self.device_buckets: Dict[str, TokenBucket] = {}
+        # 排队的消息：键为主题（latest策略）或自增序号，值为 (client, topic, payload, retain, buckets, droppable)
+        self._queue: "OrderedDict[Any, Tuple]" = OrderedDict()
+        self._seq = 0
+        self._lock = threading.RLock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.allowed = 0
+        self.delayed = 0
+        self.dropped = 0
+        self.replaced = 0
+
+    def _buckets_for(self, component: Optional[str], object_id: Optional[str]) -> List[TokenBucket]:
+        buckets = []
+        if self.global_bucket is not None:
+            buckets.append(self.global_bucket)
+        if component is not None and component in self.component_buckets:
+            buckets.append(self.component_buckets[component])
+        if self.device_rate and object_id is not None:
+            bucket = self.device_buckets.get(object_id)
+            if bucket is None:
+                bucket = TokenBucket(self.device_rate, self.device_rate * self.burst, self.clock)
+                self.device_buckets[object_id] = bucket
+            buckets.append(bucket)
+        return buckets
+
+    @staticmethod
+    def _take(buckets: List[TokenBucket], now: float) -> bool:
+        """所有桶都有令牌时各取一个"""
+        for bucket in buckets:
+            if bucket.refill(now) < 1.0:
+                return False
+        for bucket in buckets:
+            bucket.tokens -= 1.0
+        return True
+
+    def acquire(self, client, topic: str, payload: Any, retain: bool = False,
+                component: Optional[str] = None, object_id: Optional[str] = None,
+                droppable: bool = True) -> str:
+        """
+        为一条消息申请发布令牌
+
+        Args:
+            client: MQTT客户端，消息排队时由限速器稍后通过它发布
+            topic: MQTT主题
+            payload: 消息负载
+            retain: 是否保留消息
+            component: 组件类型，默认从主题中解析
+            object_id: 设备对象ID，默认从主题中解析
+            droppable: 是否允许按drop策略丢弃
+
+        Returns:
+            str: ALLOW表示调用方立即发布，QUEUED表示已排队，DROPPED表示已丢弃
+        """
+        if component is None or object_id is None:
+            # 主题格式: {root_prefix}/{component}/{object_id}/...
+            parts = topic.split("/")
+            if len(parts) >= 3:
+                component = component or parts[1]
+                object_id = object_id or parts[2]
+        with self._lock:
+            buckets = self._buckets_for(component, object_id)
+            if self.policy == "drop" and droppable:
+                # drop策略下可丢弃的消息从不排队，只看令牌，不需要排在排队的发现信息后面
+                if self._take(buckets, self.clock()):
+                    self.allowed += 1
+                    return self.ALLOW
+                self.dropped += 1
+                return self.DROPPED
+            # 已有排队消息时新消息也排队，保证同一主题的发布顺序
+            if not self._queue and self._take(buckets, self.clock()):
+                self.allowed += 1
+                return self.ALLOW
+            self._enqueue(client, topic, payload, retain, buckets, droppable)
+            self._drain()
+        self._notify()
+        return self.QUEUED
+
+    def _enqueue(self, client, topic: str, payload: Any, retain: bool, buckets: List[TokenBucket],
+                 droppable: bool = True) -> None:
+        entry = (client, topic, payload, retain, buckets, droppable)
+        if self.policy == "latest":
+            if topic in self._queue:
+                # 替换尚未发出的旧状态，保留原来的排队位置
+                self._queue[topic] = entry
+                self.replaced += 1
+                return
+            key = topic
+        else:
+            self._seq += 1
+            key = self._seq
+        if len(self._queue) >= self.max_queue:
+            self._evict()
+        self._queue[key] = entry
+        self.delayed += 1
+
+    def _evict(self) -> None:
+        """队列已满时丢弃最早的一条可丢弃消息，发现信息不会被丢弃（队列中只有发现信息时允许超出上限）"""
+        for key, entry in self._queue.items():
+            if entry[5]:
+                del self._queue[key]
+                self.dropped += 1
+                return
+
+    def _drain(self) -> None:
+        """发出所有已有令牌的排队消息（同一设备的桶相同，因此主题内顺序不变）"""
+        if not self._queue:
+            return
+        now = self.clock()
+        sent = []
+        for key, (client, topic, payload, retain, buckets, _) in self._queue.items():
+            if not self._take(buckets, now):
+                if self.global_bucket is not None and self.global_bucket.tokens < 1.0:
+                    break
+                continue
+            sent.append(key)
+            kind = "discovery" if topic.endswith("/config") else "state"
+            try:
+                try:
+                    result = client.publish(topic, payload, retain=retain)
+                except Exception:
+                    PUBLISH_FAILURES.inc((kind,))
+                    raise
+                if result.rc != 0:
+                    PUBLISH_FAILURES.inc((kind,))
+                    logger.error(f"发布排队消息失败: {result.rc}，主题: {topic}")
+                else:
+                    PUBLISHES.inc((component_of(topic), kind))
+                    tracer = get_tracer()
+                    if tracer is not None and tracer.pending:
+                        tracer.finish(topic)
+            except Exception as e:
+                logger.exception(f"发布排队消息时发生错误: {e}")
+        for key in sent:
+            del self._queue[key]
+
+    def _retry_delay(self) -> float:
+        """距离下一条排队消息可以发出的最短时间"""
+        now = self.clock()
+        delay = None
+        for _, _, _, _, buckets, _ in self._queue.values():
+            wait = 0.0
+            for bucket in buckets:
+                bucket.refill(now)
+                wait = max(wait, bucket.time_until(1.0))
+            delay = wait if delay is None else min(delay, wait)
+            if delay == 0.0:
+                break
+        return max(delay or 0.0, 0.001)
+
+    def _notify(self) -> None:
+        """唤醒run()任务，可以从paho网络线程中调用"""
+        if self._loop is None or self._wakeup is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def run(self) -> None:
+        """在令牌补充后发出排队的消息，直到任务被取消"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                with self._lock:
+                    self._drain()
+                    delay = self._retry_delay() if self._queue else None
+                self._wakeup.clear()
+                if delay is None:
+                    await self._wakeup.wait()
+                else:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self._loop = None
+            self._wakeup = None
+
+    def queued_topics(self) -> Set[str]:
+        """
+        获取排队消息的主题
+
+        Returns:
+            Set[str]: 尚未发出的消息的主题
+        """
+        with self._lock:
+            return {entry[1] for entry in self._queue.values()}
+
+    @property
+    def queued(self) -> int:
+        """当前排队的消息数"""
+        return len(self._queue)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取限速器的计数和各级令牌桶的填充水平
+
+        Returns:
+            Dict[str, Any]: 统计数据
+        """
+        with self._lock:
+            device_levels = [bucket.refill() for bucket in self.device_buckets.values()]
+            return {
+                "policy": self.policy,
+                "allowed": self.allowed,
+                "delayed": self.delayed,
+                "dropped": self.dropped,
+                "replaced": self.replaced,
+                "queued": len(self._queue),
+                "global": self.global_bucket.snapshot() if self.global_bucket is not None else None,
+                "components": {
+                    component: bucket.snapshot() for component, bucket in self.component_buckets.items()
+                },
+                "devices": {
+                    "rate": self.device_rate,
+                    "tracked": len(device_levels),
+                    # 令牌不足一个、下一条消息会被限速的设备数
+                    "throttled": sum(1 for tokens in device_levels if tokens < 1.0),
+                    "min_tokens": round(min(device_levels), 3) if device_levels else None,
+                } if self.device_rate else None,
+            }
+
+
+# 当前进程使用的限速器，为None时不限速
+_rate_limiter: Optional[PublishRateLimiter] = None
+
+
+def set_rate_limiter(limiter: Optional[PublishRateLimiter]) -> None:
+    """
+    设置当前进程的发布限速器
+
+    Args:
+        limiter: 发布限速器，为None时取消限速
+    """
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+def get_rate_limiter() -> Optional[PublishRateLimiter]:
+    """
+    获取当前进程的发布限速器
+
+    Returns:
+        Optional[PublishRateLimiter]: 发布限速器，未设置时为None
+    """
+    return _rate_limiter
@@ -0,0 +1,167 @@
+"""JSON序列化模块
+
+状态和发现信息的编码统一经过这里，后端可以切换：
+    - json（默认）: 标准库json.dumps的默认格式，与原来发布的负载相同
+    - json-compact: 标准库，紧凑格式（无空格、不转义非ASCII字符）
+    - orjson: 更快的C实现（可选依赖，pip install ha-mqtt-mock[orjson]），直接输出UTF-8字节，
+      格式与json-compact逐字节相同；orjson无法编码的对象（如非字符串键、超过64位的整数）自动回退到json-compact
+
+标准库后端返回str（由paho编码），orjson返回bytes，两者都可以直接交给paho发布。
+非dict的映射（如紧凑设备状态）会先转换为字典再编码。
+"""
+
+import json
+import logging
+from collections.abc import Mapping
+from typing import Any, Dict, Optional, Type, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson为可选依赖
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def orjson_available() -> bool:
+    """是否安装了orjson"""
+    return orjson is not None
+
+
+def _default(obj: Any) -> Any:
+    """把有to_dict方法的对象（如紧凑设备状态）和其他非dict的映射转换为字典，其他对象无法编码"""
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def to_bytes(data: Union[bytes, str]) -> bytes:
+    """
+    把序列化结果转换为UTF-8字节
+
+    Args:
+        data: dumps()的结果
+
+    Returns:
+        bytes: UTF-8编码的JSON
+    """
+    return data if isinstance(data, bytes) else data.encode("utf-8")
+
+
+class StdlibSerializer:
+    """标准库json序列化，使用json.dumps的默认格式"""
+
+    name = "json"
+    compact = False
+
+    def dumps(self, obj: Any) -> Union[bytes, str]:
+        """
+        把对象编码为JSON
+
+        Args:
+            obj: 可以JSON序列化的对象
+
+        Returns:
+            Union[bytes, str]: JSON，标准库后端为str
+        """
+        return json.dumps(obj, default=_default)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """
+        解析JSON
+
+        Args:
+            data: JSON字节或字符串
+
+        Returns:
+            Any: 解析结果
+
+        Raises:
+            json.JSONDecodeError: JSON无效
+        """
+        return json.loads(data)
+
+
+class CompactJsonSerializer(StdlibSerializer):
+    """标准库json序列化，紧凑格式（无空格、不转义非ASCII字符）"""
+
+    name = "json-compact"
+    compact = True
+
+    def dumps(self, obj: Any) -> Union[bytes, str]:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default)
+
+
+class OrjsonSerializer(CompactJsonSerializer):
+    """orjson序列化，输出紧凑格式的UTF-8字节，不支持的对象回退到标准库"""
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise ValueError("未安装orjson（pip install ha-mqtt-mock[orjson]）")
+        self._dumps = orjson.dumps
+        self._loads = orjson.loads
+
+    def dumps(self, obj: Any) -> Union[bytes, str]:
+        try:
+            return self._dumps(obj, default=_default)
+        except TypeError:
+            return super().dumps(obj)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        # orjson.JSONDecodeError是json.JSONDecodeError的子类
+        return self._loads(data)
+
+
+SERIALIZERS: Dict[str, Type[StdlibSerializer]] = {
+    "json": StdlibSerializer,
+    "json-compact": CompactJsonSerializer,
+    "orjson": OrjsonSerializer,
+}
+
+
+def create_serializer(name: str = "json") -> StdlibSerializer:
+    """
+    创建序列化器
+
+    Args:
+        name: 后端名称，auto表示紧凑格式：安装了orjson时使用orjson，否则使用json-compact
+
+    Returns:
+        StdlibSerializer: 序列化器
+    """
+    if name == "auto":
+        name = "orjson" if orjson_available() else "json-compact"
+    if name not in SERIALIZERS:
+        raise ValueError(f"未知的JSON序列化后端: {name}")
+    return SERIALIZERS[name]()
+
+
+# 当前进程使用的序列化器
+_serializer: StdlibSerializer = create_serializer()
+
+
+def set_serializer(serializer: Optional[StdlibSerializer]) -> None:
+    """
+    设置当前进程使用的序列化器
+
+    Args:
+        serializer: 序列化器，为None时恢复默认（json）
+    """
+    global _serializer
+    _serializer = serializer if serializer is not None else create_serializer()
+    logger.debug(f"JSON序列化后端: {_serializer.name}")
+
+
+def get_serializer() -> StdlibSerializer:
+    """
+    获取当前进程使用的序列化器
+
+    Returns:
+        StdlibSerializer: 序列化器
+    """
+    return _serializer
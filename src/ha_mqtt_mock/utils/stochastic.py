@@ -0,0 +1,249 @@
+"""事件驱动的随机状态转换模块
+
+设备模型用StochasticEvent声明随机转换：在什么状态下（guard）、以每个模拟周期多大的概率、
+发生什么变化（action）。原来每个设备每个周期都要掷一次骰子，绝大多数结果什么也不做；
+使用EventSampler后，按分布直接抽取下一次事件的时间并放入定时器堆，CPU开销只与实际发生的事件数有关：
+    - geometric: 抽取几何分布的周期数K（第K个周期首次成功），事件在K个模拟周期后发生，
+      事件之间间隔的周期数与每周期掷骰子完全同分布
+    - exponential: 把每周期概率p换算为速率 -ln(1-p)/周期，按指数分布抽取连续时间的间隔
+
+设备状态变化后（命令、定时转换、事件本身）重新规划：条件不再成立的事件被取消，新成立的事件开始计时。
+未使用EventSampler的设备（未设置采样器、负载曲线模式、向量化引擎）仍然在每个模拟周期掷骰子。
+"""
+
+import asyncio
+import logging
+import math
+import random
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .transitions import TransitionScheduler
+
+logger = logging.getLogger(__name__)
+
+
+def always(device: Any) -> bool:
+    """在任何状态下都可能发生的转换的条件"""
+    return True
+
+
+class StochasticEvent:
+    """设备模型的一种随机状态转换"""
+
+    __slots__ = ("name", "probability", "guard", "action")
+
+    def __init__(self, name: str, probability: float, guard: Callable[[Any], bool],
+                 action: Callable[[Any], None]) -> None:
+        """
+        初始化随机转换
+
+        Args:
+            name: 转换名称（同一设备模型内唯一）
+            probability: 条件成立时每个模拟周期发生的概率（0~1）
+            guard: 判断转换在设备当前状态下是否可能发生，参数为设备
+            action: 修改设备状态，参数为设备
+        """
+        if not 0 < probability <= 1:
+            raise ValueError(f"无效的随机转换概率: {probability}")
+        self.name = name
+        self.probability = probability
+        self.guard = guard
+        self.action = action
+
+    def rate(self, interval: float) -> float:
+        """
+        换算为连续时间的速率
+
+        Args:
+            interval: 设备的模拟周期（秒）
+
+        Returns:
+            float: 每秒发生的次数（指数分布的参数），概率为1时为无穷大
+        """
+        if self.probability >= 1:
+            return math.inf
+        return -math.log1p(-self.probability) / interval
+
+
+class EventSampler:
+    """按分布抽取随机转换的发生时间，在定时器堆上调度"""
+
+    MODES = ("geometric", "exponential")
+
+    def __init__(self, mode: str = "geometric", clock: Callable[[], float] = time.monotonic,
+                 rng: Optional[random.Random] = None) -> None:
+        """
+        初始化事件采样器
+
+        Args:
+            mode: 间隔分布，geometric与按周期掷骰子等价，exponential为连续时间
+            clock: 单调时钟
+            rng: 随机数生成器，默认使用random模块的全局生成器（random.seed对它同样有效）
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"未知的随机转换采样方式: {mode}")
+        self.mode = mode
+        self.rng = rng if rng is not None else random
+        self.timers = TransitionScheduler(clock)
+        self.client = None
+        # 由采样器驱动的设备及其模拟周期
+        self._intervals: Dict[Any, float] = {}
+
+        self.fired: Dict[str, int] = {}
+        self.stale = 0
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def tracks(self, device: Any) -> bool:
+        """
+        设备的随机转换是否由采样器驱动
+
+        Args:
+            device: 设备
+
+        Returns:
+            bool: 是否由采样器驱动
+        """
+        return device in self._intervals
+
+    def start(self, loop: asyncio.AbstractEventLoop, client) -> None:
+        """
+        绑定事件循环和发布状态的客户端（需要在该事件循环的线程中调用）
+
+        Args:
+            loop: 事件循环
+            client: MQTT客户端实例
+        """
+        self.client = client
+        self.timers.attach(loop)
+
+    def add(self, device: Any, interval: float) -> None:
+        """
+        由采样器驱动设备的随机转换
+
+        Args:
+            device: 设备
+            interval: 设备的模拟周期（秒）
+        """
+        if not type(device).STOCHASTIC_EVENTS:
+            return
+        self._intervals[device] = interval
+        self.plan(device)
+
+    def remove(self, device: Any) -> None:
+        """
+        停止驱动设备的随机转换
+
+        Args:
+            device: 设备
+        """
+        if self._intervals.pop(device, None) is not None:
+            self.timers.cancel(device)
+
+    def clear(self) -> None:
+        """停止驱动所有设备"""
+        self._intervals.clear()
+        self.timers.clear()
+
+    def sample(self, event: StochasticEvent, interval: float) -> float:
+        """
+        抽取到下一次事件的时间
+
+        Args:
+            event: 随机转换
+            interval: 设备的模拟周期（秒）
+
+        Returns:
+            float: 延迟（秒）
+        """
+        p = event.probability
+        if p >= 1:
+            return interval
+        if self.mode == "geometric":
+            # 逆变换抽样：P(K > k) = (1-p)^k，K >= 1
+            u = 1.0 - self.rng.random()
+            return (1 + math.floor(math.log(u) / math.log1p(-p))) * interval
+        return self.rng.expovariate(event.rate(interval))
+
+    def plan(self, device: Any) -> None:
+        """
+        按设备当前状态重新规划：条件成立且未计时的事件开始计时，条件不成立的事件取消
+
+        Args:
+            device: 设备
+        """
+        interval = self._intervals.get(device)
+        if interval is None:
+            return
+        timers = self.timers
+        for event in type(device).STOCHASTIC_EVENTS:
+            if event.guard(device):
+                # 几何分布和指数分布都是无记忆的，已在计时的事件不需要重新抽样
+                if not timers.pending(device, event.name):
+                    timers.schedule(device, event.name, self.sample(event, interval), self._fire, device, event)
+            else:
+                timers.cancel(device, event.name)
+
+    def _fire(self, device: Any, event: StochasticEvent) -> None:
+        """
+        事件到期：条件仍然成立时修改并发布设备状态，然后重新规划
+
+        Args:
+            device: 设备
+            event: 随机转换
+        """
+        if device not in self._intervals:
+            return
+        if event.guard(device):
+            event.action(device)
+            key = f"{device.component}.{event.name}"
+            self.fired[key] = self.fired.get(key, 0) + 1
+            device.dirty = True
+            if self.client is not None:
+                device.publish_state(self.client)
+        else:
+            # 状态在没有重新规划的路径上发生了变化
+            self.stale += 1
+        self.plan(device)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取采样统计
+
+        Returns:
+            Dict[str, Any]: 采样方式、设备数、等待中的事件数、按 组件.转换名称 统计的已发生事件数和过期事件数
+        """
+        return {
+            "mode": self.mode,
+            "devices": len(self._intervals),
+            "pending": len(self.timers),
+            "fired": dict(self.fired),
+            "stale": self.stale,
+        }
+
+
+# 当前进程的事件采样器，未设置时设备在每个模拟周期掷骰子
+_event_sampler: Optional[EventSampler] = None
+
+
+def set_event_sampler(sampler: Optional[EventSampler]) -> None:
+    """
+    设置当前进程的事件采样器
+
+    Args:
+        sampler: 事件采样器，为None时所有设备按周期掷骰子
+    """
+    global _event_sampler
+    _event_sampler = sampler
+
+
+def get_event_sampler() -> Optional[EventSampler]:
+    """
+    获取当前进程的事件采样器
+
+    Returns:
+        Optional[EventSampler]: 事件采样器，未设置时为None
+    """
+    return _event_sampler
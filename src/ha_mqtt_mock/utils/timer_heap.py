@@ -0,0 +1,124 @@
+"""定时器堆模块
+
+使用最小堆管理大量定时条目，惰性删除已取消的条目。设备模拟周期的调度（engine.scheduler）
+和设备的定时状态转换（utils.transitions）共用这一个结构。
+"""
+
+import heapq
+import itertools
+import time
+from typing import Any, Callable, List, Optional
+
+
+class TimerHandle:
+    """定时器句柄，用于取消已调度的定时器"""
+
+    __slots__ = ("when", "seq", "item", "cancelled")
+
+    def __init__(self, when: float, seq: int, item: Any) -> None:
+        self.when = when
+        self.seq = seq
+        self.item = item
+        self.cancelled = False
+
+    def __lt__(self, other: "TimerHandle") -> bool:
+        if self.when == other.when:
+            return self.seq < other.seq
+        return self.when < other.when
+
+    def cancel(self) -> None:
+        """取消定时器（惰性删除，出堆时跳过）"""
+        self.cancelled = True
+
+
+class TimerHeap:
+    """基于最小堆的定时器集合"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        初始化定时器堆
+
+        Args:
+            clock: 时钟函数，默认使用单调时钟
+        """
+        self.clock = clock
+        self._heap: List[TimerHandle] = []
+        self._counter = itertools.count()
+        self._cancelled = 0
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled
+
+    def schedule(self, when: float, item: Any) -> TimerHandle:
+        """
+        在指定时间点调度一个条目
+
+        Args:
+            when: 到期时间（与clock同一时间基准）
+            item: 到期时返回的条目
+
+        Returns:
+            TimerHandle: 定时器句柄
+        """
+        handle = TimerHandle(when, next(self._counter), item)
+        heapq.heappush(self._heap, handle)
+        return handle
+
+    def cancel(self, handle: TimerHandle) -> None:
+        """
+        取消已调度的条目
+
+        Args:
+            handle: 定时器句柄
+        """
+        if not handle.cancelled:
+            handle.cancel()
+            self._cancelled += 1
+            # 已取消的条目过多时重建堆，防止内存无限增长
+            if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+                self._heap = [h for h in self._heap if not h.cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def next_deadline(self) -> Optional[float]:
+        """
+        获取最近的到期时间
+
+        Returns:
+            Optional[float]: 最近的到期时间，如果没有条目则返回None
+        """
+        heap = self._heap
+        while heap and heap[0].cancelled:
+            heapq.heappop(heap)
+            self._cancelled -= 1
+        return heap[0].when if heap else None
+
+    def pop_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[TimerHandle]:
+        """
+        弹出所有已到期的条目
+
+        Args:
+            now: 当前时间，默认读取时钟
+            limit: 最多弹出的条目数量
+
+        Returns:
+            List[TimerHandle]: 按到期时间排序的已到期句柄
+        """
+        if now is None:
+            now = self.clock()
+        heap = self._heap
+        due: List[TimerHandle] = []
+        while heap and heap[0].when <= now:
+            handle = heapq.heappop(heap)
+            if handle.cancelled:
+                self._cancelled -= 1
+                continue
+            due.append(handle)
+            if limit is not None and len(due) >= limit:
+                break
+        return due
+
+    def clear(self) -> None:
+        """清空所有条目"""
+        self._heap.clear()
+        self._cancelled = 0
@@ -0,0 +1,324 @@
+"""命令往返延迟追踪模块
+
+每个命令在到达时打上时间戳，并与它引起的状态发布关联（按设备的状态主题），记录：
+    - queue: 报文被MQTT客户端读出到命令处理开始（等待paho网络线程或命令队列）
+    - parse: 解码和JSON解析
+    - model: 设备模型逻辑（update_state等）
+    - serialize: 状态序列化
+    - publish: 调用客户端publish
+
+按设备类型统计总延迟的直方图，可选地把每个命令的分段耗时写入JSON Lines文件。
+没有引起状态发布的命令（解析失败、被合并、状态没有发布）不计入统计：命令处理结束时仍未发布的追踪被丢弃，
+超过span_timeout仍未发布的追踪过期，不会被之后无关的发布以错误的延迟结束。
+时间使用time.monotonic，与paho消息的timestamp一致。
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# 总延迟直方图的分桶（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PHASES = ("queue", "parse", "model", "serialize", "publish")
+
+
+class CommandSpan:
+    """一个命令从到达到状态发布的时间点"""
+
+    __slots__ = ("component", "object_id", "arrived", "received", "parsed", "serialize_start", "serialized",
+                 "queued")
+
+    def __init__(self, component: str, object_id: str, arrived: float, received: float) -> None:
+        self.component = component
+        self.object_id = object_id
+        self.arrived = arrived
+        self.received = received
+        self.parsed: Optional[float] = None
+        self.serialize_start: Optional[float] = None
+        self.serialized: Optional[float] = None
+        # 状态发布在限速器中排队，由限速器发出时结束
+        self.queued = False
+
+    def phases(self, published: float) -> Dict[str, float]:
+        """
+        计算各阶段耗时（秒）
+
+        Args:
+            published: publish调用返回的时间
+
+        Returns:
+            Dict[str, float]: 阶段名到耗时的映射
+        """
+        parsed = self.parsed if self.parsed is not None else self.received
+        serialize_start = self.serialize_start if self.serialize_start is not None else parsed
+        serialized = self.serialized if self.serialized is not None else serialize_start
+        return {
+            "queue": self.received - self.arrived,
+            "parse": parsed - self.received,
+            "model": serialize_start - parsed,
+            "serialize": serialized - serialize_start,
+            "publish": published - serialized,
+        }
+
+
+class CommandTracer:
+    """命令往返延迟追踪器"""
+
+    def __init__(self, span_file: Optional[str] = None, flush_interval: float = 1.0, shard: Optional[int] = None,
+                 span_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        初始化追踪器
+
+        Args:
+            span_file: 分段耗时记录文件（JSON Lines），为None时只统计直方图
+            flush_interval: 写入记录文件的最长间隔（秒）
+            shard: 分片编号，写入记录便于区分工作进程
+            span_timeout: 命令等待状态发布的最长时间（秒），超过后丢弃
+            clock: 单调时钟
+        """
+        self.span_file = span_file
+        self.flush_interval = flush_interval
+        self.shard = shard
+        self.span_timeout = span_timeout
+        self.clock = clock
+        # 等待状态发布的命令，键为设备的状态主题
+        self.pending: Dict[str, CommandSpan] = {}
+        self.latency: Dict[str, Histogram] = {}
+        self.phase_totals: Dict[str, Dict[str, float]] = {}
+        self.max_latency: Dict[str, float] = {}
+        self.superseded = 0
+        self.unpublished = 0
+        self.expired = 0
+        self._buffer: List[str] = []
+        self._last_flush = clock()
+        self._last_expire = clock()
+        self._lock = threading.Lock()
+
+    def begin(self, device, arrived: Optional[float] = None) -> CommandSpan:
+        """
+        记录命令到达
+
+        Args:
+            device: 收到命令的设备
+            arrived: MQTT客户端读出报文的时间（paho消息的timestamp），为None时使用当前时间
+
+        Returns:
+            CommandSpan: 命令的追踪，命令处理结束时传给settle()
+        """
+        now = self.clock()
+        if now - self._last_expire >= self.span_timeout:
+            self.expire(now)
+        span = CommandSpan(device.component, device.object_id, now if arrived is None else arrived, now)
+        if self.pending.get(device.state_topic) is not None:
+            # 上一个命令还没有引起状态发布，只追踪最新的命令
+            self.superseded += 1
+        self.pending[device.state_topic] = span
+        return span
+
+    def settle(self, topic: str, span: CommandSpan) -> None:
+        """
+        命令处理结束：命令没有引起状态发布（解析失败、状态没有发布）时丢弃它的追踪
+
+        Args:
+            topic: 设备的状态主题
+            span: begin()返回的追踪
+        """
+        if self.pending.get(topic) is span and not span.queued:
+            del self.pending[topic]
+            self.unpublished += 1
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        丢弃等待状态发布超过span_timeout的追踪
+
+        Args:
+            now: 当前时间，默认读取时钟
+
+        Returns:
+            int: 丢弃的追踪数量
+        """
+        now = self.clock() if now is None else now
+        self._last_expire = now
+        deadline = now - self.span_timeout
+        stale = [topic for topic, span in self.pending.items() if span.received < deadline]
+        for topic in stale:
+            self.pending.pop(topic, None)
+        self.expired += len(stale)
+        return len(stale)
+
+    def mark_parsed(self, topic: str) -> None:
+        """
+        记录命令解析完成
+
+        Args:
+            topic: 设备的状态主题
+        """
+        span = self.pending.get(topic)
+        if span is not None:
+            span.parsed = self.clock()
+
+    def finish(self, topic: str) -> None:
+        """
+        状态发布完成，结束该主题上等待的命令
+
+        Args:
+            topic: 状态主题
+        """
+        span = self.pending.pop(topic, None)
+        if span is None:
+            return
+        published = self.clock()
+        if published - span.received > self.span_timeout:
+            # 命令早已处理完，这次发布与它无关
+            self.expired += 1
+            return
+        phases = span.phases(published)
+        total = published - span.arrived
+        component = span.component
+        with self._lock:
+            histogram = self.latency.get(component)
+            if histogram is None:
+                histogram = self.latency[component] = Histogram("command_latency_seconds", "", LATENCY_BUCKETS)
+                self.phase_totals[component] = dict.fromkeys(PHASES, 0.0)
+            histogram.observe(total)
+            totals = self.phase_totals[component]
+            for phase, value in phases.items():
+                totals[phase] += value
+            if total > self.max_latency.get(component, 0.0):
+                self.max_latency[component] = total
+            if self.span_file:
+                record = {
+                    "component": component,
+                    "object_id": span.object_id,
+                    "total_ms": round(total * 1000, 3),
+                    **{f"{phase}_ms": round(value * 1000, 3) for phase, value in phases.items()},
+                }
+                if self.shard is not None:
+                    record["shard"] = self.shard
+                self._buffer.append(json.dumps(record, ensure_ascii=False) + "\n")
+                if published - self._last_flush >= self.flush_interval:
+                    self._flush_locked(published)
+
+    def flush(self) -> None:
+        """把缓冲的记录写入文件"""
+        with self._lock:
+            self._flush_locked(self.clock())
+
+    def _flush_locked(self, now: float) -> None:
+        self._last_flush = now
+        if not self._buffer or not self.span_file:
+            return
+        data, self._buffer = "".join(self._buffer), []
+        try:
+            # 多个工作进程追加写入同一个文件，一次写入整批记录
+            with open(self.span_file, "a", encoding="utf-8") as f:
+                f.write(data)
+        except OSError as e:
+            logger.error(f"写入命令延迟记录失败: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        导出统计数据（可以通过管道发送给其他进程）
+
+        Returns:
+            Dict[str, Any]: 以设备类型为键的直方图、分段耗时合计和最大延迟
+        """
+        with self._lock:
+            return {
+                component: {
+                    "histogram": histogram.snapshot(),
+                    "phases": dict(self.phase_totals[component]),
+                    "max": self.max_latency.get(component, 0.0),
+                }
+                for component, histogram in self.latency.items()
+            }
+
+
+def summarize_latency(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    合并一个或多个追踪器快照，生成按设备类型的延迟摘要
+
+    Args:
+        snapshots: CommandTracer.snapshot()的结果列表
+
+    Returns:
+        Dict[str, Any]: 以设备类型为键的次数、平均/最大延迟、分位数上界、分段平均耗时和直方图
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        for component, data in snapshot.items():
+            entry = merged.get(component)
+            if entry is None:
+                entry = merged[component] = {
+                    "histogram": Histogram("command_latency_seconds", "", LATENCY_BUCKETS),
+                    "phases": dict.fromkeys(PHASES, 0.0),
+                    "max": 0.0,
+                }
+            entry["histogram"].merge(data["histogram"])
+            for phase, value in data["phases"].items():
+                entry["phases"][phase] += value
+            entry["max"] = max(entry["max"], data["max"])
+
+    summary = {}
+    for component, entry in sorted(merged.items()):
+        histogram: Histogram = entry["histogram"]
+        count = histogram.count
+        summary[component] = {
+            "count": count,
+            "avg_ms": round(histogram.sum / count * 1000, 3) if count else None,
+            "max_ms": round(entry["max"] * 1000, 3),
+            "p50_ms": _quantile_ms(histogram, 0.5),
+            "p99_ms": _quantile_ms(histogram, 0.99),
+            "phases_avg_ms": {
+                phase: round(value / count * 1000, 3) if count else None
+                for phase, value in entry["phases"].items()
+            },
+            "buckets": {
+                str(bound): count for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts)
+            },
+        }
+    return summary
+
+
+def _quantile_ms(histogram: Histogram, q: float) -> Optional[float]:
+    """分位数所在桶的上界（毫秒），落在+Inf桶时为None"""
+    if not histogram.count:
+        return None
+    target = q * histogram.count
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        if cumulative >= target:
+            return round(bound * 1000, 3)
+    return None
+
+
+# 当前进程的追踪器，未设置时不追踪
+_tracer: Optional[CommandTracer] = None
+
+
+def set_tracer(tracer: Optional[CommandTracer]) -> None:
+    """
+    设置当前进程的命令追踪器
+
+    Args:
+        tracer: 命令追踪器，为None时关闭追踪
+    """
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Optional[CommandTracer]:
+    """
+    获取当前进程的命令追踪器
+
+    Returns:
+        Optional[CommandTracer]: 命令追踪器，未设置时为None
+    """
+    return _tracer
@@ -0,0 +1,263 @@
+"""定时状态转换模块
+
+设备模型用它安排未来的状态变化，而不是在命令处理中立即给出最终状态或依赖全局模拟节拍：
+报警面板的布防延迟、窗帘的行程、灯光的亮度渐变、门锁卡住后的恢复等。
+
+所有设备的转换保存在一个定时器堆（TimerHeap，与设备模拟周期的调度共用）中，
+事件循环中只保留一个定时器，指向堆顶的到期时间；转换到期时在事件循环中执行回调，回调可以继续安排下一步（如渐变的下一级亮度）。
+同一设备的同一种转换（键）只保留最新的一个，新命令会取代尚未执行的转换。
+
+命令可能在paho网络线程中处理（未使用命令队列时），因此安排和取消转换是线程安全的。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .timer_heap import TimerHandle, TimerHeap
+
+logger = logging.getLogger(__name__)
+
+
+class TransitionScheduler:
+    """在一个定时器堆上调度所有设备的定时状态转换"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        初始化转换调度器
+
+        Args:
+            clock: 单调时钟
+        """
+        self.clock = clock
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[int] = None
+        # 定时器条目为 (device, key, callback, args)
+        self.timers = TimerHeap(clock)
+        # 设备到 {键: 定时器句柄}，用于取代和取消
+        self._active: Dict[Any, Dict[str, TimerHandle]] = {}
+        self._lock = threading.Lock()
+        # 事件循环中唯一的定时器及其到期时间
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_when: Optional[float] = None
+        self._running = False
+
+        self.scheduled = 0
+        self.fired = 0
+        self.superseded = 0
+        self.cancelled = 0
+        self.max_pending = 0
+
+    def __len__(self) -> int:
+        return len(self.timers)
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        绑定执行转换的事件循环（需要在该事件循环的线程中调用），绑定前安排的转换从此开始计时
+
+        Args:
+            loop: 事件循环
+        """
+        if self.loop is loop:
+            return
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self._timer = None
+        self._timer_when = None
+        self._arm()
+
+    def schedule(self, device: Any, key: str, delay: float, callback: Callable[..., Any], *args: Any) -> TimerHandle:
+        """
+        安排设备在delay秒后执行一次转换，取代该设备同一个键上尚未执行的转换
+
+        Args:
+            device: 设备
+            key: 转换的种类（如arming、travel、transition）
+            delay: 延迟（秒）
+            callback: 到期时在事件循环中调用的函数
+            args: 回调参数
+
+        Returns:
+            TimerHandle: 已安排的转换的定时器句柄
+        """
+        with self._lock:
+            when = self.clock() + max(delay, 0.0)
+            handle = self.timers.schedule(when, (device, key, callback, args))
+            transitions = self._active.get(device)
+            if transitions is None:
+                transitions = self._active[device] = {}
+            previous = transitions.get(key)
+            if previous is not None:
+                self.timers.cancel(previous)
+                self.superseded += 1
+            transitions[key] = handle
+            self.scheduled += 1
+            pending = len(self.timers)
+            if pending > self.max_pending:
+                self.max_pending = pending
+            rearm = self._timer_when is None or when < self._timer_when
+        if rearm:
+            self._request_arm()
+        return handle
+
+    def pending(self, device: Any, key: Optional[str] = None) -> bool:
+        """
+        设备是否有尚未执行的转换
+
+        Args:
+            device: 设备
+            key: 转换的种类，为None时检查所有种类
+
+        Returns:
+            bool: 是否有尚未执行的转换
+        """
+        transitions = self._active.get(device)
+        if not transitions:
+            return False
+        return key is None or key in transitions
+
+    def cancel(self, device: Any, key: Optional[str] = None) -> int:
+        """
+        取消设备尚未执行的转换（设备被移除或命令中止了转换时调用）
+
+        Args:
+            device: 设备
+            key: 转换的种类，为None时取消设备的所有转换
+
+        Returns:
+            int: 取消的转换数量
+        """
+        with self._lock:
+            transitions = self._active.get(device)
+            if not transitions:
+                return 0
+            if key is None:
+                removed = list(transitions.values())
+                del self._active[device]
+            else:
+                handle = transitions.pop(key, None)
+                if handle is None:
+                    return 0
+                removed = [handle]
+                if not transitions:
+                    del self._active[device]
+            for handle in removed:
+                self.timers.cancel(handle)
+            self.cancelled += len(removed)
+            return len(removed)
+
+    def clear(self) -> None:
+        """取消所有转换（停止模拟时调用）"""
+        with self._lock:
+            self.cancelled += len(self.timers)
+            self.timers.clear()
+            self._active.clear()
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = None
+        self._timer_when = None
+
+    def _request_arm(self) -> None:
+        """在事件循环中重新设置定时器（可以在任意线程中调用）"""
+        if self.loop is None or self._running:
+            # 未绑定事件循环时在attach()中设置；执行转换期间在结束后统一设置
+            return
+        if threading.get_ident() == self.loop_thread:
+            self._arm()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self._arm)
+            except RuntimeError:
+                # 事件循环已经关闭
+                pass
+
+    def _arm(self) -> None:
+        """把事件循环中的定时器指向堆顶的到期时间（在事件循环中调用）"""
+        with self._lock:
+            when = self.timers.next_deadline()
+        if when == self._timer_when and self._timer is not None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+            self._timer_when = None
+        if when is not None:
+            self._timer = self.loop.call_later(max(when - self.clock(), 0.0), self._run)
+            self._timer_when = when
+
+    def _run(self) -> None:
+        """执行所有到期的转换，然后把定时器指向下一个到期时间"""
+        self._timer = None
+        self._timer_when = None
+        self._running = True
+        try:
+            due: List[TimerHandle] = []
+            with self._lock:
+                for handle in self.timers.pop_due():
+                    device, key = handle.item[0], handle.item[1]
+                    transitions = self._active.get(device)
+                    if transitions is not None and transitions.get(key) is handle:
+                        del transitions[key]
+                        if not transitions:
+                            del self._active[device]
+                    due.append(handle)
+            for handle in due:
+                device, key, callback, args = handle.item
+                self.fired += 1
+                try:
+                    callback(*args)
+                except Exception as e:
+                    name = getattr(device, "name", device)
+                    logger.exception(f"执行设备 '{name}' 的定时状态转换 {key} 时发生错误: {e}")
+        finally:
+            self._running = False
+        self._arm()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取转换统计
+
+        Returns:
+            Dict[str, Any]: 等待中的转换数和设备数、最大等待数、已安排/执行/取代/取消的转换数和下一次到期的剩余时间
+        """
+        with self._lock:
+            pending = len(self.timers)
+            devices = len(self._active)
+        next_in = self._timer_when - self.clock() if self._timer_when is not None else None
+        return {
+            "pending": pending,
+            "devices": devices,
+            "max_pending": self.max_pending,
+            "scheduled": self.scheduled,
+            "fired": self.fired,
+            "superseded": self.superseded,
+            "cancelled": self.cancelled,
+            "next_in": round(max(next_in, 0.0), 3) if next_in is not None else None,
+        }
+
+
+# 当前进程的转换调度器，未设置时设备模型立即给出最终状态
+_transition_scheduler: Optional[TransitionScheduler] = None
+
+
+def set_transition_scheduler(scheduler: Optional[TransitionScheduler]) -> None:
+    """
+    设置当前进程的转换调度器
+
+    Args:
+        scheduler: 转换调度器，为None时关闭定时转换
+    """
+    global _transition_scheduler
+    _transition_scheduler = scheduler
+
+
+def get_transition_scheduler() -> Optional[TransitionScheduler]:
+    """
+    获取当前进程的转换调度器
+
+    Returns:
+        Optional[TransitionScheduler]: 转换调度器，未设置时为None
+    """
+    return _transition_scheduler
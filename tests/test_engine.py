@@ -0,0 +1,1063 @@
+"""模拟引擎测试"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from unittest.mock import MagicMock
+
+import paho.mqtt.client as mqtt
+
+import pytest
+
+from ha_mqtt_mock.bench.common import compare_results
+from ha_mqtt_mock.bench.micro import measure
+from ha_mqtt_mock.engine import MockDeviceManager
+from ha_mqtt_mock.engine.broker import Broker, topic_matches
+from ha_mqtt_mock.engine.coalesce import CommandCoalescer
+from ha_mqtt_mock.engine.command_queue import CommandQueue
+from ha_mqtt_mock.engine.load_profile import LoadDriver, LoadProfile
+from ha_mqtt_mock.engine.mqtt_asyncio import AsyncioMQTTClient
+from ha_mqtt_mock.engine.mqtt_pool import MQTTClientPool, ThroughputSampler, get_connection_stats
+from ha_mqtt_mock.engine.resync import BirthResync
+from ha_mqtt_mock.engine.scheduler import DeviceScheduler, TimerHeap
+from ha_mqtt_mock.engine.sharding import HashRing
+from ha_mqtt_mock.engine.startup import StartupPublisher, merge_startup_stats
+from ha_mqtt_mock.models import Alarm, BinarySensor, Cover, Light, Lock, Sensor, Switch, Vacuum
+from ha_mqtt_mock.utils import publish_discovery, publish_state
+from ha_mqtt_mock.utils.metrics import (
+    COMMANDS, PUBLISH_FAILURES, PUBLISHES, TICK_DURATION, UNKNOWN_COMMANDS, registry as metrics_registry,
+)
+from ha_mqtt_mock.utils.rate_limit import PublishRateLimiter, TokenBucket, set_rate_limiter
+from ha_mqtt_mock.utils.stochastic import EventSampler, StochasticEvent, always, set_event_sampler
+from ha_mqtt_mock.utils.tracing import CommandTracer, set_tracer, summarize_latency
+from ha_mqtt_mock.utils.transitions import TransitionScheduler, set_transition_scheduler
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_timer_heap_order_and_cancel():
+    """测试定时器堆的出堆顺序和取消"""
+    timers = TimerHeap(clock=FakeClock())
+    a = timers.schedule(3, "a")
+    timers.schedule(1, "b")
+    timers.schedule(2, "c")
+    timers.cancel(a)
+
+    assert len(timers) == 2
+    assert timers.next_deadline() == 1
+    assert [h.item for h in timers.pop_due(5)] == ["b", "c"]
+    assert timers.next_deadline() is None
+
+
+def test_device_scheduler_per_device_interval():
+    """测试设备按照各自的mock_interval调度"""
+    clock = FakeClock()
+    scheduler = DeviceScheduler(default_interval=10, clock=clock)
+    fast = Sensor(object_id="fast_sensor", sensor_type="temperature", mock_interval=1)
+    slow = Light(object_id="slow_light")
+    scheduler.add(fast)
+    scheduler.add(slow)
+
+    counts = {"fast_sensor": 0, "slow_light": 0}
+    for step in range(1, 101):
+        clock.now = step
+        for device in scheduler.pop_due():
+            counts[device.object_id] += 1
+
+    assert counts["fast_sensor"] == pytest.approx(100, abs=1)
+    assert counts["slow_light"] == pytest.approx(10, abs=1)
+
+
+def test_device_scheduler_spreads_phase():
+    """测试首次到期时间分散在整个周期内"""
+    clock = FakeClock()
+    scheduler = DeviceScheduler(default_interval=10, clock=clock)
+    for i in range(1000):
+        scheduler.add(Light(object_id=f"light_{i}"))
+
+    per_second = []
+    for step in range(1, 11):
+        clock.now = step
+        per_second.append(len(scheduler.pop_due()))
+
+    assert sum(per_second) == 1000
+    assert max(per_second) < 200
+
+
+def test_device_scheduler_remove():
+    """测试移除设备后不再到期"""
+    clock = FakeClock()
+    scheduler = DeviceScheduler(default_interval=1, clock=clock)
+    light = Light(object_id="removed_light")
+    scheduler.add(light)
+    assert light in scheduler
+    assert scheduler.remove(light)
+
+    clock.now = 5
+    assert scheduler.pop_due() == []
+    assert len(scheduler) == 0
+
+
+def make_client():
+    """创建发布总是成功的模拟客户端"""
+    client = MagicMock()
+    client.publish.return_value.rc = 0
+    return client
+
+
+def test_unchanged_device_not_republished():
+    """测试状态未变化的设备不会重复发布"""
+    manager = MockDeviceManager()
+    switch = Switch(object_id="test_switch", name="Test Switch")
+    manager.add_device(switch)
+    client = make_client()
+
+    manager.mock_device(client, switch)
+    manager.mock_device(client, switch)
+    assert client.publish.call_count == 1
+
+    # API修改状态后重新标记为脏
+    manager.update_device_state("test_switch", {"state": "ON"})
+    manager.mock_device(client, switch)
+    assert client.publish.call_count == 2
+
+
+def test_heartbeat_republishes_unchanged_state():
+    """测试心跳到期后重新发布未变化的状态"""
+    manager = MockDeviceManager(heartbeat_interval=30)
+    switch = Switch(object_id="test_switch", name="Test Switch")
+    client = make_client()
+
+    manager.mock_device(client, switch)
+    assert not switch.needs_publish(switch.last_published + 10, manager.heartbeat_interval)
+    assert switch.needs_publish(switch.last_published + 30, manager.heartbeat_interval)
+
+
+def test_step_mock_marks_dirty_on_change():
+    """测试模拟更新改变状态时标记为脏"""
+    cover = Cover(object_id="test_cover")
+    cover.dirty = False
+    cover.step_mock()
+    assert not cover.dirty
+
+    cover.state.update({"state": "opening", "position": 100})
+    cover.step_mock()
+    assert cover.dirty
+
+
+def test_vectorized_engine_matches_sensor_semantics():
+    """测试向量化引擎推进传感器数值并只发布需要上报的行"""
+    pytest.importorskip("numpy")
+    from ha_mqtt_mock.engine.vectorized import VectorizedSimulator
+
+    engine = VectorizedSimulator(buckets=1, seed=1)
+    sensors = [Sensor(object_id=f"vec_temp_{i}", sensor_type="temperature") for i in range(100)]
+    vacuum = Vacuum(object_id="vec_vacuum", state={"state": "cleaning", "fan_speed": "medium", "battery_level": 50})
+    custom = Sensor(object_id="custom_interval", mock_interval=1)
+    remaining = engine.add_devices(sensors + [vacuum, custom])
+    assert remaining == [custom]
+
+    client = make_client()
+    # 首次tick所有设备都上报
+    assert engine.tick(client, now=1000) == 101
+    for step in range(1, 20):
+        engine.tick(client, now=1000 + step * 10)
+
+    engine.sync()
+    config = Sensor.SENSOR_TYPES["temperature"]
+    for sensor in sensors:
+        assert config["mock_min"] <= sensor.state["temperature"] <= config["mock_max"]
+    assert vacuum.state["battery_level"] < 50 or vacuum.state["state"] == "returning"
+    # 有死区时发布数量明显少于设备更新次数
+    assert client.publish.call_count < 101 * 20
+
+    # 查找设备不写回列中的数值，读取状态的接口才写回
+    manager = MockDeviceManager(engine="vectorized")
+    sensor = Sensor(object_id="vec_lookup", sensor_type="temperature")
+    manager.add_device(sensor)
+    manager.vector_engine.add_devices(manager.devices)
+    manager.vector_engine._rebuild()
+    column, row = manager.vector_engine._index[sensor.object_id]
+    column.values[row] = 42.0
+    assert manager.get_device("vec_lookup").state.get("temperature") != 42.0
+    assert manager.get_device_state("vec_lookup")["temperature"] == 42.0
+
+
+def test_hash_ring_partition_is_stable_and_balanced():
+    """测试一致性哈希分片稳定且大致均衡"""
+    ring = HashRing(range(4))
+    object_ids = [f"device_{i}" for i in range(4000)]
+    assignment = {object_id: ring.get_node(object_id) for object_id in object_ids}
+
+    counts = [list(assignment.values()).count(node) for node in range(4)]
+    assert min(counts) > 500
+
+    # 增加节点后只有少部分设备迁移
+    ring.add_node(4)
+    moved = sum(1 for object_id in object_ids if ring.get_node(object_id) != assignment[object_id])
+    assert moved < len(object_ids) * 0.35
+
+
+def test_mqtt_client_pool_routes_by_object_id():
+    """测试连接池按object_id把同一设备的主题路由到同一连接"""
+    clients = [MagicMock() for _ in range(3)]
+    for client in clients:
+        client.publish.return_value.rc = 0
+    pool = MQTTClientPool(clients)
+
+    for i in range(30):
+        object_id = f"device_{i}"
+        pool.publish(f"homeassistant/switch/{object_id}/state", b"ON")
+        pool.subscribe(f"homeassistant/switch/{object_id}/set")
+        index = pool.connection_index(object_id)
+        assert clients[index].publish.call_args.args[0] == f"homeassistant/switch/{object_id}/state"
+        assert clients[index].subscribe.call_args.args[0] == f"homeassistant/switch/{object_id}/set"
+
+    assert sum(stats.published for stats in pool.stats) == 30
+    assert sum(stats.bytes for stats in pool.stats) == 60
+    assert all(client.publish.call_count > 0 for client in clients)
+
+    # 字符串负载按UTF-8编码后的字节数统计
+    topic = "homeassistant/sensor/utf8/state"
+    stats = pool.stats[pool.connection_index("utf8")]
+    before = stats.bytes
+    pool.publish(topic, "温度")
+    assert stats.bytes - before == 6
+
+    # 读取统计不改变计数，每个采样器按自己的上一次读数计算吞吐量
+    now = [0.0]
+    first, second = ThroughputSampler(lambda: now[0]), ThroughputSampler(lambda: now[0])
+    first.annotate(get_connection_stats(pool))
+    second.annotate(get_connection_stats(pool))
+    for _ in range(10):
+        pool.publish(topic, b"1")
+    now[0] = 1.0
+    first.annotate(get_connection_stats(pool))
+    now[0] = 2.0
+    rates = {entry["connection"]: entry["messages_per_second"] for entry in second.annotate(get_connection_stats(pool))}
+    assert rates[pool.connection_index("utf8")] == 5.0
+
+    # 通配符订阅走第一个连接
+    pool.subscribe("homeassistant/+/+/set")
+    assert clients[0].subscribe.call_args.args[0] == "homeassistant/+/+/set"
+
+
+def test_asyncio_client_backpressure():
+    """测试asyncio传输在发送队列积压时等待，排空后继续"""
+    async def scenario():
+        client = AsyncioMQTTClient(client_id="test_backpressure", max_pending=2)
+        # 未连接时不等待
+        client._out_packet.extend([{}, {}])
+        await asyncio.wait_for(client.wait_writable(), timeout=1)
+
+        client._sock = MagicMock()
+        waiter = asyncio.create_task(client.wait_writable())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+
+        # 模拟写回调把队列排空
+        client._out_packet.clear()
+        client._set_writable()
+        await asyncio.wait_for(waiter, timeout=1)
+        client._sock = None
+
+    asyncio.run(scenario())
+
+
+def test_token_bucket_refill():
+    """测试令牌桶按速率补充且不超过容量"""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=4, clock=clock)
+    bucket.tokens = 0
+    clock.now = 1.0
+    assert bucket.refill() == pytest.approx(2)
+    assert bucket.time_until(3) == pytest.approx(0.5)
+    clock.now = 10.0
+    assert bucket.refill() == pytest.approx(4)
+
+
+@pytest.mark.parametrize("policy, published, result", [
+    ("drop", 2, False),
+    ("delay", 5, True),
+    ("latest", 4, True),
+])
+def test_rate_limiter_policies(policy, published, result):
+    """测试超出预算时的丢弃、排队和只保留最新状态策略"""
+    clock = FakeClock()
+    limiter = PublishRateLimiter(global_rate=2, policy=policy, clock=clock)
+    client = MagicMock()
+    client.publish.return_value.rc = 0
+    set_rate_limiter(limiter)
+    try:
+        # 容量为2：前两条立即发布，其余超出预算
+        assert publish_state(client, "homeassistant/sensor/a/state", {"v": 1})
+        assert publish_state(client, "homeassistant/sensor/b/state", {"v": 1})
+        assert publish_state(client, "homeassistant/sensor/c/state", {"v": 1}) is result
+        assert publish_state(client, "homeassistant/sensor/c/state", {"v": 2}) is result
+        assert publish_state(client, "homeassistant/sensor/d/state", {"v": 1}) is result
+        assert client.publish.call_count == 2
+
+        # 令牌补充后由限速器发出排队的消息
+        for now in (10.0, 20.0):
+            clock.now = now
+            with limiter._lock:
+                limiter._drain()
+        assert client.publish.call_count == published
+        if policy == "latest":
+            assert limiter.replaced == 1
+            assert client.publish.call_args_list[2].args[1] == json.dumps({"v": 2})
+    finally:
+        set_rate_limiter(None)
+
+
+def test_rate_limiter_per_device_budget():
+    """测试按设备的预算只限制超出的设备"""
+    limiter = PublishRateLimiter(device_rate=1, component_rates={"light": 100}, policy="drop", clock=FakeClock())
+    client = MagicMock()
+    assert limiter.acquire(client, "homeassistant/light/a/state", "{}") == PublishRateLimiter.ALLOW
+    assert limiter.acquire(client, "homeassistant/light/a/state", "{}") == PublishRateLimiter.DROPPED
+    assert limiter.acquire(client, "homeassistant/light/b/state", "{}") == PublishRateLimiter.ALLOW
+    stats = limiter.get_stats()
+    assert stats["devices"]["throttled"] == 2
+    assert stats["components"]["light"]["tokens"] == pytest.approx(98)
+
+
+def test_rate_limiter_never_drops_discovery():
+    """测试排队的发现信息不影响drop策略下的状态发布，队列满时也不会被丢弃"""
+    clock = FakeClock()
+    limiter = PublishRateLimiter(device_rate=1, policy="drop", max_queue=2, clock=clock)
+    client = MagicMock()
+    assert limiter.acquire(client, "homeassistant/light/a/state", "{}") == PublishRateLimiter.ALLOW
+    for i in range(3):
+        assert limiter.acquire(client, "homeassistant/light/a/config", "{}", droppable=False) == PublishRateLimiter.QUEUED
+    # 发现信息在排队，其他设备的状态仍然按令牌直接发布
+    assert limiter.acquire(client, "homeassistant/light/b/state", "{}") == PublishRateLimiter.ALLOW
+    assert limiter.queued == 3 and limiter.dropped == 0
+
+    limiter = PublishRateLimiter(global_rate=1, policy="delay", max_queue=2, clock=clock)
+    limiter.acquire(client, "homeassistant/light/a/state", "{}")
+    limiter.acquire(client, "homeassistant/light/a/config", "{}", droppable=False)
+    limiter.acquire(client, "homeassistant/light/b/state", "{}")
+    limiter.acquire(client, "homeassistant/light/c/config", "{}", droppable=False)
+    # 队列满时丢弃最早的状态，而不是更早排队的发现信息
+    assert [entry[1] for entry in limiter._queue.values()] == [
+        "homeassistant/light/a/config", "homeassistant/light/c/config"]
+    assert limiter.dropped == 1
+
+
+def test_load_profile_segments():
+    """测试负载曲线各类型段的速率计算"""
+    profile = LoadProfile.from_dict("mixed", {"segments": [
+        {"type": "ramp", "duration": 10, "from": 100, "to": 200, "active": {"from": 0.5, "to": 1}},
+        {"type": "spike", "duration": 10, "base": 10, "peak": 1000, "period": 5, "width": 1},
+        {"type": "diurnal", "duration": 100, "min": 0, "max": 50, "peak_at": 0.5},
+    ]})
+    assert profile.at(5) == (pytest.approx(150), pytest.approx(0.75))
+    assert profile.at(10.5)[0] == 1000
+    assert profile.at(12)[0] == 10
+    assert profile.at(70)[0] == pytest.approx(50)
+    # 结束后保持最后的速率
+    assert profile.at(1000)[0] == pytest.approx(0)
+    assert profile.scaled(0.5).at(5)[0] == pytest.approx(75)
+
+    with pytest.raises(ValueError):
+        LoadProfile.from_dict("bad", {"segments": [{"type": "ramp", "duration": 10, "from": 1}]})
+    for segment in ({"type": "spike", "duration": 10, "base": 1, "peak": 2, "period": 0},
+                    {"type": "diurnal", "duration": 10, "min": 1, "max": 2, "period": -5},
+                    {"type": "spike", "duration": 10, "base": 1, "peak": 2, "width": -1}):
+        with pytest.raises(ValueError):
+            LoadProfile.from_dict("bad", {"segments": [segment]})
+
+
+def test_load_driver_paces_active_devices():
+    """测试负载驱动器按目标速率轮转活跃设备"""
+    clock = FakeClock()
+    profile = LoadProfile.from_dict("half", {"segments": [{"type": "constant", "duration": 100, "rate": 50, "active": 0.5}]})
+    driver = LoadDriver(profile, report_interval=1000, clock=clock)
+    devices = [Switch(object_id=f"switch_{i}", name=f"Switch {i}") for i in range(10)]
+    driver.start()
+
+    updated = []
+    for _ in range(100):
+        clock.now += 0.1
+        updated.extend(driver.due(devices))
+    assert len(updated) == pytest.approx(500, abs=1)
+    # 只有一半设备活跃，并且被均匀轮转
+    assert len({device.object_id for device in updated}) == 5
+
+
+def test_bench_compare_detects_regression(tmp_path, capsys):
+    """测试基准测试结果与基线比较时能发现回归"""
+    result = {"name": "noop", "params": {}, **measure(lambda: None, repeat=2, min_time=0.001)}
+    assert result["ns_per_op"] > 0
+
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"results": [{**result, "ns_per_op": result["ns_per_op"] / 2}]}))
+    assert compare_results({"results": [result]}, str(baseline), "ns_per_op") == 1
+    assert compare_results({"results": [result]}, str(baseline), "ns_per_op", threshold=10) == 0
+
+
+def test_broker_tcp_routing_retain_and_will():
+    """测试内嵌Broker通过TCP处理paho客户端的订阅、QoS 1、保留消息和遗嘱消息"""
+    async def wait_for(predicate):
+        for _ in range(200):
+            if predicate():
+                return
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        broker = Broker()
+        port = await broker.start(port=0)
+        broker.publish("homeassistant/light/a/config", b"{}", retain=True)
+
+        received = []
+        subscriber = AsyncioMQTTClient(client_id="test_sub")
+        subscriber.on_message = lambda client, userdata, message: received.append(
+            (message.topic, message.payload, message.retain))
+        publisher = AsyncioMQTTClient(client_id="test_pub")
+        publisher.will_set("test/status", b"offline", retain=True)
+        for client in (subscriber, publisher):
+            client.connect("127.0.0.1", port)
+            client.loop_start()
+        try:
+            subscriber.subscribe([("homeassistant/+/+/config", 1), ("test/#", 0)])
+            await wait_for(lambda: received)
+            await publisher.publish_async("homeassistant/light/b/config", b"{\"on\": 1}", qos=1)
+            await publisher.publish_async("homeassistant/light/b/state", b"ON")
+            await wait_for(lambda: len(received) == 2 and broker.messages_in == 3)
+            # 模拟网络中断，Broker发布遗嘱消息
+            broker.disconnect_client("test_pub")
+            await wait_for(lambda: len(received) == 3)
+        finally:
+            for client in (subscriber, publisher):
+                client.disconnect()
+                client.loop_stop()
+            await broker.stop()
+
+        assert received == [
+            ("homeassistant/light/a/config", b"{}", True),
+            ("homeassistant/light/b/config", b'{"on": 1}', False),
+            ("test/status", b"offline", False),
+        ]
+        assert "test/status" in broker.retained
+        assert broker.get_topic_stats("homeassistant/+/+/state")["homeassistant/light/b/state"]["deliveries"] == 0
+        assert broker.get_topic_stats()["homeassistant/light/b/config"]["deliveries"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_broker_inprocess_command_round_trip():
+    """测试进程内客户端：设备管理器收到命令后发布新状态"""
+    assert topic_matches("homeassistant/#", "homeassistant")
+    assert not topic_matches("+/light/#", "$SYS/light/a")
+
+    broker = Broker()
+    light = Light(object_id="inproc_light", name="Inproc Light")
+    manager = MockDeviceManager()
+    manager.add_devices([light])
+    client = broker.client("simulator")
+    client.on_message = manager.on_message
+    client.connect()
+    manager.subscribe_all_commands(client)
+
+    observer = broker.client("observer")
+    observer.connect()
+    states = []
+    observer.on_message = lambda client, userdata, message: states.append(json.loads(message.payload))
+    observer.subscribe(light.state_topic)
+
+    broker.publish(light.command_topic, json.dumps({"state": "ON", "brightness": 42}))
+    assert states and states[-1]["state"] == "ON" and states[-1]["brightness"] == 42
+    assert [message.topic for message in broker.messages()] == [light.command_topic, light.state_topic]
+    assert broker.get_stats()["messages_out"] == 2
+
+
+def test_startup_publisher_batches_and_acks():
+    """测试启动发布：初始状态紧跟在本批发现信息之后，等待PUBACK（或超时）后才继续下一批"""
+    broker = Broker()
+    devices = [Switch(object_id=f"startup_{i}", name=f"Startup {i}") for i in range(5)]
+    manager = MockDeviceManager()
+    manager.add_devices(devices)
+    client = broker.client("startup")
+    client.connect()
+    asyncio.run(manager.publish_startup(client, StartupPublisher(batch_size=2, rate=0)))
+
+    topics = [message.topic for message in broker.messages()]
+    assert topics[:4] == [devices[0].discovery_topic, devices[1].discovery_topic,
+                          devices[0].state_topic, devices[1].state_topic]
+    assert topics.index(devices[1].state_topic) < topics.index(devices[4].discovery_topic)
+    assert all(message.qos == 1 for message in broker.messages() if message.topic.endswith("/config"))
+    stats = manager.get_startup_stats()
+    assert stats["phase"] == "done" and stats["batches"] == 3 and stats["progress"] == 1
+    assert stats["discoveries_acked"] == 5 and stats["states_published"] == 5
+
+    # 第一条发现信息第二次检查时确认，第二条一直没有PUBACK，超时后继续
+    acked, lost = MagicMock(rc=0), MagicMock(rc=0)
+    acked.is_published.side_effect = [False, True]
+    lost.is_published.return_value = False
+    fake = MagicMock(spec=["publish"])
+    fake.publish.side_effect = [acked, MagicMock(rc=0), lost, MagicMock(rc=0)]
+    startup = StartupPublisher(batch_size=1, rate=0, ack_timeout=0.05, poll_interval=0.01)
+    asyncio.run(startup.run(fake, devices[:2]))
+    # 没有确认的发现信息，设备的初始状态不在启动时发布
+    assert [call.args[0] for call in fake.publish.call_args_list] == [
+        devices[0].discovery_topic, devices[0].state_topic, devices[1].discovery_topic,
+    ]
+    assert acked.is_published.call_count == 2
+    stats = startup.get_stats()
+    assert stats["discoveries_acked"] == 1 and stats["ack_timeouts"] == 1 and stats["progress"] == 1
+    assert stats["states_published"] == 1
+
+    merged = merge_startup_stats([stats, {**stats, "phase": "discovery"}])
+    assert merged["phase"] == "discovery" and merged["devices"] == 4 and merged["ack_timeouts"] == 2
+
+    # 发布失败的发现信息不算确认，也不发布状态
+    fake = MagicMock(spec=["publish"])
+    fake.publish.return_value = MagicMock(rc=4)
+    startup = StartupPublisher(batch_size=2, rate=0, poll_interval=0.01)
+    asyncio.run(startup.run(fake, devices[:2]))
+    stats = startup.get_stats()
+    assert fake.publish.call_count == 2 and stats["discoveries_failed"] == 2
+    assert stats["discoveries_acked"] == 0 and stats["states_published"] == 0 and stats["progress"] == 1
+
+
+def test_startup_publisher_waits_for_rate_limited_discovery():
+    """测试在限速器中排队的发现信息发出之前，不发布该设备的初始状态"""
+    broker = Broker()
+    devices = [Switch(object_id=f"limited_{i}", name=f"Limited {i}") for i in range(2)]
+    client = broker.client("limited")
+    client.connect()
+    limiter = PublishRateLimiter(global_rate=20, burst=0.05, policy="drop")
+    set_rate_limiter(limiter)
+
+    async def scenario():
+        limiter_task = asyncio.create_task(limiter.run())
+        startup = StartupPublisher(batch_size=2, rate=0, poll_interval=0.01)
+        await startup.run(client, devices)
+        limiter_task.cancel()
+        return startup.get_stats()
+
+    try:
+        stats = asyncio.run(scenario())
+    finally:
+        set_rate_limiter(None)
+    topics = [message.topic for message in broker.messages()]
+    assert topics[:2] == [devices[0].discovery_topic, devices[1].discovery_topic]
+    assert stats["discoveries_acked"] == 1 and stats["discoveries_queued"] == 1
+    assert stats["discoveries_released"] == 1 and stats["progress"] == 1
+
+
+def test_wildcard_command_subscription():
+    """测试命令使用一个通配符订阅，按原始主题字节分发，纯文本命令跳过JSON解析"""
+    broker = Broker()
+    switch = Switch(object_id="wildcard_switch", name="Wildcard Switch")
+    manager = MockDeviceManager()
+    manager.add_device(switch)
+    client = broker.client("wildcard")
+    client.on_message = manager.on_message
+    client.connect()
+    manager.subscribe_all_commands(client)
+    assert list(client.subscriptions) == ["homeassistant/+/+/set"]
+
+    # 订阅之后添加的设备不需要再订阅
+    light = Light(object_id="wildcard_light", name="Wildcard Light")
+    manager.add_device(light)
+    home_assistant = broker.client("home_assistant")
+    home_assistant.connect()
+    home_assistant.publish(light.command_topic, b'{"state": "OFF"}')
+    home_assistant.publish(switch.command_topic, b"OFF")
+    assert light.state["state"] == "OFF" and switch.state["state"] == "OFF"
+
+    # paho消息按原始主题字节查找设备
+    message = mqtt.MQTTMessage(topic=switch.command_topic.encode())
+    message.payload = b"ON"
+    manager.on_message(client, None, message)
+    assert switch.state == {"state": "ON"}
+    assert json.loads(broker.messages(switch.state_topic)[-1].payload) == {"state": "ON"}
+
+    # 没有paho私有属性_topic的消息对象按topic属性查找
+    message_without_raw = MagicMock(spec=["topic", "payload"], topic=switch.command_topic, payload=b"OFF")
+    manager.on_message(client, None, message_without_raw)
+    assert switch.state == {"state": "OFF"}
+
+    # 分片只处理自己的设备，其他分片的命令不计为未知消息
+    shard = MockDeviceManager(partial=True)
+    before = UNKNOWN_COMMANDS.value()
+    shard.on_message(client, None, message)
+    assert UNKNOWN_COMMANDS.value() == before
+
+    per_device = MockDeviceManager(command_subscription="device")
+    per_device.add_devices([switch, light])
+    subscriber = MagicMock()
+    per_device.subscribe_all_commands(subscriber)
+    assert [call.args[0] for call in subscriber.subscribe.call_args_list] == [switch.command_topic, light.command_topic]
+
+
+def test_command_queue_applies_commands_on_loop():
+    """测试网络线程收到的命令放入有界队列，在事件循环中按顺序分批处理，队列满时丢弃最旧的命令"""
+    light = Light(object_id="queued_light", name="Queued Light")
+    manager = MockDeviceManager(command_queue=CommandQueue(maxsize=3, batch_size=2))
+    manager.add_device(light)
+    applied_in = set()
+
+    def publish(*args, **kwargs):
+        applied_in.add(threading.get_ident())
+        return MagicMock(rc=0)
+
+    client = MagicMock()
+    client.publish.side_effect = publish
+
+    def network_thread():
+        for brightness in range(1, 6):
+            message = mqtt.MQTTMessage(topic=light.command_topic.encode())
+            message.payload = json.dumps({"brightness": brightness}).encode()
+            manager.on_message(client, None, message)
+
+    async def scenario():
+        manager.attach_loop()
+        thread = threading.Thread(target=network_thread)
+        thread.start()
+        thread.join()
+        # 网络线程返回时命令还没有应用
+        assert light.state["brightness"] == 255
+        while len(manager.command_queue):
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    assert applied_in == {loop_thread}
+    published = [json.loads(call.args[1])["brightness"] for call in client.publish.call_args_list]
+    assert published == [3, 4, 5]
+    stats = manager.get_command_queue_stats()
+    assert stats["dropped"] == 2 and stats["processed"] == 3 and stats["batches"] == 2 and stats["depth"] == 0
+
+    # drop_newest策略拒绝新到达的命令
+    queue = CommandQueue(maxsize=1, policy="drop_newest")
+    queue.loop = MagicMock()
+    assert queue.put(client, light, "first") and not queue.put(client, light, "second")
+    assert queue.get_stats()["dropped"] == 1
+
+
+def test_command_coalescing_window():
+    """测试合并窗口内同一设备的命令按顺序合并（同一个键以最后一次为准），只发布一次状态"""
+    broker = Broker()
+    light = Light(object_id="coalesced_light", name="Coalesced Light")
+    switch = Switch(object_id="coalesced_switch", name="Coalesced Switch")
+    manager = MockDeviceManager(coalescer=CommandCoalescer(0.05))
+    manager.add_devices([light, switch])
+    client = broker.client("coalesce")
+    client.on_message = manager.on_message
+    client.connect()
+    manager.subscribe_all_commands(client)
+    home_assistant = broker.client("home_assistant")
+    home_assistant.connect()
+
+    async def scenario():
+        manager.attach_loop()
+        home_assistant.publish(light.command_topic, b'{"state": "ON", "brightness": 1}')
+        for brightness in range(2, 11):
+            home_assistant.publish(light.command_topic, json.dumps({"brightness": brightness}).encode())
+        home_assistant.publish(light.command_topic, b'{"effect": "rainbow"}')
+        home_assistant.publish(switch.command_topic, b"OFF")
+        # 窗口结束前没有应用
+        assert light.state["brightness"] == 255 and not broker.messages(light.state_topic)
+        await asyncio.sleep(0.15)
+
+    asyncio.run(scenario())
+    states = [json.loads(message.payload) for message in broker.messages(light.state_topic)]
+    assert len(states) == 1
+    assert states[0]["state"] == "ON" and states[0]["brightness"] == 10 and states[0]["effect"] == "rainbow"
+    assert switch.state == {"state": "OFF"}
+    stats = manager.get_coalescing_stats()
+    assert stats["commands"] == 12 and stats["updates"] == 2 and stats["ratio"] == 6.0 and stats["pending"] == 0
+
+
+def test_timed_state_transitions(monkeypatch):
+    """测试布防延迟、窗帘行程、灯光渐变和门锁动作在同一个转换调度器上按时间执行"""
+    monkeypatch.setattr(Alarm, "ARMING_DELAY", 0.05)
+    monkeypatch.setattr(Cover, "TRAVEL_TIME", 0.2)
+    monkeypatch.setattr(Lock, "ACTION_DELAY", 0.02)
+    monkeypatch.setattr(Lock, "JAMMED_RATE", 0.0)
+    monkeypatch.setattr(Light, "TRANSITION_STEP", 0.01)
+    broker = Broker()
+    alarm = Alarm(object_id="timed_alarm")
+    cover = Cover(object_id="timed_cover")
+    light = Light(object_id="timed_light")
+    lock = Lock(object_id="timed_lock")
+    scheduler = TransitionScheduler()
+    manager = MockDeviceManager(transitions=scheduler)
+    manager.add_devices([alarm, cover, light, lock])
+    client = broker.client("transitions")
+    client.connect()
+
+    def published(device):
+        return [json.loads(message.payload) for message in broker.messages(device.state_topic)]
+
+    async def scenario():
+        manager.attach_loop()
+        alarm.on_command(client, b'{"action": "ARM_AWAY", "code": "1234"}')
+        cover.on_command(client, b'{"position": 50}')
+        light.on_command(client, b'{"state": "ON", "brightness": 200, "transition": 0.05}')
+        lock.on_command(client, b'{"action": "UNLOCK"}')
+        # 命令只给出中间状态，最终状态由调度器稍后发布
+        assert alarm.state["state"] == "arming" and cover.state["state"] == "opening"
+        assert light.state["brightness"] == 1 and lock.state["state"] == "UNLOCKING"
+        assert scheduler.get_stats()["pending"] == 4
+        await asyncio.sleep(0.3)
+
+    try:
+        set_transition_scheduler(scheduler)
+        asyncio.run(scenario())
+    finally:
+        set_transition_scheduler(None)
+
+    assert [state["state"] for state in published(alarm)] == ["arming", "armed_away"]
+    assert [state["current_position"] for state in published(cover)] == [0, 10, 20, 30, 40, 50]
+    assert cover.state["state"] == "open"
+    brightness = [state["brightness"] for state in published(light)]
+    assert len(brightness) == 6 and brightness[-1] == 200 and brightness == sorted(brightness)
+    assert [state["state"] for state in published(lock)] == ["UNLOCKING", "UNLOCKED"]
+    stats = scheduler.get_stats()
+    assert stats["pending"] == 0 and stats["fired"] == stats["scheduled"] == 1 + 5 + 5 + 1
+
+    # 未启用调度器时立即给出最终状态
+    alarm.on_command(client, b'{"action": "ARM_HOME", "code": "1234"}')
+    assert alarm.state["state"] == "armed_home"
+
+
+def test_transition_superseded_by_new_command():
+    """测试新命令取代设备尚未执行的转换，移除设备时取消它的转换"""
+    scheduler = TransitionScheduler()
+    cover = Cover(object_id="superseded_cover")
+    alarm = Alarm(object_id="superseded_alarm")
+    client = MagicMock()
+    try:
+        set_transition_scheduler(scheduler)
+        cover.update_state(client, {"position": 100})
+        cover.update_state(client, {"action": "STOP"})
+        alarm.update_state(client, {"action": "ARM_NIGHT", "code": "1234"})
+        alarm.update_state(client, {"action": "DISARM", "code": "1234"})
+        alarm.update_state(client, {"action": "ARM_HOME", "code": "1234"})
+        alarm.update_state(client, {"action": "ARM_AWAY", "code": "1234"})
+    finally:
+        set_transition_scheduler(None)
+    assert cover.state["state"] == "closed" and not scheduler.pending(cover)
+    assert scheduler.pending(alarm, "arming")
+    stats = scheduler.get_stats()
+    assert stats["pending"] == 1 and stats["superseded"] == 1 and stats["cancelled"] == 2
+    assert scheduler.cancel(alarm) == 1 and len(scheduler) == 0
+
+
+def test_event_sampler_intervals_match_per_tick_probability():
+    """测试几何分布抽取的周期数与每周期掷骰子同分布，指数分布的均值按速率换算"""
+    event = StochasticEvent("toggle", 0.1, always, lambda device: None)
+    geometric = EventSampler("geometric", rng=random.Random(1))
+    samples = [geometric.sample(event, 10) for _ in range(20000)]
+    assert all(sample >= 10 and sample % 10 == 0 for sample in samples)
+    # 第一个周期就发生的比例为p，平均间隔为 周期/p
+    assert abs(samples.count(10) / len(samples) - 0.1) < 0.01
+    assert abs(sum(samples) / len(samples) - 100) < 3
+    exponential = EventSampler("exponential", rng=random.Random(2))
+    samples = [exponential.sample(event, 10) for _ in range(20000)]
+    assert abs(sum(samples) / len(samples) - 1 / event.rate(10)) < 3
+    with pytest.raises(ValueError):
+        StochasticEvent("never", 0, always, lambda device: None)
+
+
+def test_per_tick_alarm_events_are_exclusive(monkeypatch):
+    """测试没有事件采样器时报警面板每个周期最多发生一个转换（触发后不会在同一周期恢复）"""
+    alarm = Alarm(object_id="exclusive_alarm")
+    alarm.state["state"] = "armed_away"
+    monkeypatch.setattr(random, "random", lambda: 0.0)
+    alarm.step_mock()
+    assert alarm.state["state"] == "triggered"
+    alarm.step_mock()
+    assert alarm.state["state"] in Alarm.ARMED_STATES
+
+
+def test_event_driven_stochastic_transitions():
+    """测试采样器只为条件成立的转换计时，事件发生时发布状态，条件不再成立时取消"""
+    sampler = EventSampler("exponential")
+    alarm = Alarm(object_id="sampled_alarm")
+    light = Light(object_id="sampled_light")
+    sensor = BinarySensor(object_id="rolled_sensor", name="Rolled Sensor")
+    client = MagicMock()
+
+    async def scenario():
+        sampler.start(asyncio.get_running_loop(), client)
+        sampler.add(alarm, 0.001)
+        sampler.add(light, 1000)
+        # 撤防状态下报警面板没有可能发生的转换，灯只有开关转换
+        assert not sampler.timers.pending(alarm) and len(sampler.timers) == 1
+        alarm.update_state(client, {"action": "ARM_AWAY", "code": "1234"})
+        assert sampler.timers.pending(alarm, "trigger")
+        await asyncio.sleep(0.5)
+        # 触发和恢复交替发生，任何时候只有一个在计时
+        assert sampler.timers.pending(alarm, "trigger") != sampler.timers.pending(alarm, "recover")
+        alarm.update_state(client, {"action": "DISARM", "code": "1234"})
+        assert not sampler.timers.pending(alarm)
+
+    try:
+        set_event_sampler(sampler)
+        asyncio.run(scenario())
+        # 由采样器驱动的灯不再每个周期掷骰子，其余设备照常掷骰子
+        before = light.state.copy()
+        sensor_states = set()
+        for _ in range(200):
+            light.step_mock()
+            sensor.step_mock()
+            sensor_states.add(sensor.state["state"])
+        assert light.state == before and sensor_states == {"motion", "clear"}
+    finally:
+        set_event_sampler(None)
+
+    stats = sampler.get_stats()
+    assert stats["fired"]["alarm_control_panel.trigger"] >= 1 and stats["stale"] == 0
+    assert client.publish.call_count >= stats["fired"]["alarm_control_panel.trigger"]
+    sampler.remove(light)
+    assert len(sampler) == 1 and len(sampler.timers) == 0
+
+
+def test_mock_loop_yields_between_time_slices():
+    """测试一轮很长的模拟工作分成多个时间片，其他协程在时间片之间得到执行，期间移除的设备不再模拟"""
+    manager = MockDeviceManager(max_slice=0.005)
+    switches = [Switch(object_id=f"sliced_{i}", name=f"Sliced {i}", mock_interval=0.001) for i in range(100)]
+    manager.add_devices(switches)
+    published = []
+
+    def slow_publish(topic, data, retain=False):
+        # 每次发布占用1毫秒，一轮约100毫秒
+        time.sleep(0.001)
+        published.append(topic)
+        return MagicMock(rc=0)
+
+    client = MagicMock(spec=["publish"])
+    client.publish.side_effect = slow_publish
+
+    async def scenario():
+        mock_task = asyncio.create_task(manager.mock_devices(client, interval=0.001))
+        gaps = []
+        last = time.perf_counter()
+        deadline = last + 5
+        removed = None
+        while len(set(published)) < 99 and not mock_task.done() and last < deadline:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+            if published and removed is None:
+                # 第一个时间片之后移除一个还没有模拟到的设备
+                removed = next(s for s in reversed(switches) if s.state_topic not in published)
+                manager.remove_device(removed.object_id)
+        manager.stop_mock()
+        await asyncio.wait_for(mock_task, 1)
+        return removed, max(gaps)
+
+    removed, longest_wait = asyncio.run(scenario())
+    stats = manager.get_slice_stats()
+    assert stats["yields"] >= 5 and stats["max_slice_ms"] == 5.0
+    # 其他协程等待的时间接近时间片长度，而不是整轮工作的时间
+    assert longest_wait < 0.05
+    assert removed.state_topic not in published and len(set(published)) == 99
+
+
+def test_birth_message_resync():
+    """测试Home Assistant的birth消息：只重新发布Broker缺失的发现信息，所有设备重新发布状态"""
+    broker = Broker()
+    devices = [Switch(object_id=f"resync_{i}", name=f"Resync {i}") for i in range(3)]
+    resync = BirthResync(settle=0.5, poll_interval=0.01, batch_size=2, rate=0)
+    manager = MockDeviceManager(birth_resync=resync)
+    manager.add_devices(devices)
+    client = broker.client("resync")
+    client.on_message = manager.on_message
+    client.connect()
+    manager.subscribe_all_commands(client)
+    home_assistant = broker.client("home_assistant")
+    home_assistant.connect()
+
+    async def scenario():
+        await manager.publish_startup(client, StartupPublisher(rate=0))
+        # 第三个设备的保留配置被清除
+        broker.publish(devices[2].discovery_topic, b"", retain=True)
+        before = len(broker.messages())
+        home_assistant.publish(resync.status_topic, "offline")
+        home_assistant.publish(resync.status_topic, "online")
+        await asyncio.sleep(0)
+        await manager._resync_task
+        return broker.messages()[before:]
+
+    messages = asyncio.run(scenario())
+    published = [message.topic for message in messages if message.client_id == "resync"]
+    assert published.count(devices[2].discovery_topic) == 1
+    assert devices[0].discovery_topic not in published and devices[1].discovery_topic not in published
+    assert all(device.state_topic in published for device in devices)
+    stats = manager.get_resync_stats()
+    assert stats["births"] == 1 and stats["resyncs"] == 1 and stats["phase"] == "idle"
+    assert stats["last"]["discoveries_skipped"] == 2 and stats["last"]["states_published"] == 3
+    # 收集结束后取消了发现主题的订阅
+    assert resync.config_filter not in client.subscriptions
+
+
+def test_birth_resync_collects_retained_from_network_thread():
+    """测试网络线程收到的保留配置交给事件循环记录，收集结束后迟到的配置被忽略"""
+    devices = [Switch(object_id=f"threaded_{i}", name=f"Threaded {i}") for i in range(2)]
+    resync = BirthResync(settle=1.0, poll_interval=0.01)
+    client = MagicMock()
+
+    def deliver(device):
+        message = MagicMock(topic=device.discovery_topic, payload=device.discovery_data, retain=True)
+        thread = threading.Thread(target=resync.on_message, args=(message,))
+        thread.start()
+        thread.join()
+
+    async def scenario():
+        collect = asyncio.ensure_future(resync._collect_retained(client, devices))
+        await asyncio.sleep(0)
+        for device in devices:
+            deliver(device)
+        await collect
+        retained = dict(resync.retained)
+        deliver(devices[0])
+        await asyncio.sleep(0)
+        return retained
+
+    retained = asyncio.run(scenario())
+    assert set(retained) == {device.discovery_topic for device in devices}
+    client.unsubscribe.assert_called_once_with(resync.config_filter)
+    assert resync.retained == retained
+
+
+def test_metrics_counters_and_exposition():
+    """测试发布、命令和节拍指标的计数，以及分片快照合并后的Prometheus文本输出"""
+    metrics_registry.reset()
+    light = Light(object_id="metrics_light", name="Metrics Light")
+    manager = MockDeviceManager()
+    manager.add_devices([light])
+    client = MagicMock()
+    client.publish.return_value = MagicMock(rc=0)
+
+    manager.on_message(client, None, MagicMock(topic=light.command_topic, payload=b'{"state": "OFF"}'))
+    manager.on_message(client, None, MagicMock(topic="homeassistant/light/missing/set", payload=b"{}"))
+    client.publish.return_value = MagicMock(rc=4)
+    publish_state(client, light.state_topic, light.state)
+
+    assert COMMANDS.value() == 1
+    assert UNKNOWN_COMMANDS.value() == 1
+    assert PUBLISHES.value(("light", "state")) == 1
+    assert PUBLISH_FAILURES.value(("state",)) == 1
+    # 客户端抛出异常也计为发布失败
+    client.publish.side_effect = OSError("socket closed")
+    assert not publish_state(client, light.state_topic, light.state)
+    assert publish_discovery(client, "light", light.object_id, {"name": light.name}) is None
+    assert PUBLISH_FAILURES.value(("state",)) == 2
+    assert PUBLISH_FAILURES.value(("discovery",)) == 1
+
+    TICK_DURATION.observe(0.003)
+    merged = metrics_registry.merged([metrics_registry.snapshot(), metrics_registry.snapshot()])
+    text = merged.render([("ha_mqtt_mock_devices", "设备数", ("component",), {("light",): 1})])
+    assert 'ha_mqtt_mock_publishes_total{component="light",kind="state"} 2' in text
+    assert 'ha_mqtt_mock_tick_duration_seconds_bucket{le="0.0025"} 0' in text
+    assert 'ha_mqtt_mock_tick_duration_seconds_bucket{le="0.005"} 2' in text
+    assert 'ha_mqtt_mock_tick_duration_seconds_bucket{le="+Inf"} 2' in text
+    assert 'ha_mqtt_mock_devices{component="light"} 1' in text
+    metrics_registry.reset()
+
+
+def test_command_tracer_records_round_trip(tmp_path):
+    """测试命令与它引起的状态发布关联，并按设备类型统计延迟和写入分段记录"""
+    span_file = tmp_path / "spans.jsonl"
+    tracer = CommandTracer(str(span_file))
+    set_tracer(tracer)
+    try:
+        light = Light(object_id="traced_light", name="Traced Light")
+        manager = MockDeviceManager()
+        manager.add_devices([light])
+        client = MagicMock()
+        client.publish.return_value = MagicMock(rc=0)
+        arrived = time.monotonic() - 0.01
+        manager.on_message(client, None, MagicMock(topic=light.command_topic, payload=b'{"state": "OFF"}',
+                                                   timestamp=arrived))
+        # 没有命令等待的状态发布不产生记录
+        publish_state(client, light.state_topic, light.state)
+        tracer.flush()
+    finally:
+        set_tracer(None)
+
+    assert not tracer.pending
+    summary = summarize_latency([tracer.snapshot(), tracer.snapshot()])
+    assert summary["light"]["count"] == 2
+    assert summary["light"]["phases_avg_ms"]["queue"] >= 10
+    records = [json.loads(line) for line in span_file.read_text().splitlines()]
+    assert len(records) == 1
+    assert records[0]["object_id"] == "traced_light"
+    assert records[0]["total_ms"] >= records[0]["queue_ms"] >= 10
+
+
+def test_command_tracer_discards_unpublished_commands():
+    """测试没有引起状态发布的命令不留下追踪，过期的追踪不被无关的发布结束"""
+    now = [100.0]
+    tracer = CommandTracer(span_timeout=5.0, clock=lambda: now[0])
+    set_tracer(tracer)
+    try:
+        light = Light(object_id="untraced_light", name="Untraced Light")
+        manager = MockDeviceManager()
+        manager.add_devices([light])
+        client = MagicMock()
+        client.publish.return_value = MagicMock(rc=0)
+        manager.on_message(client, None, MagicMock(spec=["topic", "payload"], topic=light.command_topic,
+                                                   payload=b'{"state": '))
+        assert not tracer.pending
+        assert tracer.unpublished == 1
+
+        tracer.begin(light)
+        now[0] += 10.0
+        publish_state(client, light.state_topic, light.state)
+        assert not tracer.pending
+        assert tracer.expired == 1
+
+        tracer.begin(light)
+        now[0] += 10.0
+        other = Light(object_id="other_light", name="Other Light")
+        tracer.begin(other)
+        assert list(tracer.pending) == [other.state_topic]
+        assert tracer.expired == 2
+    finally:
+        set_tracer(None)
+    assert tracer.snapshot() == {}
+
+
+def test_api_device_state_does_not_leak_into_saved_config(tmp_path):
+    """测试查询设备时附加的状态不写入设备配置，之后保存的配置文件仍然有效"""
+    from ha_mqtt_mock.api import create_app
+    from ha_mqtt_mock.engine import DeviceConfig
+
+    config = DeviceConfig(tmp_path / "devices.json")
+    assert config.add_device({"type": "light", "object_id": "api_light", "name": "API Light"})
+    manager = MockDeviceManager()
+    manager.add_devices(config.create_devices())
+    app = create_app(config, manager)
+    endpoints = {(route.path, method): route.endpoint for route in app.routes for method in getattr(route, "methods", ())}
+
+    async def scenario():
+        listed = await endpoints[("/api/devices", "GET")](config=config, manager=manager)
+        single = await endpoints[("/api/devices/{device_id}", "GET")](device_id="api_light", config=config,
+                                                                        manager=manager)
+        return listed, single
+
+    listed, single = asyncio.run(scenario())
+    assert type(listed[0]["state"]) is dict and type(single["state"]) is dict
+    assert "state" not in config.get_device("api_light")
+    assert config.save()
+    saved = json.loads((tmp_path / "devices.json").read_text(encoding="utf-8"))
+    assert saved == [{"type": "light", "object_id": "api_light", "name": "API Light"}]
@@ -1,10 +1,13 @@
 """设备模型测试"""
 
 import json
+import pickle
 import pytest
 from unittest.mock import MagicMock, patch
 
-from ha_mqtt_mock.models import MQTTDevice, Light, Sensor, BinarySensor
+from ha_mqtt_mock.models import MQTTDevice, Light, Sensor, BinarySensor, Cover
+from ha_mqtt_mock.utils.serializer import (StdlibSerializer, create_serializer, get_serializer, orjson_available,
+                                           to_bytes)
 
 class TestDevice(MQTTDevice):
     """用于测试的设备类"""
@@ -54,6 +57,39 @@ def test_mqtt_device_publish_state():
         retain=False
     )
 
+def test_mqtt_device_discovery_cached():
+    """测试发现信息只编码一次，清除缓存后重新生成"""
+    device = TestDevice(name="Cached Device")
+    mock_client = MagicMock()
+    mock_client.publish.return_value = MagicMock(rc=0)
+    
+    with patch.object(TestDevice, "_get_discovery_payload", wraps=device._get_discovery_payload) as build:
+        device.publish_discovery(mock_client)
+        device.publish_discovery(mock_client)
+        assert build.call_count == 1
+        
+        device.name = "Renamed Device"
+        device.invalidate_discovery()
+        device.publish_discovery(mock_client)
+        assert build.call_count == 2
+    
+    topic, data = mock_client.publish.call_args.args
+    assert topic == device.discovery_topic
+    assert data == json.dumps(device._get_discovery_payload()).encode("utf-8")
+    assert json.loads(data)["name"] == "Renamed Device"
+
+def test_serializer_compact_utf8():
+    """测试紧凑格式：json-compact和orjson后端输出相同的UTF-8字节，默认后端保持json.dumps的格式"""
+    state = {"state": "ON", "name": "客厅灯", "temperature": 21.5, "values": [1, 2]}
+    expected = '{"state":"ON","name":"客厅灯","temperature":21.5,"values":[1,2]}'.encode("utf-8")
+    backends = ["json-compact", "auto"] + (["orjson"] if orjson_available() else [])
+    for name in backends:
+        serializer = create_serializer(name)
+        assert serializer.compact
+        assert to_bytes(serializer.dumps(state)) == expected
+        assert serializer.loads(expected) == state
+    assert create_serializer().dumps(state) == json.dumps(state)
+
 def test_light_device():
     """测试灯光设备"""
     light = Light(object_id="test_light", name="Test Light")
@@ -74,6 +110,37 @@ def test_light_device():
     assert payload["effect"] is True
     assert "rainbow" in payload["effect_list"]
 
+def test_compact_state():
+    """测试紧凑状态的字典行为和序列化"""
+    cover = Cover(object_id="test_cover")
+    state = cover.state
+    
+    # 设备实例和状态都没有__dict__
+    assert not hasattr(cover, "__dict__")
+    assert not hasattr(state, "__dict__")
+    assert cover.base_topic == "homeassistant/cover/test_cover"
+    assert cover.discovery_topic == "homeassistant/cover/test_cover/config"
+    
+    # 字段之外的键保存在附加字典中，序列化顺序与普通字典相同
+    cover.update_state(MagicMock(), {"action": "OPEN"})
+    expected = {"state": "opening", "position": 100, "current_position": 0, "tilt": 0, "action": "OPEN"}
+    assert state == expected
+    assert list(state) == list(expected)
+    assert state.get("missing", 1) == 1 and "action" in state and "missing" not in state
+    assert get_serializer().dumps(state) == StdlibSerializer().dumps(expected) == get_serializer().dumps(expected)
+    assert pickle.loads(pickle.dumps(state)) == expected
+    
+    # 配置中的部分状态只包含给出的键
+    partial = Cover(object_id="partial", state={"state": "open"}).state
+    assert partial.to_dict() == {"state": "open"}
+    assert "position" not in partial
+    with pytest.raises(KeyError):
+        partial["position"]
+    
+    # 配置中的状态按字段的声明顺序输出
+    ordered = Cover(object_id="ordered", state={"tilt": 5, "state": "open"}).state
+    assert list(ordered.to_dict()) == ["state", "tilt"]
+
 def test_sensor_device():
     """测试传感器设备"""
     sensor = Sensor(object_id="test_temp", name="Test Temperature", sensor_type="temperature")
@@ -105,4 +172,39 @@ def test_binary_sensor_device():
     assert payload["name"] == "Test Motion"
     assert payload["device_class"] == "motion"
     assert payload["payload_on"] == "motion"
-    assert payload["payload_off"] == "clear" 
\ No newline at end of file
+    assert payload["payload_off"] == "clear" 
+def test_sensor_report_policy_deadband():
+    """测试传感器死区和最小/最大上报间隔"""
+    sensor = Sensor(
+        object_id="test_temp",
+        sensor_type="temperature",
+        state={"temperature": 20.0},
+        report_policy={"report_deadband": 1, "min_report_interval": 5, "max_report_interval": 60},
+    )
+    mock_client = MagicMock()
+    mock_client.publish.return_value.rc = 0
+    
+    # 首次总是发布
+    assert sensor.needs_publish(0)
+    sensor.publish_state(mock_client)
+    published_at = sensor.last_published
+    
+    # 小于死区的变化不发布
+    sensor.state["temperature"] = 20.5
+    sensor.mark_dirty()
+    sensor.force_report = False
+    assert not sensor.needs_publish(published_at + 10)
+    
+    # 超过死区但在最小上报间隔内不发布
+    sensor.state["temperature"] = 21.5
+    assert not sensor.needs_publish(published_at + 1)
+    assert sensor.needs_publish(published_at + 10)
+    
+    # 超过最大上报间隔时即使没有变化也发布
+    sensor.state["temperature"] = 20.0
+    assert sensor.needs_publish(published_at + 60)
+
+def test_sensor_report_policy_invalid_key():
+    """测试未知的上报策略参数"""
+    with pytest.raises(ValueError):
+        Sensor(object_id="test_temp", report_policy={"unknown": 1})